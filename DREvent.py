@@ -22,6 +22,10 @@ class DREvent:
     self.TriggerMask = 0
     self.ADCs = {}        # Simple dict      key(channel) : value
     self.TDCs = {}        # Dict key:tuple   key(channel) : ( value, check )
+    self.ModCounters = [] # (crate, cratetype, event counter) of the module trailers (2025 format)
+    self.ErrorMask = 0    # Bitmask of the decoding errors (decode_utils.DecErrBit, 2025 format)
+    self.HeaderOnly = False # Payload not decoded on purpose (LazyDREvent.dropPayload)
+    self.Phys = None      # Values by physical channel (channel_map.PhysChannels, DRdecode(chmap = ...))
 
   def headLine(self):
     """Write header in ascii data dump"""
@@ -43,9 +47,52 @@ class DREvent:
     """get the data value for TDC channel ch"""
     return self.TDCs[ch]  # Tuple: (value, check)
 
+  def errorCodes(self):
+    """DecErr codes of the decoding errors of the event"""
+    return bob.mask_codes(self.ErrorMask)
 
 
 
+
+class SlotDREvent(object):
+  ''' DREvent with __slots__: no instance dict, smaller and faster to create. Same members
+      and methods as DREvent; made by DRdecode(..., pool = EventPool()) '''
+  __slots__ = ("EventTime", "EventNumber", "SpillNumber", "NumOfPhysEv", "NumOfPedeEv", "NumOfSpilEv",
+               "TriggerMask", "ADCs", "TDCs", "ModCounters", "ErrorMask", "HeaderOnly", "Phys")
+
+for _name in ("__init__", "headLine", "__str__", "getAdcChannel", "getTdcChannel", "errorCodes"):
+  setattr(SlotDREvent, _name, DREvent.__dict__[_name])
+
+
+class EventPool(object):
+  ''' Reusable SlotDREvent objects for streaming loops:
+        ev = DRdecode(line, pool = pool)
+        ...                 # e.g. builder.appendEvent(ev)
+        pool.release(ev)    # ev must not be used after this
+      At most maxFree released events are kept. Counters: ncreated, nreused '''
+
+  def __init__(self, maxFree = 64):
+    self.maxFree = maxFree
+    self.free = []
+    self.ncreated = 0
+    self.nreused = 0
+
+  def get(self):
+    '''A SlotDREvent: a released one (members of its previous event, to be overwritten) or a new one'''
+    if self.free:
+      self.nreused += 1
+      e = self.free.pop()
+      e.HeaderOnly = False
+      return e
+    self.ncreated += 1
+    return SlotDREvent()
+
+  def release(self, e):
+    '''Give back an event taken from the pool (None and other events are ignored)'''
+    if type(e) is SlotDREvent and len(self.free) < self.maxFree:
+      self.free.append(e)
+
+
 # Parse the evLine and return a DREvent object -- Data format up to 2024
 def DRdecode24(evLine):
   """Function that converts a raw data record (event) from
@@ -108,23 +155,29 @@ def DRdecode24(evLine):
 
 
 # Parse the evLine and return a DREvent object -- Raw data format since 
-def DRdecode25(evLine, verbose, dumperror):
+def DRdecode25(evLine, verbose, dumperror, select = None, pool = None, chmap = None):
   """Function that converts a raw data record (event) from
-     ascii to object oriented representation: DREvent class"""
+     ascii to object oriented representation: DREvent class
+     evLine: the event line, or its words as integers (hex_words.iter_words)
+     dumperror: text file to append the events with errors to, or an error_store.ErrorStore
+     select: optional decode_utils.Selection of the modules and channels to decode
+     pool: optional EventPool, the event is then a SlotDREvent taken from it
+     chmap: optional channel_map.PhysMap, the values are also scattered by physical channel in Phys"""
 
   #verbose = -1: print message only for discarded events
   #verbose = 0: print message for every decoding error
   #verbose = 1: print message for every decoding error and pass verbosity to "decodeblock"
-  
-  # Create new DREvent
-  e = DREvent()
 
   blockverbose = verbose > 0
-  valid, header, adc, tdc = bob.decodeblock(evLine, blockverbose)
+  valid, header, adc, tdc = bob.decodeblock(evLine, blockverbose, select)
 
-  discard = bob.DiscardEvent(valid)
+  errmask = bob.error_mask(valid)
+  discard = bob.DiscardMask(errmask)
 
-  if valid and dumperror != None:
+  if errmask and hasattr(dumperror, "record"):
+    # binary error store (error_store.ErrorStore)
+    dumperror.record(evLine, errmask, header.get("evtnumber", -1), header.get("spillnumber", -1))
+  elif errmask and dumperror != None:
     delimiter = "----------------"
     errors = "\n".join([bob.ets(v) for v in valid])
     try:
@@ -137,7 +190,7 @@ def DRdecode25(evLine, verbose, dumperror):
       evtnumber,
       errors,
       str(discard),
-      evLine,
+      evLine if hasattr(evLine, "split") else " ".join("%x" % w for w in evLine),
       str(header),
       len(adc),
       str(adc),
@@ -148,7 +201,7 @@ def DRdecode25(evLine, verbose, dumperror):
       fdump.write(dump)
      
 
-  if valid:
+  if errmask:
     try:
       evtnumber = header["evtnumber"]
     except:
@@ -163,6 +216,9 @@ def DRdecode25(evLine, verbose, dumperror):
   if discard:
     return None
 
+  # Create new DREvent
+  e = DREvent() if pool is None else pool.get()
+
   # Parse header
   e.EventNumber = int( header["evtnumber"] )
   e.EventTime = header["evttime"]
@@ -172,28 +228,140 @@ def DRdecode25(evLine, verbose, dumperror):
   e.NumOfSpilEv = -1 # int( header["nevt"] )
 
   e.TriggerMask = int( header["trigmask"] )
+  e.ModCounters = header.get("modcounters", [])
+  e.ErrorMask = errmask
   
-  # Parse ADC 
-  for chan in adc:
-    e.ADCs[chan] = adc[chan]
-
+  # ADC and TDC: the dicts built by decodeblock for this event are taken over, not copied
+  e.ADCs = adc
   # TODO what is check number of TDCs? Setting to 1 now
-  # Parse TDC
-  for chan in tdc:
-    e.TDCs[chan] = tdc[chan] # tdc[chan] is a pair (value, flag)
+  e.TDCs = tdc # tdc[chan] is a pair (value, flag)
+  e.Phys = chmap.scatter(adc, tdc) if chmap is not None else None
 
   return e
 
+class LazyDREvent(DREvent, object):
+  ''' DREvent with only the header decoded: the module payload is decoded at the first
+      access to ADCs, TDCs, ModCounters or ErrorMask. If the payload has fatal errors, ADCs and TDCs are empty
+      and Discarded is True '''
+
+  def __init__(self, evLine, header, verbose, dumperror, select = None, chmap = None):
+    DREvent.__init__(self)
+    self.EventNumber = int( header["evtnumber"] )
+    self.EventTime = header["evttime"]
+    self.SpillNumber = int( header["spillnumber"] )
+    self.NumOfPhysEv = -1
+    self.NumOfPedeEv = -1
+    self.NumOfSpilEv = -1
+    self.TriggerMask = int( header["trigmask"] )
+    self.Discarded = False
+    self._line = evLine
+    self._verbose = verbose
+    self._dumperror = dumperror
+    self._select = select
+    self._chmap = chmap
+
+  def _decodePayload(self):
+    line = self._line
+    self._line = None
+    e = DRdecode25(line, self._verbose, self._dumperror, self._select, chmap = self._chmap)
+    if e is None:
+      self.Discarded = True
+    else:
+      self._adcs, self._tdcs, self._counters, self._errors, self._phys = e.ADCs, e.TDCs, e.ModCounters, e.ErrorMask, e.Phys
+
+  def isDecoded(self):
+    return self._line is None
+
+  def dropPayload(self):
+    '''Give up the payload without decoding it (load shedding): ADCs and TDCs stay empty'''
+    if self._line is not None:
+      self._line = None
+      self._adcs, self._tdcs, self._counters, self._errors, self._phys = {}, {}, [], 0, None
+      self.HeaderOnly = True
+
+  def _getADCs(self):
+    if self._line is not None:
+      self._decodePayload()
+    return self._adcs
+
+  def _setADCs(self, val):
+    self._adcs = val
+
+  def _getTDCs(self):
+    if self._line is not None:
+      self._decodePayload()
+    return self._tdcs
+
+  def _setTDCs(self, val):
+    self._tdcs = val
+
+  def _getModCounters(self):
+    if self._line is not None:
+      self._decodePayload()
+    return self._counters
+
+  def _setModCounters(self, val):
+    self._counters = val
+
+  def _getErrorMask(self):
+    if self._line is not None:
+      self._decodePayload()
+    return self._errors
+
+  def _setErrorMask(self, val):
+    self._errors = val
+
+  ADCs = property(_getADCs, _setADCs)
+  TDCs = property(_getTDCs, _setTDCs)
+  ModCounters = property(_getModCounters, _setModCounters)
+  def _getPhys(self):
+    if self._line is not None:
+      self._decodePayload()
+    return self._phys
+
+  def _setPhys(self, val):
+    self._phys = val
+
+  ErrorMask = property(_getErrorMask, _setErrorMask)
+  Phys = property(_getPhys, _setPhys)
+
+
+# Parse only the 14-word event header of evLine and return a LazyDREvent -- Raw data format since 2025
+def DRdecodeLazy(evLine, verbose = -1, dumperror = None, select = None, chmap = None):
+  """Decode only the event header: None for invalid headers, otherwise a LazyDREvent
+     whose payload is decoded (as DRdecode25 does) only when ADCs or TDCs are accessed"""
+  try:
+    if hasattr(evLine, "split"):
+      words = [int(w, 16) for w in evLine.split(None, 14)[:14]]
+    else:
+      words = [int(w) for w in evLine[:14]]
+  except ValueError:
+    words = []
+  v, header = bob.parse_evt_header(words)
+  if v:
+    return DRdecode25(evLine, verbose, dumperror) # reports and discards the event
+  return LazyDREvent(evLine, header, verbose, dumperror, select, chmap)
+
 # Wrapper for compatibility with two data format
-def DRdecode(evLine, spec='2025', verbose = -1, dumperror = None):
+def DRdecode(evLine, spec='2025', verbose = -1, dumperror = None, lazy = False, select = None, pool = None, chmap = None):
 
   if spec == '2025':
-    return DRdecode25(evLine, verbose, dumperror)
+    if lazy:
+      return DRdecodeLazy(evLine, verbose, dumperror, select, chmap)
+    return DRdecode25(evLine, verbose, dumperror, select, pool, chmap)
   else:
     if verbose != -1:
       print('WARNING - Verbosity implemented only for 2025 data format')
     if dumperror != None:
       print('WARNING - Dump of corrupted data implemented only for 2025 data format')
+    if lazy:
+      print('WARNING - Lazy decoding implemented only for 2025 data format')
+    if select != None:
+      print('WARNING - Selective decoding implemented only for 2025 data format')
+    if pool != None:
+      print('WARNING - Event pool implemented only for 2025 data format')
+    if chmap != None:
+      print('WARNING - Channel map implemented only for 2025 data format')
     return DRdecode24(evLine)
 
 
@@ -210,9 +378,17 @@ if __name__ == "__main__":
     verboseHead = True
     if str(sys.argv[2]) == 'vv':
       verboseEvt = 1
-  for i, line in enumerate( open( sys.argv[1] ) ):
+  try:
+    import formats # python3: format detected from the file, plain and compressed (.gz .bz2 .xz .zst) files
+    fmt = formats.detect(sys.argv[1])
+    lines = fmt.lines(sys.argv[1])
+    decode = fmt.decoder(verbose=verboseEvt, dumperror="drevent_error_dump.txt")
+  except (ImportError, SyntaxError): # python2
+    lines = open( sys.argv[1] )
+    decode = lambda line: DRdecode(line, spec = '2025', verbose=verboseEvt, dumperror="drevent_error_dump.txt")
+  for i, line in enumerate( lines ):
     n = time.time()
-    ev = DRdecode(line, spec = '2025', verbose=verboseEvt, dumperror="drevent_error_dump.txt")
+    ev = decode(line)
     dt = 1000*(time.time()-n)
     if verboseHead and ev != None:
       adcs = len(ev.ADCs)
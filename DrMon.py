@@ -0,0 +1,843 @@
+#!/usr/bin/env python3
+import DREvent
+import sys
+import ROOT
+import getopt
+import glob
+import os
+import re
+import subprocess
+import time
+from event_batch import BatchBuilder
+from calibration import load_channel_map
+from histo_fill import FillEngine, TriggerViews
+from dwc import DwcSetup
+from spills import SpillAggregator
+from continuity import ContinuityChecker
+from histo_cache import HistoCache
+from pedestals import PedestalEstimator
+import run_reader
+import sampling
+
+
+PathToData='/home/dreamtest/SPS.2023.06/'
+PathToMappingADC='./channels2025adc.json'
+PathToMappingTDC='./channels2025tdc.json'
+PathToPedestals='./channels2025adc_pedestals.json' # channel json with the running pedestals
+BLUBOLD='\033[94m\033[1m'
+BOLD   ='\033[1m'
+BLU    ='\033[94m'
+RED    ='\033[31m'
+NOCOLOR='\033[0m'
+
+# CONFIGURATION
+NumAdcChannels = 192
+NumTdcChannels = 16
+BatchSize      = 1000   # events decoded before filling the histograms
+SpillRing      = 100    # spills kept in memory for the rate dump
+PedestalWindow = 2000   # pedestal events, time constant of the running pedestals
+RunIdleTime    = 60     # seconds without writes after which a run file is finished (longer than a spill cycle)
+
+################################################################
+# SIGNAL HANDLER ###############################################
+################################################################
+from signal import signal, SIGINT
+stop=False
+def handler(signal_rcv, frame):
+  global stop
+  stop=True
+
+
+
+#################
+# IMPORT AND HANDLE MAPPING
+################
+MAPADC = load_channel_map(PathToMappingADC)
+MAPTDC = load_channel_map(PathToMappingTDC)
+
+
+
+
+#################################################################
+### DrMon CLASS #################################################
+#################################################################
+class DrMon:
+  '''Data monitoring class for DualReadout Test Beam @H8 (python3) '''
+
+  ##### DrMon method #######
+  def __init__(self, fname, maxEvts, sample, trigCut=0, useCache=True, reservoir=0, budget=0.):
+    '''Constructor '''
+    self.fname      = fname    # File name
+    self.maxEvts    = maxEvts  # Max number of events to process
+    self.sample     = sample   # Sampling fraction
+    self.compressed = bool(run_reader.compression(fname)) # Compressed run file
+    self.sampler    = self.makeSampler(sample, reservoir, budget) # Events decoded (see sampling)
+    self.sampled    = self.sampler.tag() != "all"
+    self.nDecoded   = 0        # Events decoded
+    self.wDecoded   = 0.       # Sum of the sampling weights of the decoded events
+    self.trigCut    = trigCut  # Trigger cut
+    self.hDict      = {}       # Dictionary of histograms of the displayed trigger view
+    self.hViews     = {"all": self.hDict} # Histogram dictionaries of each trigger view
+    self.hSuffix    = ""       # ROOT name suffix of the histograms being booked
+    self.view       = "all"    # Displayed trigger view
+    self.hTitles    = {}       # Histogram titles without the sampling tag
+    self.histoMap   = {}       # Mapping dictionary
+    self.engine     = None     # FillEngine, created at the first read
+    self.spills     = SpillAggregator(SpillRing) # Per-spill counters
+    self.continuity = ContinuityChecker() # Event number and module counter checks (not sampled runs)
+    self.pedestals  = PedestalEstimator(window=PedestalWindow) # Running pedestals from the pedestal triggers
+    self.lastEv     = None     # Last DREvent object
+    self.canvas     = None     # ROOT canvas
+    self.canNum     = 0        # Number of pads in canvas
+    self.numOfLines = 0        # Number of lines in the file
+    self.lastLine   = 0        # Last line read
+    self.nextLine   = 0        # Next line to read
+    self.lastOffset = 0        # Byte offset of nextLine
+    self.atEnd      = False    # End of a compressed file reached
+    self.cache      = HistoCache() if useCache else None # Histogram cache
+    self.runNum = "0"
+    tmp=re.findall(r'\d+',fname)
+    if len(tmp) != 0:
+      self.runNum = tmp[-1]
+    self.cmdShCuts  = {        # Mapping between command shortCuts and commands
+       "pmtMapC"      : self.DrawPmtAdcMapC,
+       "pmtMapS"      : self.DrawPmtAdcMapS,
+       "fers"         : self.DrawFers,
+       "beam"         : self.DrawDwcBeamProfile,
+       "beam_mm"      : self.DrawDwcBeamProfile_mm,
+       "dwcTDCs"      : self.DrawDwcTDCs,
+       "caloTot"      : self.DrawTotalEnergyInCalo,
+       "PmtHeatMaps"  : self.PmtHitMaps,
+    }
+    self.cmdShCutsV = list(self.cmdShCuts)
+    self.NumOfLinesOfThisFile()
+    self.histoMapping()
+
+  ##### DrMon method #######
+  def makeSampler(self, sample, reservoir, budget):
+    '''Sampling strategy: time budget per read, k events per spill, one event every sample'''
+    if budget > 0 and self.compressed:
+      print(RED, "[WARNING] Time budget sampling not available for compressed files, using stride sampling", NOCOLOR)
+    elif budget > 0:
+      return sampling.TimeBudget(budget) # stride from the current file size at every read
+    if reservoir > 0:
+      return sampling.Reservoir(reservoir)
+    if sample > 1:
+      return sampling.Stride(sample)
+    return sampling.Every()
+
+  ##### DrMon method #######
+  def tagHistos(self):
+    '''Append the sampling and the mean sampling weight to the histogram titles'''
+    if not self.sampled or self.nDecoded == 0:
+      return
+    tag = " [%s, weight %.3g]" % (self.sampler.tag(), self.wDecoded / self.nDecoded)
+    for name, h in self.allHistos().items():
+      base = self.hTitles.setdefault(name, h.GetTitle())
+      h.SetTitle(base + tag)
+
+  ##### DrMon method #######
+  def histoMapping(self):
+    '''Create the histo mapping dictionary '''
+
+    # ADC
+    for ch in sorted(MAPADC.keys()):
+      self.histoMap[ MAPADC[ch]["phys"] ] = "adc-%03d" % (ch)
+
+    # TDC
+    for ch in sorted(MAPTDC.keys()):
+      self.histoMap[ MAPTDC[ch]["phys"] ] = "tdc-%03d" % (ch)
+
+  ##### DrMon method #######
+  def NumOfLinesOfThisFile(self):
+    '''Calculate the number of lines (lines read so far for compressed files)'''
+    if self.compressed:
+      self.numOfLines = self.nextLine
+      return
+    cmd = 'wc -l ' + self.fname
+    out = subprocess.getstatusoutput(cmd)[1]
+    self.numOfLines = int(out.split()[0])
+
+  ##### DrMon method #######
+  def DumpRateOfCurrentRun(self):
+    '''Dump the rate of the last spills of the current run'''
+    print(BLUBOLD)
+    self.spills.dump()
+    print(NOCOLOR)
+
+  ##### DrMon method #######
+  def book1D(self, hname, bins, mi, ma, axTitle=""):
+    '''Utility to book histograms 1D '''
+    h = ROOT.TH1I(hname + self.hSuffix, hname + self.hSuffix, bins, mi, ma)
+    h.GetXaxis().SetTitle(axTitle)
+    self.hDict[hname] = h
+    return h
+
+  ##### DrMon method #######
+  def book2D(self, hname, bins, mi, ma, axTitle="", ayTitle="", bins2 = -1000, mi2 = -1000, ma2 = -1000):
+
+    '''Utility to book histograms 2D '''
+    if bins2 == -1000:
+      bins2 = bins
+      mi2 = mi
+      ma2 = ma
+    h = ROOT.TH2I(hname + self.hSuffix, hname + self.hSuffix, bins, mi, ma, bins2, mi2, ma2)
+    self.hDict[hname] = h
+    h.GetXaxis().SetTitle(axTitle)
+    h.GetYaxis().SetTitle(ayTitle)
+    return h
+
+  ##### DrMon method #######
+  def bookAdcHistos(self, bins):
+    '''Book ADC histograms '''
+    for i in range(NumAdcChannels):
+      self.book1D( "adc-%03d" % i, bins, 0, 4096, 'adcCounts')
+
+    # Total energy
+    self.book1D( "PmtTotC",  bins, 0, 4096*10, 'adcCounts')
+    self.book1D( "PmtTotS",  bins, 0, 4096*10, 'adcCounts')
+    self.book2D( "PmtTotSC", bins, 0, 4096*10, 'S [adcCounts]', 'C [adcCounts]')
+
+    self.book2D( "HitMap_S", 5, 1, 6, 'tower column', 'tower row', 18, 1, 19)
+    self.book2D( "HitMap_C", 5, 1, 6, 'tower column', 'tower row', 18, 1, 19)
+
+    print("Booked ADCs histograms", self.hSuffix)
+
+  ##### DrMon method #######
+  def bookTdcHistos(self, bins):
+    '''Book TDC histograms '''
+    for i in range(NumTdcChannels):
+      hname = "tdc-%03d" % i
+      htitle = hname
+      if i==0 or i==4: htitle = htitle + " DWC" + str(i//4+1)+ " left"
+      if i==1 or i==5: htitle = htitle + " DWC" + str(i//4+1)+ " right"
+      if i==2 or i==6: htitle = htitle + " DWC" + str(i//4+1)+ " up"
+      if i==3 or i==7: htitle = htitle + " DWC" + str(i//4+1)+ " down"
+      self.hDict[hname] = ROOT.TH1I(hname + self.hSuffix, htitle + self.hSuffix, bins, 0, 4096)
+    self.book1D( "tdc_sz", NumTdcChannels, -0.5, NumTdcChannels+0.5, 'NumOfTdcCh per event')
+
+    print("Booked TDCs histograms:", self.hSuffix)
+
+  ##### DrMon method #######
+  def bookDwcHistos(self, bins):
+    '''Book DWC histograms '''
+    for i in range(1, 3):
+      dwc   = "dw%d" % i
+      lim   = 2048
+      self.book1D(dwc + "l-r", bins, -lim, lim, "tdcCounts")
+      self.book1D(dwc + "u-d", bins, -lim, lim, "tdcCounts")
+
+      lim  = 4096
+      self.book2D(dwc + "l/r",   bins,    0, lim, "tdcCounts", "tdcCounts")
+      self.book2D(dwc + "u/d",   bins,    0, lim, "tdcCounts", "tdcCounts")
+      self.book2D(dwc + "XY",    bins, -lim, lim, "tdcCounts", "tdcCounts")
+
+      lim  = 64
+      self.book2D(dwc + "XY_mm", bins, -lim, lim, 'mm',        'mm')
+
+    lim  = 4096
+    self.book2D("dwx1/x2", bins, -lim, lim, "tdcCounts", "tdcCounts")
+    self.book2D("dwy1/y2", bins, -lim, lim, "tdcCounts", "tdcCounts")
+
+    lim  =  48
+    self.book1D( "dwx1-x2", bins, -lim, lim, 'mm')
+    self.book1D( "dwy1-y2", bins, -lim, lim, 'mm')
+
+    print("Booked DWCs histograms", self.hSuffix)
+
+  ##### DrMon method #######
+  def bookOthers(self):
+    '''Book others histograms '''
+    self.book1D( "trMask", 8, -0.5, 7.5)
+    self.book2D( "chere1/2", 4096, 0, 4096, "Cherenkov1 [adcCounts]", "Cherenkov2 [adcCounts]")
+
+
+
+  ##### DrMon method #######
+  def bookAll(self, bins):
+    '''Book the histograms of all the events and of each trigger view (names with the
+       _phys, _pede, _oth suffix), filled in the same pass'''
+    for view in ("all",) + TriggerViews:
+      self.hDict   = self.hViews.setdefault(view, {})
+      self.hSuffix = "" if view == "all" else "_" + view
+      self.bookAdcHistos(bins)
+      self.bookTdcHistos(bins)
+      self.bookDwcHistos(bins)
+      self.bookOthers()
+    self.hSuffix = ""
+    self.hDict   = self.hViews[self.view]
+
+  ##### DrMon method #######
+  def allHistos(self):
+    '''All the histograms of all the views, by ROOT name'''
+    out = {}
+    for view, d in self.hViews.items():
+      suffix = "" if view == "all" else "_" + view
+      for name, h in d.items():
+        out[name + suffix] = h
+    return out
+
+  ##### DrMon method #######
+  def SetView(self, view):
+    '''Display the histograms of a trigger view (all, phys, pede, oth)'''
+    if view not in self.hViews:
+      print('Invalid view, use one of', ' '.join(self.hViews))
+      return
+    self.view  = view
+    self.hDict = self.hViews[view]
+    print(BLU, "Displaying trigger view", view, NOCOLOR)
+
+  ##### DrMon method #######
+  def SetFillColor(self, col):
+    '''Set fill color'''
+    for h in self.allHistos().values():
+      h.SetFillColor(col)
+
+
+  ##### DrMon method #######
+  def centerOfGravity(self, weight, neg, pos):
+    '''Calculate center of gravity of 2 couples of numbers
+       the 1st set positioned at -weight and the 2nd at +weight'''
+    norm = sum(neg) + sum(pos)
+    if norm == 0:
+      return None
+    numerator = -weight*sum(neg) + weight*sum(pos)
+    return numerator/norm
+
+
+  ##### DrMon method #######
+  def getEngine(self):
+    '''Fill engine, built on the booked histograms at the first fill'''
+    if self.engine is None:
+      views = dict((v, self.hViews[v]) for v in TriggerViews if v in self.hViews)
+      self.engine = FillEngine(self.hViews["all"], MAPADC, self.trigCut, DwcSetup.fromMap(MAPTDC), views)
+    return self.engine
+
+  ##### DrMon method #######
+  def hFill(self, event):
+    '''Fill the histogram with one event'''
+    self.getEngine().fill(event)
+
+  ##### DrMon method #######
+  def hFillBatch(self, batch):
+    '''Fill the histogram with a batch of events, return its CalibratedBatch'''
+    return self.getEngine().fillBatch(batch)
+
+
+  ##### DrMon method #######
+  def updatePedestals(self, batch):
+    '''Update the running pedestals with the pedestal-trigger events of a batch: the calibration
+       uses them from this batch on, and they are periodically written to PathToPedestals'''
+    n = self.pedestals.nevents
+    self.pedestals.updateBatch(batch)
+    if self.pedestals.nevents == 0:
+      return
+    calib = self.getEngine().calib
+    calib.setPedestals(self.pedestals.pedestals(calib.pedestal))
+    if self.pedestals.nevents > n:
+      try:
+        self.pedestals.maybeWrite(PathToPedestals, MAPADC)
+      except OSError as err:
+        print(RED, "[WARNING] Cannot write the pedestals:", err, NOCOLOR)
+
+  ##### DrMon method #######
+  def processBatch(self, batch):
+    '''Update the pedestals, fill the histograms and the spill counters with a batch of events'''
+    self.updatePedestals(batch)
+    energy = self.hFillBatch(batch)
+    self.spills.addBatch(batch, energy, batch.errors)
+
+  ##### DrMon method #######
+  def addDiscarded(self, builder, spill=None):
+    '''Count a discarded event in the spill statistics, after the events before it still in the builder'''
+    if len(builder):
+      self.processBatch(builder.flush())
+    self.spills.addDiscarded(spill)
+
+  ##### DrMon method #######
+  def runFinished(self):
+    '''True if the run file is no longer written: the samplers then also yield what they hold back
+       for a growing file (last spill of the reservoir, last line without newline)'''
+    if self.compressed:
+      return True
+    try:
+      return time.time() - os.path.getmtime(self.fname) > RunIdleTime
+    except OSError:
+      return False
+
+  ##### DrMon method #######
+  def readFile(self, offset=0):
+    '''Read raw ascii data from file starting from line offset, call the decoding function,
+       fill the histograms. If offset is the next line to read, reading restarts from the
+       byte position reached by the previous call (or restored from the cache).
+       Compressed files are decompressed on the fly (see run_reader)'''
+    if self.compressed and self.atEnd and offset >= self.nextLine:
+      return
+    print("Read and parse. Type CTRL+C to interrupt")
+    complete = not self.runFinished() # lines may still be written
+
+    global stop
+    stop = False
+    step=1
+    builder = BatchBuilder(BatchSize)
+    sampler = self.sampler
+    if isinstance(sampler, sampling.Stride) and not self.compressed:
+      try:
+        sampler.offsets = run_reader.build_index(self.fname) # skipped lines are not read
+      except OSError as err:
+        print(RED, "[WARNING] Cannot write the offset index:", err, NOCOLOR)
+        sampler.offsets = run_reader.line_offsets(self.fname)
+    with run_reader.open_run(self.fname) as f:
+      first = 0
+      if offset >= self.nextLine > 0 and not self.compressed:
+        f.seek(self.lastOffset)
+        first = self.nextLine
+      pos = self.lastOffset if first else 0
+      for i, pos, raw, w in sampler.records(f, first, pos, complete = complete):
+        if stop or i > self.maxEvts: break
+        self.lastLine   = i
+        self.nextLine   = i + 1
+        self.lastOffset = pos
+        if i < offset: continue
+        ev = DREvent.DRdecode(raw.decode(), lazy = True)
+        if ev == None:
+          self.addDiscarded(builder) # header not valid: spill unknown
+          continue
+        if self.trigCut and ev.TriggerMask != self.trigCut:
+          # header only: counted in the spill statistics, payload never decoded
+          self.nDecoded += 1
+          self.wDecoded += w
+          if not self.sampled: self.continuity.add(ev.EventNumber)
+          builder.append(ev.EventNumber, ev.SpillNumber, ev.EventTime, ev.TriggerMask, {}, {}, weight = w)
+          if builder.full():
+            self.processBatch(builder.flush())
+          continue
+        if not self.sampled: self.continuity.addEvent(ev) # decodes the payload
+        if not ev.ADCs and ev.Discarded:
+          self.addDiscarded(builder, ev.SpillNumber)
+          continue
+        self.nDecoded += 1
+        self.wDecoded += w
+        if i==0:
+          print(ev.headLine())
+        if i%step==0: print(ev)
+        if i>step*10: step=step*10
+        builder.appendEvent(ev, w)
+        if builder.full():
+          self.processBatch(builder.flush())
+        self.lastEv = ev
+      else:
+        # position after the lines read beyond the last sampled one
+        self.nextLine   = sampler.nextLine
+        self.lastLine   = max(self.nextLine - 1, 0)
+        self.lastOffset = sampler.offset
+        self.atEnd = self.compressed and not stop
+    if len(builder):
+      self.processBatch(builder.flush())
+    self.tagHistos()
+
+  ##### DrMon method #######
+  def loadCache(self):
+    '''Restore histograms and read position of this run from the cache'''
+    if self.cache is None:
+      return False
+    meta = self.cache.load(self.fname, self.allHistos(), sampling=self.sampler.tag(), trigCut=self.trigCut)
+    if meta is None:
+      return False
+    self.nextLine   = meta["line"]
+    self.lastLine   = max(self.nextLine - 1, 0)
+    self.lastOffset = meta["offset"]
+    self.atEnd      = meta.get("atEnd", False)
+    self.spills.restore(meta["spills"])
+    self.nDecoded   = meta["nDecoded"]
+    self.wDecoded   = meta["wDecoded"]
+    self.continuity.restore(meta["continuity"])
+    if meta.get("pedestals"):
+      self.pedestals.restore(meta["pedestals"])
+    if meta["lastEv"]:
+      self.lastEv = DREvent.DREvent()
+      for k, v in meta["lastEv"].items():
+        setattr(self.lastEv, k, v)
+    print(BLU, "Histograms restored from cache", self.cache.pathFor(self.fname), "- %d lines already processed" % self.nextLine, NOCOLOR)
+    return True
+
+  ##### DrMon method #######
+  def saveCache(self):
+    '''Save histograms and read position of this run in the cache'''
+    if self.cache is None or self.nextLine == 0:
+      return
+    lastEv = None
+    if self.lastEv is not None:
+      lastEv = dict((k, getattr(self.lastEv, k)) for k in ("EventNumber", "EventTime", "SpillNumber", "NumOfPhysEv", "NumOfPedeEv", "NumOfSpilEv", "TriggerMask"))
+    # lines held back by the sampler (open spill of the reservoir) are read again after a restore
+    line, offset = self.sampler.pending or (self.nextLine, self.lastOffset)
+    state = {"line": line, "offset": offset, "sampling": self.sampler.tag(), "trigCut": self.trigCut,
+             "nDecoded": self.nDecoded, "wDecoded": self.wDecoded,
+             "atEnd": self.atEnd, "spills": self.spills.state(),
+             "continuity": self.continuity.state(), "pedestals": self.pedestals.state(), "lastEv": lastEv}
+    try:
+      self.cache.save(self.fname, self.allHistos(), state)
+    except OSError as err:
+      print(RED, "[WARNING] Cannot write the histogram cache:", err, NOCOLOR)
+
+  ##### DrMon method #######
+  def dumpHelp(self):
+    '''Write the list of available histograms'''
+    print(BLU, end=' '); print("Available histograms:", NOCOLOR)
+    l = sorted(self.hDict.keys())
+    lTdc =  [x for x in l if x.startswith("tdc-")]
+    lAdc =  [x for x in l if x.startswith("adc-")]
+    lOth =  [x for x in l if not x.startswith("adc-") and not x.startswith("tdc-") ]
+    print("  %-8s   %-8s   %-8s " % ( lTdc[0], '--->', lTdc[-1] ))
+    print("  %-8s   %-8s   %-8s " % ( lAdc[0], '--->', lAdc[-1] ))
+    for i, h in enumerate( lOth ):
+      print("  %-8s" % h, end=' ')
+      if (i+1)%8==0: print("")
+
+    print(BLU); print("Available histograms, aliases:", NOCOLOR)
+    for i, h in enumerate( sorted( self.histoMap.keys() ) ):
+      print("  %-8s" % h, end=' ')
+      if (i+1)%8==0: print("")
+
+    print(BLU); print("Special canvases (calo maps, fers, etc ...)", NOCOLOR)
+    for i, h in enumerate( self.cmdShCutsV ):
+      print("%2d) %-12s" % (i,h), end=' ')
+      if (i+1)%5==0: print("")
+
+    print(BLU)
+    print("Other commands:", NOCOLOR)
+    print("   l 0/1     SetLogY")
+    print("   z 0/1     SetLogZ")
+    print("   c color   Change the color of all histos")
+    print("   r nEvts   Read other nEvts events")
+    print("   s         Dump file statistics")
+    print("   v view    Display the trigger view: all, phys, pede, oth (now: %s)" % self.view)
+    print("   R         Dump the event rate of the last spills")
+    print("   q         Quit")
+
+
+  ##### DrMon method #######
+  def createCanvas(self, dim):
+    '''Create a canvas'''
+    s="Run" + self.runNum + ": "
+    if   dim == 9:
+      self.canvas = ROOT.TCanvas('c9', s+'PMT TOWERS',0 , 0, 800, 800)
+      self.canvas.Divide(3,3)
+    elif dim == 8:
+      self.canvas = ROOT.TCanvas('c8', s+'IDEA-DR8', 0, 0, 800, 1000)
+      self.canvas.Divide(2,4)
+    elif dim == 4:
+      self.canvas = ROOT.TCanvas('c4', s+'IDEA-DR4', 0, 0, 800, 800)
+      self.canvas.Divide(2,2)
+    elif dim == 6:
+      self.canvas = ROOT.TCanvas('c6', s+'IDEA-DR6', 0, 0, 1000, 600)
+      self.canvas.Divide(3,2)
+    elif dim == 2:
+      self.canvas = ROOT.TCanvas('c2', s+'IDEA-DR2', 0, 0, 500, 1000)
+      self.canvas.Divide(1,2)
+    else:
+      self.canvas = ROOT.TCanvas('c1', s+'IDEA-DR', 0, 0, 800, 600)
+    self.canNum = dim
+
+  ##### DrMon method #######
+  def setLogY(self, val):
+    '''Set/unset logY scale'''
+    val = self.ToNumber(val)
+    if val == None:
+      return
+    if self.canNum == 1:
+      self.canvas.SetLogy(val)
+    else:
+      for i in range(1,self.canNum+1) :
+        self.canvas.cd(i).SetLogy(val)
+    print("SetLogy =", val)
+
+  ##### DrMon method #######
+  def setLogZ(self, val):
+    '''Set/unset logZ scale'''
+    val = self.ToNumber(val)
+    if val == None:
+      return
+    if self.canNum == 1:
+      self.canvas.SetLogz(val)
+    print("SetLogz =", val)
+
+  ##### DrMon method #######
+  def DrawDwcTDCs(self, opt=""):
+    '''Draw the DWC TDCs'''
+    if self.canNum != 8:
+      self.createCanvas(8)
+    for i in range (8):
+      self.canvas.cd(i+1);
+      self.hDict[ "tdc-%03d" % i ].Draw()
+    self.canvas.Update()
+
+
+  ##### DrMon method #######
+  def DrawDwcBeamProfile(self, opt=""):
+    '''Draw the beam profile histograms'''
+    if self.canNum != 2:
+      self.createCanvas(2)
+    self.canvas.cd(1);  self.hDict[ "dw1XY" ].Draw('col')
+    self.canvas.cd(2);  self.hDict[ "dw2XY" ].Draw('col')
+    self.canvas.Update()
+
+  ##### DrMon method #######
+  def DrawDwcBeamProfile_mm(self, opt=""):
+    '''Draw the beam profile histograms in mm'''
+    if self.canNum != 2:
+      self.createCanvas(2)
+    self.canvas.cd(1);  self.hDict[ "dw1XY_mm" ].Draw('zcol')
+    self.canvas.cd(2);  self.hDict[ "dw2XY_mm" ].Draw('zcol')
+    self.canvas.Update()
+
+  ##### DrMon method #######
+  def DrawFers(self, opt=""):
+    '''Draw the Fers channels'''
+    if self.canNum != 6:
+      self.createCanvas(6)
+    for i in range(5):
+      self.canvas.cd(i+1)
+      s = "fers-%d" % (i)
+      print(s)
+      self.hDict[ self.histoMap[s] ].Draw()
+    self.canvas.Update()
+
+  ##### DrMon method #######
+  def DrawPmtAdcMapC(self, opt=""):
+    '''Draw the PMT map for Cherenkov channels'''
+    # -- Channel---    -- ADC Ch ---   -- PadsNum --
+    # | 8 | 7 | 6 |    | 7 | 6 | 5 |   | 1 | 2 | 3 |
+    # | 5 |   | 4 |    | 4 |   | 3 |   | 4 | 5 | 6 |
+    # | 3 | 2 | 1 |    | 2 | 1 | 0 |   | 7 | 8 | 9 |
+    # -------------    -------------   -------------
+    if self.canNum != 9:
+      self.createCanvas(9)
+    ch=7
+    for i in range(1,10):
+      if i == 5: continue
+      self.canvas.cd(i)
+      self.hDict[ "adc-%03d" % ch ].Draw()
+      ch -= 1
+    self.canvas.Update()
+
+  ##### DrMon method #######
+  def DrawPmtAdcMapS(self, opt=""):
+    '''Draw the PMT map for Scintillator channels'''
+    # -- Channel---    -- ADC Ch ---      -- PadsNum --
+    # | 8 | 7 | 6 |    | 15 | 14 | 13 |   | 1 | 2 | 3 |
+    # | 5 |   | 4 |    | 12 |    | 11 |   | 4 |   | 6 |
+    # | 3 | 2 | 1 |    | 10 |  9 |  8 |   | 7 | 8 | 9 |
+    # -------------    -------------      -------------
+    if self.canNum != 9:
+      self.createCanvas(9)
+    ch=15
+    for i in range(1,10):
+      if i == 5: continue
+      self.canvas.cd(i)
+      self.hDict[ "adc-%03d" % ch ].Draw()
+      ch -= 1
+    self.canvas.Update()
+
+
+  ##### DrMon method #######
+  def DrawTotalEnergyInCalo(self, opt=""):
+    '''Draw the total energy in calo PMT'''
+    if self.canNum != 2:
+      self.createCanvas(2)
+    self.canvas.cd(1); self.hDict['PmtTotS'].Draw()
+    self.canvas.cd(2); self.hDict['PmtTotC'].Draw()
+    self.canvas.Update()
+
+  ##### DrMon method #######
+  def PmtHitMaps(self, opt="lego2"):
+    '''Draw the PMT hit maps'''
+    if self.canNum != 2:
+      self.createCanvas(2)
+    self.canvas.cd(1); self.hDict['HitMap_S'].Draw(opt)
+    self.canvas.cd(2); self.hDict['HitMap_C'].Draw(opt)
+    self.canvas.Update()
+
+
+  ##### DrMon method #######
+  def DrawSingleHisto(self, cmd, opt):
+    '''Draw single histogram'''
+
+    if self.canNum != 1:
+      self.createCanvas(1)
+
+    h = None
+    hname = cmd
+    if hname in self.histoMap:
+      h = self.hDict[ self.histoMap[hname] ]
+    elif hname in self.hDict:
+      h = self.hDict[hname]
+    else:
+      print(RED, BOLD, 'Unknown histogram', NOCOLOR)
+      return
+    if opt == "same":
+      h.SetFillColor( h.GetFillColor() + 3 )
+    h.Draw(opt)
+    nBins=h.GetNbinsX()
+    uFlow = h.GetBinContent(0)
+    oFlow = h.GetBinContent(nBins+1)
+    if uFlow + oFlow > 0:
+      print(BOLD)
+      print("Underflow:", h.GetBinContent(0))
+      print("Overflow :", h.GetBinContent(nBins+1))
+      print(NOCOLOR)
+    self.canvas.Update()
+
+  ##### DrMon method #######
+  def hDictDrawAndFit(self, hname):
+    '''Utility method'''
+    h = self.hDict[ hname ]
+    h.Draw()
+    h.Fit("gaus")
+
+  ##### DrMon method #######
+  def DumpStats(self):
+    print(BLU, BOLD)
+    print('File name:', self.fname)
+    print('Events   :', self.lastEv.EventNumber)
+    print('PhysEv   :', self.lastEv.NumOfPhysEv)
+    print('PedeEv   :', self.lastEv.NumOfPedeEv)
+    print('SpilEv   :', self.lastEv.NumOfSpilEv)
+    self.NumOfLinesOfThisFile()
+    print('#OfLines :', self.numOfLines)
+    if self.engine is not None and self.engine.nUnbooked + self.engine.nMissing > 0:
+      print('Unbooked :', self.engine.nUnbooked, 'channels without histogram')
+      print('Missing  :', self.engine.nMissing, 'mapped PMT channels not in the events')
+    if self.sampled and self.nDecoded:
+      print('Sampling :', self.sampler.tag(), '- %d events decoded, %.0f represented (mean weight %.3g)' % (
+            self.nDecoded, self.wDecoded, self.wDecoded / self.nDecoded))
+    if self.pedestals.nevents:
+      print('Pedestals:', self.pedestals.nevents, 'pedestal events, running pedestals in', PathToPedestals)
+    if not self.sampled and self.continuity.nevents:
+      self.continuity.dump()
+    print(NOCOLOR)
+
+  ##### DrMon method #######
+  def readMore(self, val):
+    '''Interactive commander '''
+    optInt=-1
+    try: optInt=int(val)
+    except ValueError: print('Invalid parameter'); return
+    if optInt>=0:
+      self.maxEvts = self.nextLine + optInt
+      self.readFile(self.nextLine)
+      self.saveCache()
+
+
+  ##### DrMon method #######
+  def ToNumber(self, val):
+    '''Interactive commander '''
+    if not isinstance(val, int):
+      try: return int(val)
+      except ValueError:
+        print('Not an integer')
+        return None
+    return None
+
+  ##### DrMon method #######
+  def commander(self):
+    '''Interactive commander '''
+
+    self.createCanvas(1)
+    while True:
+      # Command
+      self.dumpHelp()
+      print(BLUBOLD + "\n__________________________________________________")
+      line = input( 'DrMon prompt --> ' + NOCOLOR)
+      pars = line.split()
+      if len(pars) == 0: continue
+      cmd = pars[0]
+      opt = ""
+      if len(pars) > 1:
+        opt = pars[1]
+
+      if   cmd == "q": print("Bye"); sys.exit(0)
+      elif cmd == "l": self.setLogY(opt)
+      elif cmd == "z": self.setLogZ(opt)
+      elif cmd == "s": self.DumpStats()
+      elif cmd == "c": self.SetFillColor(opt)
+      elif cmd == "r": self.readMore(opt)
+      elif cmd == "R": self.DumpRateOfCurrentRun()
+      elif cmd == "v": self.SetView(opt)
+      elif cmd in self.cmdShCuts:  # SHORTCUTS
+        self.cmdShCuts[cmd](opt)
+      elif cmd.isdigit():          # SHORTCUTS WITH DIGITS
+        hIdx = int(cmd)
+        if hIdx < len(self.cmdShCuts):
+          self.cmdShCuts[ self.cmdShCutsV[hIdx] ](opt)
+      else:
+        self.DrawSingleHisto(cmd, opt)
+
+
+def Usage():
+  print("Read raw data from text file and create monitor histograms")
+  print("Usage: DrMon.py [options]")
+  print("   -f fname    Data file to analize (def=the latest data file)")
+  print("   -e maxEv    Maximum numver of events to be monitored (def=inf)")
+  print("   -s sample   Analyze only one event every 'sample'")
+  print("   -k nEvents  Analyze nEvents random events per spill")
+  print("   -b seconds  Analyze as many events as can be decoded in 'seconds' of CPU per read")
+  print("   -r runNbr   Analyze run number runNbr")
+  print("   -t trigCut  Trigger cut [1=phys, 2=pede]")
+  print("   -n          Do not use the histogram cache")
+  sys.exit(2)
+
+
+################################################################
+# MAIN #########################################################
+################################################################
+if __name__ == "__main__":
+  # Parse command line
+  fname  = ""
+  events = 999999999
+  sample = 1
+  run    = 0
+  trigCut= 0
+  useCache = True
+  reservoir = 0
+  budget = 0.
+  try:
+    opts, args = getopt.getopt(sys.argv[1:], "hf:e:s:r:t:nk:b:")
+  except getopt.GetoptError as err:
+    print(str(err))
+    Usage()
+  for o,a in opts:
+    if    o == "-h": Usage()
+    elif  o == "-f": fname    = a
+    elif  o == "-e": events   = int(a)
+    elif  o == "-s": sample   = int(a)
+    elif  o == "-r": run      = int(a)
+    elif  o == "-t": trigCut  = int(a)
+    elif  o == "-n": useCache = False
+    elif  o == "-k": reservoir = int(a)
+    elif  o == "-b": budget   = float(a)
+
+  if run > 0:
+    fname = "sps2023data.run%s.txt" % run
+    fname = PathToData + fname
+  elif len(fname) < 1:
+    list_of_files = glob.glob( PathToData + 'sps2023data*txt' )
+    fname = max(list_of_files, key=os.path.getctime)
+
+  found = run_reader.find_run(fname)
+  if found is None:
+    print(RED, "[ERROR] File", fname, "not found", NOCOLOR)
+    sys.exit(404)
+  fname = found
+
+  # Install signal handler to interrupt file reading
+  signal(SIGINT, handler)
+
+  print('Analyzing', fname)
+  drMon = DrMon(fname, events, sample, trigCut, useCache, reservoir, budget)
+  drMon.bookAll(512)
+  drMon.SetFillColor(42)
+  drMon.loadCache()
+  drMon.readFile(drMon.nextLine)
+  drMon.saveCache()
+  drMon.commander()
@@ -0,0 +1,116 @@
+# calibration.py
+# Pedestal subtraction and calibrated S/C energy sums on batches of events (python3 + numpy)
+
+import json
+import numpy as np
+from event_batch import NumAdcChannels
+
+
+def load_channel_map(path):
+    '''Load a channel json (channels2025adc.json format) as dict int(addr) -> entry'''
+    with open(path, "r") as f:
+        m = json.load(f)
+    return dict((int(ch), m[ch]) for ch in m.keys())
+
+
+def tower_of(phys):
+    '''"105-S" -> ("105", "S"); None for channels that are not calorimeter PMTs'''
+    name, _, fiber = phys.rpartition("-")
+    if fiber not in ("S", "C") or not name.isdigit():
+        return None
+    return name, fiber
+
+
+class CalibratedBatch:
+    ''' Result of Calibration.calibrate, arrays with one row per event:
+      - S, C      : (N,) total S and C signal
+      - ratio     : (N,) S/C, nan when C is 0
+      - towerS    : (N, nTowers) S signal per tower, column order as in towers
+      - towerC    : (N, nTowers) C signal per tower
+    '''
+
+    def __init__(self, towers, towerS, towerC):
+        self.towers = towers
+        self.towerS = towerS
+        self.towerC = towerC
+        self.S = towerS.sum(axis=1)
+        self.C = towerC.sum(axis=1)
+        self.ratio = np.full(len(self.S), np.nan)
+        np.divide(self.S, self.C, out=self.ratio, where=self.C != 0)
+
+    def select(self, rows):
+        '''New CalibratedBatch with the rows selected by a boolean mask or an index array'''
+        out = CalibratedBatch.__new__(CalibratedBatch)
+        out.towers = self.towers
+        for k in ("towerS", "towerC", "S", "C", "ratio"):
+            setattr(out, k, getattr(self, k)[rows])
+        return out
+
+
+class Calibration:
+    ''' Per-channel calibration of the ADC channels:
+      - pedestal  : subtracted from the raw counts
+      - threshold : channels with (counts - pedestal) <= threshold are set to 0
+      - gain      : multiplies the pedestal subtracted counts (default 1)
+    The towers are taken from the PMT names ("105-S", "105-C", ...) of the channel map
+    and the whole batch is reduced to tower energies with a single matrix product.
+    '''
+
+    def __init__(self, mapadc, gains=None, nchannels=NumAdcChannels):
+        '''mapadc: dict addr -> {"phys", "pedestal", "monthreshold"[, "gain"]}
+           gains : optional dict addr -> gain, it overrides the "gain" entries of the map'''
+        self.nchannels = nchannels
+        self.pedestal = np.zeros(nchannels)
+        self.threshold = np.zeros(nchannels)
+        self.gain = np.ones(nchannels)
+
+        self.towers = sorted(set(tower_of(e["phys"])[0] for e in mapadc.values() if tower_of(e["phys"])))
+        tidx = dict((t, i) for i, t in enumerate(self.towers))
+        nt = len(self.towers)
+        # Columns [0, nt) collect S, [nt, 2nt) collect C
+        self.weights = np.zeros((nchannels, 2*nt))
+
+        for ch, entry in mapadc.items():
+            if ch >= nchannels:
+                continue
+            self.pedestal[ch] = entry.get("pedestal", 0)
+            self.threshold[ch] = entry.get("monthreshold", 0)
+            self.gain[ch] = entry.get("gain", 1.)
+            tw = tower_of(entry["phys"])
+            if tw:
+                self.weights[ch, tidx[tw[0]] + (0 if tw[1] == "S" else nt)] = 1.
+        if gains:
+            for ch, g in gains.items():
+                self.gain[int(ch)] = g
+
+    @classmethod
+    def fromJson(cls, path, gains=None):
+        return cls(load_channel_map(path), gains)
+
+    def setPedestals(self, pedestal):
+        '''Replace the pedestals with an array of nchannels values'''
+        self.pedestal = np.asarray(pedestal, dtype=float).copy()
+
+    def subtract(self, batch):
+        '''(N, nchannels) pedestal subtracted, thresholded and gain corrected signals'''
+        sig = batch.adc[:, :self.nchannels] - self.pedestal
+        keep = batch.adc_ok[:, :self.nchannels] & (sig > self.threshold)
+        return np.where(keep, sig * self.gain, 0.)
+
+    def calibrateEvent(self, adcs):
+        '''(S, C) total signals of one event from its ADCs dict (address: counts)'''
+        addr = np.fromiter(adcs.keys(), np.int64, len(adcs))
+        counts = np.fromiter(adcs.values(), float, len(adcs))
+        m = addr < self.nchannels
+        addr, counts = addr[m], counts[m]
+        sig = counts - self.pedestal[addr]
+        sig = np.where(sig > self.threshold[addr], sig * self.gain[addr], 0.)
+        energy = sig @ self.weights[addr]
+        nt = len(self.towers)
+        return float(energy[:nt].sum()), float(energy[nt:].sum())
+
+    def calibrate(self, batch):
+        '''Calibrate an EventBatch, returns a CalibratedBatch'''
+        energy = self.subtract(batch) @ self.weights
+        nt = len(self.towers)
+        return CalibratedBatch(self.towers, energy[:, :nt], energy[:, nt:])
@@ -0,0 +1,189 @@
+# channel_map.py
+# Compiled channel maps: raw addresses scattered into physical-channel arrays (python3 + numpy)
+#
+# A ChannelMap is built once from channels2025adc.json/channels2025tdc.json (or the
+# MAPADC/MAPTDC dicts of DrMon, or AdcMap25.adcMapDictionary) and holds, for every raw
+# address, the column of its physical channel (-1 if unmapped). Scattering the decoded
+# values of an event or of an EventBatch into arrays ordered by physical channel is then a
+# single numpy index, and the physical channels are reached by name or by tower without
+# remapping through string keys ("adc-%03d") on every event.
+# Addresses that are not in the map are counted (nunmapped) instead of raising KeyError, as
+# are the mapped channels missing from an event (nmissing, ok flag False).
+# Usage:
+#   pmap = PhysMap.fromJson("channels2025adc.json", "channels2025tdc.json")
+#   ev = DREvent.DRdecode(line, chmap = pmap)
+#   ev.Phys.get("preshower"), ev.Phys.towerS, ev.Phys.get("dwc1-l", "tdc")
+#   phys = pmap.scatterBatch(batch)    # (N, nchannels) arrays
+
+import numpy as np
+from calibration import load_channel_map, tower_of
+from event_batch import NumAdcChannels, NumTdcChannels
+
+
+class ChannelMap:
+    ''' Raw address -> physical channel of one kind of channels (ADC or TDC).
+    names: physical channel names, in the order of the map (columns of the arrays)
+    addr: raw address of each column; column: column of each raw address (-1 if unmapped,
+    addresses >= naddr at column[naddr])
+    towers: calorimeter towers ("105", ...) with their S and C columns (towerS, towerC, -1 if absent)
+    Counters: nunmapped (values at addresses not in the map), nmissing (mapped channels
+    missing from an event) '''
+
+    def __init__(self, entries, naddr):
+        '''entries: (address, physical name) pairs in physical channel order'''
+        entries = [(int(a), name) for a, name in entries]
+        bad = [a for a, _ in entries if not 0 <= a < naddr]
+        if bad:
+            raise ValueError("Addresses out of range [0, %d): %s" % (naddr, bad))
+        self.naddr = naddr
+        self.names = [name for _, name in entries]
+        self.addr = np.array([a for a, _ in entries], dtype=np.int64)
+        self.column = np.full(naddr + 1, -1, dtype=np.int64)   # last: any address >= naddr
+        self.column[self.addr] = np.arange(len(entries))
+        self.index = dict((name, i) for i, name in enumerate(self.names))
+        towers = {}
+        for i, name in enumerate(self.names):
+            tw = tower_of(name)
+            if tw:
+                towers.setdefault(tw[0], [-1, -1])[tw[1] == "C"] = i
+        self.towers = sorted(towers)
+        self.towerS = np.array([towers[t][0] for t in self.towers], dtype=np.int64)
+        self.towerC = np.array([towers[t][1] for t in self.towers], dtype=np.int64)
+        self.nunmapped = 0
+        self.nmissing = 0
+
+    @classmethod
+    def fromDict(cls, mapping, naddr=NumAdcChannels):
+        '''From a dict addr -> {"phys": name, ...} (calibration.load_channel_map, MAPADC)'''
+        return cls([(a, mapping[a]["phys"]) for a in mapping], naddr)
+
+    @classmethod
+    def fromJson(cls, path, naddr=NumAdcChannels):
+        return cls.fromDict(load_channel_map(path), naddr)
+
+    @classmethod
+    def fromAdcMap(cls, adcMapDictionary, naddr=NumAdcChannels):
+        '''From AdcMap25.adcMapDictionary (physical name -> ADC)'''
+        return cls([(adc.addr, name) for name, adc in adcMapDictionary.items()], naddr)
+
+    def __len__(self):
+        return len(self.names)
+
+    def col(self, name):
+        '''Column of a physical channel'''
+        return self.index[name]
+
+    def scatter(self, addr, values, out, ok):
+        '''Put values (arrays of raw addresses and values of one event) into out[column];
+           ok is set for the channels present'''
+        c = self.column[np.minimum(addr, self.naddr)]
+        m = c >= 0
+        cm = c[m]
+        self.nunmapped += len(c) - len(cm)
+        out[cm] = values[m] if len(cm) < len(c) else values
+        ok[cm] = True
+        self.nmissing += len(self.names) - len(cm)   # addresses of an event are unique
+
+    def take(self, arr, present):
+        '''(N, nchannels) columns of an (N, naddr) array indexed by address and their ok flags;
+           present: (N, naddr) bool of the decoded addresses'''
+        self.nunmapped += int(np.count_nonzero(present)) - int(np.count_nonzero(present[:, self.addr]))
+        ok = present[:, self.addr]
+        self.nmissing += ok.size - int(np.count_nonzero(ok))
+        return arr[:, self.addr], ok
+
+    def counters(self):
+        return {"nchannels": len(self.names), "nunmapped": self.nunmapped, "nmissing": self.nmissing}
+
+
+class PhysChannels:
+    ''' Decoded values by physical channel: adc/adc_ok (columns of the ADC map), tdc/tdcflag/
+    tdc_ok (columns of the TDC map); arrays of one event, or (N, nchannels) for a batch '''
+
+    def __init__(self, pmap, adc, adc_ok, tdc, tdcflag, tdc_ok):
+        self.map = pmap
+        self.adc = adc
+        self.adc_ok = adc_ok
+        self.tdc = tdc
+        self.tdcflag = tdcflag
+        self.tdc_ok = tdc_ok
+
+    def get(self, name, kind="adc"):
+        '''Value of a physical channel (None if missing from the event); for a batch the
+           column, with 0 where missing (see ok)'''
+        m = self.map.adc if kind == "adc" else self.map.tdc
+        i = m.col(name)
+        vals, ok = (self.adc, self.adc_ok) if kind == "adc" else (self.tdc, self.tdc_ok)
+        if vals.ndim == 1:
+            return int(vals[i]) if ok[i] else None
+        return vals[:, i]
+
+    def ok(self, name, kind="adc"):
+        m = self.map.adc if kind == "adc" else self.map.tdc
+        return (self.adc_ok if kind == "adc" else self.tdc_ok)[..., m.col(name)]
+
+    def _tower(self, cols):
+        v = np.where(self.adc_ok, self.adc, 0)[..., np.maximum(cols, 0)]
+        v[..., cols < 0] = 0
+        return v
+
+    @property
+    def towerS(self):
+        '''Raw S counts per tower (map.adc.towers order), 0 if missing'''
+        return self._tower(self.map.adc.towerS)
+
+    @property
+    def towerC(self):
+        return self._tower(self.map.adc.towerC)
+
+    def tower(self, name):
+        '''(S, C) raw counts of a tower ("105"), None for a missing fiber'''
+        i = self.map.adc.towers.index(name)
+        s, c = self.map.adc.towerS[i], self.map.adc.towerC[i]
+        return (self.get(self.map.adc.names[s]) if s >= 0 else None,
+                self.get(self.map.adc.names[c]) if c >= 0 else None)
+
+
+class PhysMap:
+    ''' ADC and TDC ChannelMaps; passed to DRdecode(..., chmap = pmap) it fills ev.Phys '''
+
+    def __init__(self, adc, tdc=None):
+        self.adc = adc
+        self.tdc = tdc if tdc is not None else ChannelMap([], NumTdcChannels)
+
+    @classmethod
+    def fromJson(cls, adcPath="channels2025adc.json", tdcPath="channels2025tdc.json"):
+        return cls(ChannelMap.fromJson(adcPath, NumAdcChannels),
+                   ChannelMap.fromJson(tdcPath, NumTdcChannels) if tdcPath else None)
+
+    @classmethod
+    def fromAdcMap(cls, adcMapDictionary, tdcPath=None):
+        return cls(ChannelMap.fromAdcMap(adcMapDictionary, NumAdcChannels),
+                   ChannelMap.fromJson(tdcPath, NumTdcChannels) if tdcPath else None)
+
+    def scatter(self, adc, tdc):
+        '''PhysChannels of one event from the decodeblock dicts (addr: value, ch: (value, flag))'''
+        a = np.zeros(len(self.adc), dtype=np.int32)
+        aok = np.zeros(len(self.adc), dtype=bool)
+        if adc:
+            self.adc.scatter(np.fromiter(adc.keys(), np.int64, len(adc)),
+                             np.fromiter(adc.values(), np.int64, len(adc)), a, aok)
+        else:
+            self.adc.nmissing += len(self.adc)
+        t = np.zeros((len(self.tdc), 2), dtype=np.int32)   # (value, flag)
+        tok = np.zeros(len(self.tdc), dtype=bool)
+        if tdc:
+            self.tdc.scatter(np.fromiter(tdc.keys(), np.int64, len(tdc)),
+                             np.array(list(tdc.values()), dtype=np.int64), t, tok)
+        else:
+            self.tdc.nmissing += len(self.tdc)
+        return PhysChannels(self, a, aok, t[:, 0], t[:, 1].astype(np.int8), tok)
+
+    def scatterBatch(self, batch):
+        '''PhysChannels with (N, nchannels) arrays of an EventBatch'''
+        a, aok = self.adc.take(batch.adc, batch.adc_ok)
+        t, tok = self.tdc.take(batch.tdc, batch.tdc_ok)
+        return PhysChannels(self, a, aok, t, batch.tdcflag[:, self.tdc.addr], tok)
+
+    def counters(self):
+        return {"adc": self.adc.counters(), "tdc": self.tdc.counters()}
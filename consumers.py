@@ -0,0 +1,187 @@
+# consumers.py
+# Fan-out of decoded events to consumer plugins (python3 + numpy)
+#
+# The reader thread decodes every event once and offers it to the registered consumers.
+# Each consumer runs on its own thread with its own bounded queue, so that a slow consumer
+# (histogramming, export, alarms, ...) never stalls the reader. When the queue of a
+# consumer is full the overflow policy decides what happens to the new item:
+#  - Block:      wait for room, at most blockTimeout seconds, then drop the item
+#  - DropOldest: drop the oldest queued item to make room (the consumer sees the freshest data)
+#  - Sample:     above half of the queue size keep only one item every sampleEvery,
+#                drop the new item when the queue is full
+# Items are (line number, DREvent or None for a discarded event, payload fraction). The
+# fraction is the share of the events whose payload is decoded while the reader sheds load
+# (1 otherwise); the other events are header-only (ev.HeaderOnly, no ADCs/TDCs). A consumer
+# either overrides process(line, ev, fraction) or, with batchSize > 0, processBatch(batch)
+# to get the events as EventBatch (discarded and header-only events are not in the
+# batches, the others have weight 1/fraction).
+
+import collections
+import threading
+import time
+from event_batch import BatchBuilder
+
+Block = "block"
+DropOldest = "drop-oldest"
+Sample = "sample"
+Policies = (Block, DropOldest, Sample)
+
+
+class Consumer:
+    ''' Base class of the consumers: override process() or processBatch()
+    Counters: noffered, nprocessed, ndropped, nerrors (exceptions raised by process) '''
+
+    def __init__(self, name=None, maxQueue=1000, policy=DropOldest, batchSize=0,
+                 blockTimeout=1., sampleEvery=10):
+        if policy not in Policies:
+            raise ValueError("Unknown overflow policy %s (%s)" % (policy, ", ".join(Policies)))
+        self.name = name or type(self).__name__
+        self.maxQueue = maxQueue
+        self.policy = policy
+        self.batchSize = batchSize
+        self.blockTimeout = blockTimeout
+        self.sampleEvery = sampleEvery
+        self.queue = collections.deque()
+        self.cond = threading.Condition()
+        self.thread = None
+        self.stopping = False
+        self.noffered = 0
+        self.nprocessed = 0
+        self.ndropped = 0
+        self.nerrors = 0
+        self.busy = 0.     # seconds spent in process/processBatch
+        self.t0 = None
+
+    # ---- to be overridden
+    def process(self, line, ev, fraction):
+        '''Called on the consumer thread for every event (ev is None if discarded)'''
+        pass
+
+    def processBatch(self, batch):
+        '''Called on the consumer thread with an EventBatch of batchSize events (batchSize > 0)'''
+        pass
+
+    def finish(self):
+        '''Called on the consumer thread after the last item'''
+        pass
+
+    # ---- reader side
+    def start(self):
+        self.t0 = time.time()
+        self.thread = threading.Thread(target=self._run, name="consumer-" + self.name, daemon=True)
+        self.thread.start()
+
+    def offer(self, item):
+        '''Queue an item with the overflow policy; returns False if it was dropped'''
+        with self.cond:
+            self.noffered += 1
+            n = len(self.queue)
+            if n >= self.maxQueue:
+                if self.policy == DropOldest:
+                    self.queue.popleft()
+                    self.ndropped += 1
+                elif self.policy == Sample:
+                    self.ndropped += 1
+                    return False
+                elif not self.cond.wait_for(lambda: len(self.queue) < self.maxQueue or self.stopping,
+                                            self.blockTimeout):
+                    self.ndropped += 1
+                    return False
+            elif self.policy == Sample and 2 * n >= self.maxQueue and self.noffered % self.sampleEvery:
+                self.ndropped += 1
+                return False
+            self.queue.append(item)
+            self.cond.notify_all()
+            return True
+
+    def stop(self, wait=True):
+        '''Process the items still queued, then stop the thread'''
+        with self.cond:
+            self.stopping = True
+            self.cond.notify_all()
+        if wait and self.thread is not None:
+            self.thread.join()
+
+    # ---- consumer thread
+    def _run(self):
+        builder = BatchBuilder(self.batchSize) if self.batchSize > 0 else None
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.queue or self.stopping)
+                items = list(self.queue)
+                self.queue.clear()
+                self.cond.notify_all()
+            if not items and self.stopping:
+                break
+            t = time.time()
+            for line, ev, fraction in items:
+                try:
+                    if builder is None:
+                        self.process(line, ev, fraction)
+                    elif ev is not None and not ev.HeaderOnly:
+                        builder.appendEvent(ev, 1. / fraction)
+                        if builder.full():
+                            self.processBatch(builder.flush())
+                except Exception as e:
+                    self.nerrors += 1
+                    if self.nerrors == 1:
+                        print("Consumer %s: %s: %s" % (self.name, type(e).__name__, e))
+                self.nprocessed += 1
+            self.busy += time.time() - t
+        try:
+            if builder is not None and len(builder):
+                self.processBatch(builder.flush())
+            self.finish()
+        except Exception as e:
+            self.nerrors += 1
+            print("Consumer %s: %s: %s" % (self.name, type(e).__name__, e))
+
+    def counters(self):
+        dt = time.time() - self.t0 if self.t0 is not None else 0.
+        return {"name": self.name, "policy": self.policy, "queued": len(self.queue),
+                "noffered": self.noffered, "nprocessed": self.nprocessed, "ndropped": self.ndropped,
+                "nerrors": self.nerrors, "rate": self.nprocessed / dt if dt > 0 else 0.,
+                "load": self.busy / dt if dt > 0 else 0.}
+
+    def line(self):
+        c = self.counters()
+        return ("%(name)-16s %(policy)-11s offered %(noffered)d processed %(nprocessed)d dropped %(ndropped)d"
+                " errors %(nerrors)d queued %(queued)d - %(rate).1f ev/s load %(load).2f" % c)
+
+
+class FanOut:
+    ''' The registered consumers of a reader. Usage:
+      fan = FanOut([PrintConsumer(), SpillConsumer(...)])
+      fan.start()
+      for line, ev in ...:
+        fan.publish(line, ev, fraction)
+      fan.stop() '''
+
+    def __init__(self, consumers=()):
+        self.consumers = list(consumers)
+
+    def register(self, consumer):
+        self.consumers.append(consumer)
+        if any(c.thread is not None for c in self.consumers[:-1]):
+            consumer.start()   # registered while running
+        return consumer
+
+    def start(self):
+        for c in self.consumers:
+            c.start()
+
+    def publish(self, line, ev, fraction=1.):
+        for c in self.consumers:
+            c.offer((line, ev, fraction))
+
+    def stop(self, wait=True):
+        for c in self.consumers:
+            c.stop(wait=False)
+        if wait:
+            for c in self.consumers:
+                if c.thread is not None:
+                    c.thread.join()
+
+    def dump(self):
+        for c in self.consumers:
+            print(c.line())
@@ -0,0 +1,182 @@
+# continuity.py
+# Streaming event number continuity and module counter check (python3 + numpy)
+#
+# The event numbers of a run must increase by one from event to event. ContinuityChecker
+# follows the stream and keeps the missing and the duplicated event numbers as run-length
+# ranges, so that the memory used does not grow with the run. In the normal case (next
+# number) an event costs one comparison.
+# The module trailers carry an event counter (parse_trail "c", DREvent.ModCounters): the
+# counters of the modules of an event must be equal, and must keep the same offset to the
+# event number, otherwise a digitizer is out of sync.
+
+import bisect
+import collections
+import numpy as np
+
+CounterMask = 0xFFFFFF  # 24 bit module event counter
+MaxRecent = 100         # event numbers kept for the last desync errors
+
+
+class ContinuityChecker:
+    ''' Usage:
+      cc = ContinuityChecker()
+      for ev in events:
+        cc.addEvent(ev)
+      cc.dump()
+    Counters: nevents, nmissing, nduplicates, noutoforder, ndesync (modules with different
+    counters in the event), njumps (module counter offset to the event number changed) '''
+
+    def __init__(self):
+        self.first = None
+        self.last = None         # highest event number seen
+        self.nevents = 0
+        self.noutoforder = 0     # events with a number lower than the previous one
+        self.missing = []        # sorted [first, last] ranges of missing event numbers
+        self.duplicates = []     # [first, last] ranges of duplicated event numbers, in stream order
+        self.ndesync = 0
+        self.njumps = 0
+        self.offsets = {}        # (crate, cratetype) -> (evtnumber - counter) of the module
+        self.desynced = collections.deque(maxlen=MaxRecent)
+
+    @property
+    def nmissing(self):
+        return sum(b - a + 1 for a, b in self.missing)
+
+    @property
+    def nduplicates(self):
+        return sum(b - a + 1 for a, b in self.duplicates)
+
+    def add(self, evtnumber, modcounters=None):
+        '''Add the event number (and module trailer counters) of the next event in the stream'''
+        self.nevents += 1
+        if modcounters:
+            self.checkCounters(evtnumber, modcounters)
+        if self.last is not None and evtnumber == self.last + 1:
+            self.last = evtnumber
+            return
+        self._addSlow(evtnumber)
+
+    def addEvent(self, ev):
+        '''Add a DREvent'''
+        self.add(ev.EventNumber, ev.ModCounters)
+
+    def addBatch(self, evtnumbers):
+        '''Add an array of event numbers (e.g. EventBatch.evtnumber), in stream order'''
+        n = len(evtnumbers)
+        if n == 0:
+            return
+        e = np.asarray(evtnumbers)
+        if self.last is not None and e[0] == self.last + 1 and (n == 1 or (np.diff(e) == 1).all()):
+            self.nevents += n
+            self.last = int(e[-1])
+            return
+        for x in e.tolist():
+            self.add(x)
+
+    def _addSlow(self, e):
+        if self.last is None:
+            self.first = self.last = e
+        elif e > self.last:
+            self.missing.append([self.last + 1, e - 1])
+            self.last = e
+        elif e < self.first:
+            self.noutoforder += 1
+            if e < self.first - 1:
+                self.missing.insert(0, [e + 1, self.first - 1])
+            self.first = e
+        else:
+            if e < self.last:
+                self.noutoforder += 1
+            i = bisect.bisect_right(self.missing, [e, float("inf")]) - 1
+            if i >= 0 and self.missing[i][0] <= e <= self.missing[i][1]:
+                self._fill(i, e)
+            else:
+                self._duplicate(e)
+
+    def _fill(self, i, e):
+        '''A missing event arrived late'''
+        a, b = self.missing[i]
+        if a == b:
+            del self.missing[i]
+        elif e == a:
+            self.missing[i][0] = e + 1
+        elif e == b:
+            self.missing[i][1] = e - 1
+        else:
+            self.missing[i:i+1] = [[a, e - 1], [e + 1, b]]
+
+    def _duplicate(self, e):
+        if self.duplicates and self.duplicates[-1][1] + 1 == e:
+            self.duplicates[-1][1] = e
+        else:
+            self.duplicates.append([e, e])
+
+    def checkCounters(self, evtnumber, modcounters):
+        '''Compare the module trailer counters, list of (crate, cratetype, counter)'''
+        c0 = modcounters[0][2]
+        if any(c != c0 for _, _, c in modcounters):
+            self.ndesync += 1
+            self.desynced.append(evtnumber)
+        for crate, ctype, c in modcounters:
+            off = (evtnumber - c) & CounterMask
+            key = (crate, ctype)
+            old = self.offsets.get(key)
+            if old != off:
+                if old is not None:
+                    self.njumps += 1
+                self.offsets[key] = off
+
+    def state(self):
+        '''json-able copy of the checker'''
+        d = dict(self.__dict__)
+        d["offsets"] = [list(k) + [v] for k, v in self.offsets.items()]
+        d["desynced"] = list(self.desynced)
+        return d
+
+    def restore(self, state):
+        '''Restore a state() copy'''
+        d = dict(state)
+        self.offsets = dict(((crate, ctype), off) for crate, ctype, off in d.pop("offsets"))
+        self.desynced = collections.deque(d.pop("desynced"), maxlen=MaxRecent)
+        self.__dict__.update(d)
+
+    def counters(self):
+        return {"nevents": self.nevents, "first": self.first, "last": self.last,
+                "nmissing": self.nmissing, "nduplicates": self.nduplicates,
+                "noutoforder": self.noutoforder, "ndesync": self.ndesync, "njumps": self.njumps}
+
+    def ok(self):
+        return not (self.missing or self.duplicates or self.noutoforder or self.ndesync or self.njumps)
+
+    def dump(self, maxRanges=10):
+        print("Events      : %d [%s - %s]" % (self.nevents, self.first, self.last))
+        print("Missing     : %d in %d ranges %s" % (self.nmissing, len(self.missing),
+                                                    _ranges(self.missing, maxRanges)))
+        print("Duplicates  : %d in %d ranges %s" % (self.nduplicates, len(self.duplicates),
+                                                    _ranges(self.duplicates, maxRanges)))
+        print("Out of order:", self.noutoforder)
+        print("Desync      : %d events with different module counters %s" % (
+            self.ndesync, " ".join(str(e) for e in list(self.desynced)[-maxRanges:])))
+        print("Jumps       : %d module counter jumps" % self.njumps)
+
+
+def _ranges(ranges, n):
+    s = " ".join("%d" % a if a == b else "%d-%d" % (a, b) for a, b in ranges[:n])
+    return s + (" ..." if len(ranges) > n else "")
+
+
+# Main: check a run file
+if __name__ == "__main__":
+    import sys
+    import decode_utils as bob
+    import hex_words
+    if len(sys.argv) != 2:
+        print("Usage: python %s <runfile>" % sys.argv[0])
+        sys.exit(1)
+
+    cc = ContinuityChecker()
+    for words in hex_words.iter_words(sys.argv[1]):
+        valid, head, adc, tdc = bob.decodeblock(words)
+        if "trigmask" in head:
+            cc.add(head["evtnumber"], head.get("modcounters"))
+    cc.dump()
@@ -30,17 +30,96 @@ DecErr = {1: "Invalid data header", # returned with raw
           # event header and trailer
           999: "Failed header sanity check", # returned with event number
           801: "....",
-          810: "Invalid event trailer" # returned with event number
+          810: "Invalid event trailer", # returned with event number
+          1000: "Word not hexadecimal" # returned with the word position in the line
           }
 
+# Bit of each DecErr code in the per-event error bitmask (new codes must sort after the
+# others, so that the bits of the stored bitmasks keep their meaning)
+DecErrBit = dict((code, 1 << i) for i, code in enumerate(sorted(DecErr)))
+
+# Errors that discard the event
+FatalErrors = [1, 2, 99, 111, 112, 74, 75, 254, 999, 810, 1000]
+FatalMask = 0
+for _code in FatalErrors:
+    FatalMask |= DecErrBit[_code]
+
+def error_mask(validitylist):
+    """Bitmask (see DecErrBit) of the error codes in a decodeblock validity list"""
+    m = 0
+    for (x, y) in validitylist:
+        m |= DecErrBit[x]
+    return m
+
+def mask_codes(mask):
+    """DecErr codes of an error bitmask"""
+    return [code for code in sorted(DecErr) if mask & DecErrBit[code]]
+
+# Module types (data header bits 20-23)
+CrateTypeV792 = 0b1010   # QDC 32 channels
+CrateTypeV792N = 0b1001  # QDC 16 channels
+CrateTypeV775 = 0b0110   # TDC 32 channels
+CrateTypeV775N = 0b0101  # TDC 16 channels
+DataTypes = (CrateTypeV792, CrateTypeV792N, CrateTypeV775, CrateTypeV775N)
+
+class Selection(object):
+    """Modules and channels to decode (decodeblock select=)
+       adc        : ADC addresses (crate*32 + channel)
+       tdc        : TDC channels
+       modules    : (crate, cratetype) pairs
+       cratetypes : module types, e.g. CrateTypeV775
+       check      : also check the data words of the modules not needed
+    The modules not needed are skipped without converting their data words: their header,
+    module type (99), word count, trailer and event counter are still checked, but not their
+    data words, so the channel errors (20-53) and the repeated channels (111, 112) of those
+    modules are not seen and an event that a full decode discards for them is kept. With
+    check = True their data words are checked as in a full decode, without keeping the
+    values: the errors are then the same as a full decode, and so is the decoding time.
+    In the decoded modules only the requested channels are kept (all of them if adc/tdc is None)"""
+
+    def __init__(self, adc = None, tdc = None, modules = None, cratetypes = None, check = False):
+        self.adc = set(adc) if adc is not None else None
+        self.tdc = set(tdc) if tdc is not None else None
+        self.modules = set(modules or [])
+        self.cratetypes = set(cratetypes or [])
+        self.check = check
+        self.adcCrates = set(a // 32 for a in self.adc) if self.adc is not None else set()
+        self._wants = {}
+
+    def wants(self, crate, cratetype):
+        key = (crate, cratetype)
+        w = self._wants.get(key)
+        if w is None:
+            isQDC = bool((cratetype >> 3) & 0b1)
+            w = cratetype in self.cratetypes or key in self.modules or \
+                (crate in self.adcCrates if isQDC else self.tdc is not None)
+            self._wants[key] = w
+        return w
+
+    def keepAdc(self, chan):
+        return self.adc is None or chan in self.adc
+
+    def keepTdc(self, chan):
+        return self.tdc is None or chan in self.tdc
+
+class _HexWords(list):
+    """Hex words of a line, converted to int only when accessed"""
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [int(w, 16) for w in list.__getitem__(self, i)]
+        return int(list.__getitem__(self, i), 16)
+
+    def __getslice__(self, i, j): # python 2
+        return self.__getitem__(slice(i, j))
+
 def ets(val): # val is (,)
     return "ID %d (%d): %s" % (val[0], val[1], DecErr[val[0]])
 
+def DiscardMask(mask):
+    return bool(mask & FatalMask)
+
 def DiscardEvent(validitylist):
-    fatals = [1, 2, 99, 111, 112, 74, 75, 254, 999, 810]
-    validityflags = set(x for (x, y) in validitylist)
-    discard = bool(set(fatals) & set(validityflags))
-    return discard
+    return bool(error_mask(validitylist) & FatalMask)
     
 def _mask(n):
     return (1 << n) - 1 if n else 0
@@ -179,14 +258,48 @@ def parse_data(dt, spec = 0, verb = False): # spec from header[20:23]
 
 
 
-def decodeblock(line, verb = False): # line is a single string for one event
+def _not_hex(line):
+    """decodeblock result of a line with a token that is not hex: error 1000 (fatal) with the
+       position of the first such token, and the event header if it is before it"""
+    words = line.split()
+    bad = 0
+    for w in words:
+        try:
+            int(w, 16)
+        except ValueError:
+            break
+        bad += 1
+    HEAD = {"evtnumber": -1}
+    if bad >= 14:
+        v, h = parse_evt_header([int(w, 16) for w in words[:14]])
+        if not v:
+            HEAD = h
+    elif bad > 1:
+        HEAD["evtnumber"] = int(words[1], 16)
+    return [(1000, bad)], HEAD, {}, {}
+
+def decodeblock(line, verb = False, select = None): # line is a single string for one event
     """Decode  full event. 
+       line: the event line, or its words already converted to integers (list or array,
+             e.g. from hex_words.iter_words)
+       select: optional Selection, decode only some modules and channels
+       A line with a token that is not hex gives error 1000 and nothing decoded
     """
 
     if verb:
         print(line)
-    block = [int(i,16) for i in line.split()]
-
+    if not hasattr(line, "split"):
+        return _decodewords(line.tolist() if hasattr(line, "tolist") else list(line), verb, select)
+    try:
+        if select is None or select.check:
+            block = [int(i,16) for i in line.split()]
+        else:
+            block = _HexWords(line.split()) # converted on access, in _decodewords
+        return _decodewords(block, verb, select)
+    except ValueError:
+        return _not_hex(line)
+
+def _decodewords(block, verb, select):
     valid = [] # list of (errorID, info) 
     ADC = {} # ADC[channel] = value
     TDC = {} # TDC[channel] = (value, flag) <-- non-zero flag for OV or UN
@@ -204,6 +317,7 @@ def decodeblock(line, verb = False): # line is a single string for one event
     INDEX = 14
 
     PayloadSize = HEAD["payloadsize"]
+    HEAD["modcounters"] = [] # (crate, cratetype, event counter) of each module trailer
     
     #while INDEX < len(block)-1:
     while INDEX < 14 + PayloadSize:
@@ -222,6 +336,19 @@ def decodeblock(line, verb = False): # line is a single string for one event
             return valid, HEAD, ADC, TDC
 
         nDataHeader += 1
+        keep = True
+        if select is not None and not fehandler and not select.wants(crate, cratetype):
+            # module not needed: skip its data words, check that its trailer is there
+            if INDEX + nword >= len(block):
+                valid.append((74,HEAD["evtnumber"]))
+                return valid, HEAD, ADC, TDC
+            if nword and cratetype not in DataTypes:
+                valid.append((99,block[INDEX])) # as parse_data on its first data word
+                return valid, HEAD, ADC, TDC
+            keep = False
+            if not select.check:
+                INDEX += nword
+                nword = 0
         for iword in range(0 if fehandler else nword):
 
             if INDEX == len(block):
@@ -246,12 +373,14 @@ def decodeblock(line, verb = False): # line is a single string for one event
                 if chan in adcset:
                     valid.append((111,chan))
                 adcset.add(chan)
-                ADC[chan] = w["v"]
+                if keep and (select is None or select.keepAdc(chan)):
+                    ADC[chan] = w["v"]
             else:
                 if chan in tdcset:
                     valid.append((112,chan))
                 tdcset.add(chan)
-                TDC[chan] = (w["v"], w["f"])
+                if keep and (select is None or select.keepTdc(chan)):
+                    TDC[chan] = (w["v"], w["f"])
 
         if not fehandler:
             v, w = parse_trail(block[INDEX], verb=verb)
@@ -259,6 +388,7 @@ def decodeblock(line, verb = False): # line is a single string for one event
             if v:
                 valid.append((v,w["raw"]))
                 return valid, HEAD, ADC, TDC
+            HEAD["modcounters"].append((crate, cratetype, w["c"]))
 
     # if INDEX != DATA SIZE WRITTEN IN HEADER
     if INDEX >= len(block):
@@ -0,0 +1,132 @@
+# dwc.py
+# Delay wire chambers (DWC) beam-profile reconstruction on batches of events (python3 + numpy)
+# x = left - right, y = up - down, in TDC counts and in mm
+
+import numpy as np
+
+# CONFIGURATION
+ns_TdcCounts   = 0.139063
+ns_mm          = 5.333333
+mm_ns          = 1./ns_mm
+
+# Quality flags, one value per event and chamber
+DwcOk      = 0x0
+DwcMissX   = 0x1  # left or right TDC channel missing
+DwcMissY   = 0x2  # up or down TDC channel missing
+DwcFlagged = 0x4  # at least one of the four TDC values has the OV/UN flag set
+DwcOutside = 0x8  # position outside the chamber acceptance
+
+
+class DwcChamber:
+    ''' TDC channels and calibration constants of one chamber:
+      - l, r, u, d     : TDC channels
+      - slopeX, slopeY : mm per TDC count
+      - offX, offY     : mm added after the conversion (chamber alignment)
+      - halfSize       : acceptance in mm, |x| and |y| above it are flagged DwcOutside
+    '''
+
+    def __init__(self, l, r, u, d, slopeX=mm_ns*ns_TdcCounts, slopeY=mm_ns*ns_TdcCounts, offX=0., offY=0., halfSize=64.):
+        self.l, self.r, self.u, self.d = l, r, u, d
+        self.slopeX, self.slopeY = slopeX, slopeY
+        self.offX, self.offY = offX, offY
+        self.halfSize = halfSize
+
+
+class DwcSetup:
+    ''' The DWC chambers, numbered from 1.
+    Default: DWC1 on TDC channels 0-3 and DWC2 on 4-7 (left, right, up, down) '''
+
+    def __init__(self, chambers=None):
+        self.chambers = chambers or [DwcChamber(0, 1, 2, 3), DwcChamber(4, 5, 6, 7)]
+        self.channels = np.array([[c.l, c.r, c.u, c.d] for c in self.chambers], dtype=np.int64)
+        self.slope = np.array([[c.slopeX, c.slopeY] for c in self.chambers])
+        self.offset = np.array([[c.offX, c.offY] for c in self.chambers])
+        self.halfSize = np.array([c.halfSize for c in self.chambers])
+
+    @classmethod
+    def fromMap(cls, maptdc, calib=None):
+        '''Channels from the TDC channel map ("dwc1-l", "dwc1-r", ...), calib: optional
+           dict chamber number -> dict of DwcChamber keyword arguments'''
+        names = dict((e["phys"], ch) for ch, e in maptdc.items())
+        chambers = []
+        i = 1
+        while "dwc%d-l" % i in names:
+            kw = (calib or {}).get(i, {})
+            chambers.append(DwcChamber(*[names["dwc%d-%s" % (i, s)] for s in "lrud"], **kw))
+            i += 1
+        return cls(chambers)
+
+    def reconstructEvent(self, tdc):
+        '''Positions of one event from its TDCs dict (channel: (value, flag)), as reconstruct()
+           does for a batch: (x, y, x_mm, y_mm, quality) of each chamber, None where missing'''
+        out = []
+        for c in self.chambers:
+            x = y = x_mm = y_mm = None
+            quality = DwcOk
+            if c.l in tdc and c.r in tdc:
+                x = tdc[c.l][0] - tdc[c.r][0]
+                x_mm = x * c.slopeX + c.offX
+            else:
+                quality |= DwcMissX
+            if c.u in tdc and c.d in tdc:
+                y = tdc[c.u][0] - tdc[c.d][0]
+                y_mm = y * c.slopeY + c.offY
+            else:
+                quality |= DwcMissY
+            if any(tdc[ch][1] for ch in (c.l, c.r, c.u, c.d) if ch in tdc):
+                quality |= DwcFlagged
+            if (x_mm is not None and abs(x_mm) > c.halfSize) or (y_mm is not None and abs(y_mm) > c.halfSize):
+                quality |= DwcOutside
+            out.append((x, y, x_mm, y_mm, quality))
+        return out
+
+
+class DwcResult:
+    ''' Positions of a batch, arrays (N, nChambers):
+      - x, y        : left-right and up-down in TDC counts (0 where missing)
+      - x_mm, y_mm  : calibrated positions in mm
+      - okX, okY    : both channels of the pair present
+      - quality     : Dwc* flags
+      - lr, ud      : (N, nChambers, 2) raw (left, right) and (up, down) values
+    '''
+
+    def __init__(self, x, y, x_mm, y_mm, okX, okY, quality, lr, ud):
+        self.x, self.y = x, y
+        self.x_mm, self.y_mm = x_mm, y_mm
+        self.okX, self.okY = okX, okY
+        self.quality = quality
+        self.lr, self.ud = lr, ud
+
+    def select(self, rows):
+        '''New DwcResult with the rows selected by a boolean mask or an index array'''
+        return DwcResult(*[getattr(self, k)[rows] for k in ("x", "y", "x_mm", "y_mm", "okX", "okY", "quality", "lr", "ud")])
+
+
+def reconstruct(tdc, tdcflag, tdc_ok, setup=None):
+    '''DWC positions from (N, nTdc) TDC value, flag and "present" matrices'''
+    setup = setup or DwcSetup()
+    vals = tdc[:, setup.channels].astype(np.int64)   # (N, nCh, 4)
+    ok = tdc_ok[:, setup.channels]
+    flagged = (tdcflag[:, setup.channels] != 0) & ok
+
+    okX = ok[:, :, 0] & ok[:, :, 1]
+    okY = ok[:, :, 2] & ok[:, :, 3]
+    x = np.where(okX, vals[:, :, 0] - vals[:, :, 1], 0)
+    y = np.where(okY, vals[:, :, 2] - vals[:, :, 3], 0)
+    x_mm = x * setup.slope[:, 0] + setup.offset[:, 0]
+    y_mm = y * setup.slope[:, 1] + setup.offset[:, 1]
+
+    quality = np.zeros(x.shape, dtype=np.uint8)
+    quality |= np.where(okX, 0, DwcMissX).astype(np.uint8)
+    quality |= np.where(okY, 0, DwcMissY).astype(np.uint8)
+    quality |= np.where(flagged.any(axis=2), DwcFlagged, 0).astype(np.uint8)
+    outside = (okX & (np.abs(x_mm) > setup.halfSize)) | (okY & (np.abs(y_mm) > setup.halfSize))
+    quality |= np.where(outside, DwcOutside, 0).astype(np.uint8)
+
+    return DwcResult(x, y, x_mm, y_mm, okX, okY, quality, vals[:, :, 0:2], vals[:, :, 2:4])
+
+
+def reconstructBatch(batch, setup=None):
+    '''DWC positions of an EventBatch'''
+    return reconstruct(batch.tdc, batch.tdcflag, batch.tdc_ok, setup)
+
@@ -0,0 +1,323 @@
+# error_store.py
+# Compact indexed binary store of the events with decoding errors (python3 + numpy)
+#
+# Binary alternative to the text dumps of DRdecode (drevent_error_dump.txt, decerrors.txt):
+# an ErrorStore passed as dumperror = store keeps for each faulty event its raw words and,
+# in a fixed-size index row, the error bitmask (decode_utils.DecErrBit), event number,
+# spill number, byte offset and line of the event in the run, and the time of the record.
+# Two append-only files:
+#  - <store>.dat  raw 32-bit words of the events, one record after the other
+#  - <store>.idx  16-byte header, then one IndexDtype row per record
+# and a lookup table rewritten when the writer closes (or by the CLI 'index' command):
+#  - <store>.lkp.npz  record numbers grouped by error code and by spill (sorted)
+# select() takes the records of a code or spill from the lookup table and scans only the
+# index rows appended after it was written; the event range is then a mask on those
+# records. Only the words of the selected records are read from the .dat file. The text
+# block of the old dumps is rebuilt on demand (show).
+# Tokens of a text line that are not hex (decoding error 1000, the event is discarded) are
+# stored as word 0 and counted in the "nbad" field of the record, shown by list and show.
+# A store has a single writer; readers can query it while it is being written.
+# Usage:
+#   store = ErrorStore("decerrors")
+#   store.offset, store.line = pos, i     # optional, where the next line comes from
+#   ev = DREvent.DRdecode(line, dumperror = store)
+#   ...
+#   rows = ErrorStore("decerrors", "r").select(code = 111, spill = 12)
+# CLI: python error_store.py <store> [summary | list | show | raw | index] [-c code] [-s spill] [-e first:last] [-n max]
+
+import os
+import sys
+import time
+import numpy as np
+import decode_utils as bob
+
+DataSuffix = ".dat"
+IndexSuffix = ".idx"
+LookupSuffix = ".lkp.npz"
+IndexMagic = b"DRERRIDX"
+IndexVersion = 2
+
+IndexDtype = np.dtype([("pos", "<i8"),          # word position of the record in the .dat file
+                       ("nwords", "<i8"),
+                       ("errors", "<u8"),       # DecErrBit bitmask
+                       ("evtnumber", "<i8"),    # -1 if unknown
+                       ("spillnumber", "<i8"),  # -1 if unknown
+                       ("offset", "<i8"),       # byte offset of the line in the run, -1 if unknown
+                       ("line", "<i8"),         # line number in the run, -1 if unknown
+                       ("nbad", "<i8"),         # tokens of the line that are not hex (stored as 0)
+                       ("time", "<f8")])        # wall clock of the record
+_HeaderSize = 16
+
+
+def _header():
+    return IndexMagic + np.array([IndexVersion, IndexDtype.itemsize], dtype="<u4").tobytes()
+
+
+def line_words(evLine):
+    '''uint32 words of an event line (text or word array) and the number of tokens that are
+       not hex, stored as 0; words longer than 32 bits are truncated'''
+    if not hasattr(evLine, "split"):
+        return np.asarray(evLine, dtype=np.int64).astype(np.uint32), 0
+    out = []
+    nbad = 0
+    for w in evLine.split():
+        try:
+            out.append(int(w, 16) & 0xFFFFFFFF)
+        except ValueError:
+            out.append(0)
+            nbad += 1
+    return np.array(out, dtype=np.uint32), nbad
+
+
+class ErrorStore:
+    ''' Binary error store <path>.dat/<path>.idx, opened for appending ("a") or reading ("r").
+    offset and line: position in the run of the line decoded next, set by the reader before
+    DRdecode (recorded as -1 if not set); nrecords: records written by this writer '''
+
+    def __init__(self, path, mode="a"):
+        if mode not in ("a", "r"):
+            raise ValueError("Invalid mode %s (a, r)" % mode)
+        self.path = path
+        self.mode = mode
+        self.offset = -1
+        self.line = -1
+        self.nrecords = 0
+        self.fdat = self.fidx = None
+        if mode == "a":
+            self._openWriter()
+
+    def _openWriter(self):
+        nrows = len(self._rows())   # complete records only
+        self.fdat = open(self.path + DataSuffix, "ab")
+        self.fidx = open(self.path + IndexSuffix, "ab")
+        if nrows == 0:
+            self.fidx.truncate(0)
+            self.fidx.write(_header())
+        else:
+            # drop what a crashed writer left after the last complete record
+            self.fidx.truncate(_HeaderSize + nrows * IndexDtype.itemsize)
+        self.fidx.seek(0, os.SEEK_END)
+        last = self._rows()[-1:] if nrows else None
+        self.wpos = int(last["pos"][0] + last["nwords"][0]) if nrows else 0
+        self.fdat.truncate(4 * self.wpos)
+        self.fdat.seek(0, os.SEEK_END)
+
+    # ---- writer
+    def record(self, evLine, errors, evtnumber=-1, spillnumber=-1):
+        '''Append an event (text line or word array) with its error bitmask'''
+        if self.fdat is None:
+            raise IOError("error store %s not open for writing" % self.path)
+        words, nbad = line_words(evLine)
+        row = np.zeros(1, dtype=IndexDtype)
+        row["pos"] = self.wpos
+        row["nwords"] = len(words)
+        row["errors"] = errors
+        row["evtnumber"] = evtnumber
+        row["spillnumber"] = spillnumber
+        row["offset"] = self.offset
+        row["line"] = self.line
+        row["nbad"] = nbad
+        row["time"] = time.time()
+        self.fdat.write(words.astype("<u4").tobytes())
+        self.fdat.flush()
+        self.fidx.write(row.tobytes())   # after the words: an index row always has its data
+        self.fidx.flush()
+        self.wpos += len(words)
+        self.nrecords += 1
+
+    def close(self):
+        '''Close the files of a writer and rewrite the lookup table'''
+        if self.fdat is None:
+            return
+        for f in (self.fdat, self.fidx):
+            f.close()
+        self.fdat = self.fidx = None
+        self.writeLookup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---- reader
+    def _rows(self):
+        '''Index rows of the complete records'''
+        try:
+            with open(self.path + IndexSuffix, "rb") as f:
+                head = f.read(_HeaderSize)
+                if len(head) < _HeaderSize:
+                    return np.zeros(0, dtype=IndexDtype)
+                if head[:8] != IndexMagic:
+                    raise ValueError("%s%s is not an error store index" % (self.path, IndexSuffix))
+                version, size = np.frombuffer(head[8:], dtype="<u4")
+                if version != IndexVersion or size != IndexDtype.itemsize:
+                    raise ValueError("%s%s: unsupported version %d" % (self.path, IndexSuffix, version))
+                data = f.read()
+        except FileNotFoundError:
+            return np.zeros(0, dtype=IndexDtype)
+        rows = np.frombuffer(data[:len(data) - len(data) % IndexDtype.itemsize], dtype=IndexDtype)
+        try:
+            nwords = os.path.getsize(self.path + DataSuffix) // 4
+        except OSError:
+            nwords = 0
+        return rows[rows["pos"] + rows["nwords"] <= nwords]
+
+    def index(self):
+        '''Index rows (IndexDtype) of all the records'''
+        return self._rows()
+
+    # ---- lookup table
+    def writeLookup(self, rows=None):
+        '''Write <store>.lkp.npz: record numbers by error code and by spill'''
+        if rows is None:
+            rows = self._rows()
+        codes = np.array(sorted(bob.DecErrBit), dtype=np.int64)
+        byCode = [np.flatnonzero(rows["errors"] & np.uint64(bob.DecErrBit[c])) for c in codes]
+        order = np.argsort(rows["spillnumber"], kind="stable")
+        spills, start = np.unique(rows["spillnumber"][order], return_index=True)
+        tmp = self.path + ".tmp.npz"
+        np.savez(tmp, nrecords=len(rows), codes=codes,
+                 codeStart=np.cumsum([0] + [len(r) for r in byCode]),
+                 codeRecords=np.concatenate(byCode) if byCode else np.zeros(0, dtype=np.int64),
+                 spills=spills, spillStart=np.append(start, len(order)), spillRecords=order)
+        os.replace(tmp, self.path + LookupSuffix)
+
+    def _lookup(self, nrows):
+        '''Arrays of the lookup table, None if missing or written for more records than nrows'''
+        try:
+            with np.load(self.path + LookupSuffix) as z:
+                lk = dict(z)
+        except (OSError, ValueError):
+            return None
+        return lk if int(lk["nrecords"]) <= nrows else None
+
+    def _records(self, rows, lk, code, spill):
+        '''Sorted record numbers with code and in spill (None: no condition)'''
+        n = int(lk["nrecords"]) if lk is not None else 0
+        tail = rows[n:]   # rows appended after the lookup table
+        out = None
+        if code is not None:
+            bit = np.uint64(bob.DecErrBit[code])
+            recs = np.flatnonzero(tail["errors"] & bit) + n
+            if lk is not None:
+                i = int(np.searchsorted(lk["codes"], code))
+                recs = np.concatenate([lk["codeRecords"][lk["codeStart"][i]:lk["codeStart"][i + 1]], recs])
+            out = recs
+        if spill is not None:
+            recs = np.flatnonzero(tail["spillnumber"] == spill) + n
+            if lk is not None:
+                i = int(np.searchsorted(lk["spills"], spill))
+                if i < len(lk["spills"]) and lk["spills"][i] == spill:
+                    recs = np.concatenate([lk["spillRecords"][lk["spillStart"][i]:lk["spillStart"][i + 1]], recs])
+            out = recs if out is None else np.intersect1d(out, recs, assume_unique=True)
+        return out
+
+    def select(self, code=None, spill=None, first=None, last=None, rows=None):
+        '''Numbers of the records with error code 'code' (DecErr), in spill 'spill' and with
+           event number in [first, last]; rows: index() of this store, if already read'''
+        if code is not None and code not in bob.DecErrBit:
+            raise KeyError("Unknown error code %s" % code)
+        if rows is None:
+            rows = self._rows()
+        lk = self._lookup(len(rows)) if code is not None or spill is not None else None
+        recs = self._records(rows, lk, code, spill)
+        if recs is None:
+            recs = np.arange(len(rows))
+        if first is not None or last is not None:
+            evt = rows["evtnumber"][recs]
+            keep = np.ones(len(recs), dtype=bool)
+            if first is not None:
+                keep &= evt >= first
+            if last is not None:
+                keep &= evt <= last
+            recs = recs[keep]
+        return recs
+
+    def words(self, rec, rows=None):
+        '''uint32 raw words of record number rec'''
+        if rows is None:
+            rows = self._rows()
+        r = rows[rec]
+        with open(self.path + DataSuffix, "rb") as f:
+            f.seek(4 * int(r["pos"]))
+            return np.frombuffer(f.read(4 * int(r["nwords"])), dtype="<u4").astype(np.uint32)
+
+    def counts(self, rows=None):
+        '''{DecErr code: records} and {spill: records}'''
+        if rows is None:
+            rows = self._rows()
+        codes = dict((c, int(np.count_nonzero(rows["errors"] & np.uint64(bit))))
+                     for c, bit in sorted(bob.DecErrBit.items()))
+        spills, n = np.unique(rows["spillnumber"], return_counts=True)
+        return dict((c, n) for c, n in codes.items() if n), dict(zip(spills.tolist(), n.tolist()))
+
+    def text(self, rec, rows=None):
+        '''Text block of a record, as in the text dumps of DRdecode'''
+        if rows is None:
+            rows = self._rows()
+        r = rows[rec]
+        words = self.words(rec, rows).tolist()
+        valid, header, adc, tdc = bob.decodeblock(words)
+        mask = int(r["errors"])
+        bad = " - %d tokens not hex, stored as 0" % r["nbad"] if r["nbad"] else ""
+        return "%s\n%s\nEvent %d spill %d - line %d offset %d%s\n%s\nDiscard %s\n%s\n%s\n%d adc %s\n%d tdc %s\n" % (
+            "----------------", time.ctime(r["time"]), r["evtnumber"], r["spillnumber"], r["line"], r["offset"], bad,
+            "\n".join([bob.ets(v) for v in valid]), str(bob.DiscardMask(mask)),
+            " ".join("%x" % w for w in words), str(header), len(adc), str(adc), len(tdc), str(tdc))
+
+
+def _codes(mask):
+    return ",".join(str(c) for c in bob.mask_codes(int(mask)))
+
+
+# Main: query a store
+if __name__ == "__main__":
+    import getopt
+    try:
+        opts, args = getopt.gnu_getopt(sys.argv[1:], "c:s:e:n:")
+    except getopt.GetoptError as err:
+        args = []
+        print(err)
+    if len(args) not in (1, 2) or (len(args) == 2 and args[1] not in ("summary", "list", "show", "raw", "index")):
+        print("Usage: python %s <store> [summary | list | show | raw | index] [-c code] [-s spill] [-e first:last] [-n max]" % sys.argv[0])
+        sys.exit(1)
+    opts = dict(opts)
+    store = ErrorStore(args[0], "r")
+    cmd = args[1] if len(args) == 2 else "summary"
+    t0 = time.time()
+    rows = store.index()
+    if cmd == "index":
+        store.writeLookup(rows)
+        print("Lookup table of %d records written to %s%s - %.1f ms" % (len(rows), store.path, LookupSuffix, 1000 * (time.time() - t0)))
+        sys.exit(0)
+    first = last = None
+    if "-e" in opts:
+        a, _, b = opts["-e"].partition(":")
+        first, last = int(a) if a else None, int(b) if b else None
+    sel = store.select(int(opts["-c"]) if "-c" in opts else None, int(opts["-s"]) if "-s" in opts else None,
+                       first, last, rows)
+    dt = time.time() - t0
+    if cmd == "summary":
+        codes, spills = store.counts(rows[sel])
+        print("Records     : %d of %d (%d words) - query %.1f ms" % (len(sel), len(rows), rows["nwords"][sel].sum(), 1000 * dt))
+        if len(sel):
+            print("Events      : %d - %d" % (rows["evtnumber"][sel].min(), rows["evtnumber"][sel].max()))
+            print("Recorded    : %s - %s" % (time.ctime(rows["time"][sel].min()), time.ctime(rows["time"][sel].max())))
+        for c, n in codes.items():
+            print("  %4d %-36s %d" % (c, bob.DecErr[c], n))
+        print("Spills      : " + " ".join("%d:%d" % sn for sn in spills.items()))
+        sys.exit(0)
+    nmax = int(opts.get("-n", 20))
+    for rec in sel[:nmax]:
+        r = rows[rec]
+        if cmd == "list":
+            print("%8d evt %8d spill %5d line %8d offset %12d words %5d errors %s%s" % (
+                rec, r["evtnumber"], r["spillnumber"], r["line"], r["offset"], r["nwords"], _codes(r["errors"]),
+                " not hex %d" % r["nbad"] if r["nbad"] else ""))
+        elif cmd == "show":
+            sys.stdout.write(store.text(rec, rows))
+        else:
+            print(" ".join("%x" % w for w in store.words(rec, rows)))
+    if len(sel) > nmax:
+        print("... %d more records (-n)" % (len(sel) - nmax))
@@ -0,0 +1,122 @@
+# event_batch.py
+# Columnar representation of a batch of decoded events (python3 + numpy)
+
+import numpy as np
+
+NumAdcChannels = 192  # 6 V792 QDC, address = crate*32 + channel
+NumTdcChannels = 32   # one V775 TDC
+
+
+class EventBatch:
+    ''' Batch of decoded events, one row per event:
+      - evtnumber, spillnumber, evttime, trigmask : (N,) int64
+      - adc, adc_ok           : (N, NumAdcChannels) value and "channel present" flag
+      - tdc, tdcflag, tdc_ok  : (N, NumTdcChannels) value, OV/UN flag and "channel present" flag
+      - errors                : (N,) uint32 bitmask of the decoding errors (decode_utils.DecErrBit)
+      - weight                : (N,) float64 sampling weight, events of the run represented by the row
+    Channels missing in an event have value 0 and the *_ok flag False.
+    '''
+
+    def __init__(self, n=0):
+        self.evtnumber = np.zeros(n, dtype=np.int64)
+        self.spillnumber = np.zeros(n, dtype=np.int64)
+        self.evttime = np.zeros(n, dtype=np.int64)
+        self.trigmask = np.zeros(n, dtype=np.int64)
+        self.adc = np.zeros((n, NumAdcChannels), dtype=np.int32)
+        self.adc_ok = np.zeros((n, NumAdcChannels), dtype=bool)
+        self.tdc = np.zeros((n, NumTdcChannels), dtype=np.int32)
+        self.tdcflag = np.zeros((n, NumTdcChannels), dtype=np.int8)
+        self.tdc_ok = np.zeros((n, NumTdcChannels), dtype=bool)
+        self.errors = np.zeros(n, dtype=np.uint32)
+        self.weight = np.ones(n, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.evtnumber)
+
+    def columns(self):
+        '''Names of the per-event arrays'''
+        return [k for k in self.__dict__ if isinstance(self.__dict__[k], np.ndarray)]
+
+    def select(self, rows):
+        '''New batch with the rows selected by a boolean mask or an index array'''
+        out = EventBatch()
+        for k in self.columns():
+            setattr(out, k, getattr(self, k)[rows])
+        return out
+
+    def head(self, n):
+        '''New batch with the first n rows (views, no copy)'''
+        return self.select(slice(0, n))
+
+
+class BatchBuilder:
+    ''' Accumulate decoded events into preallocated arrays.
+    Usage:
+      bb = BatchBuilder(1000)
+      for ev in events:
+        bb.appendEvent(ev)
+        if bb.full(): process(bb.flush())
+      process(bb.flush())
+    '''
+
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.batch = EventBatch(capacity)
+        self.n = 0
+
+    def __len__(self):
+        return self.n
+
+    def full(self):
+        return self.n >= self.capacity
+
+    def append(self, evtnumber, spillnumber, evttime, trigmask, adc, tdc, errors=0, weight=1.):
+        '''Append one event. adc: dict addr -> value, tdc: dict chan -> (value, flag)'''
+        b = self.batch
+        i = self.n
+        b.evtnumber[i] = evtnumber
+        b.spillnumber[i] = spillnumber
+        b.evttime[i] = evttime
+        b.trigmask[i] = trigmask
+        b.errors[i] = errors
+        b.weight[i] = weight
+        if adc:
+            addr = np.fromiter(adc.keys(), dtype=np.int64, count=len(adc))
+            b.adc[i, addr] = np.fromiter(adc.values(), dtype=np.int32, count=len(adc))
+            b.adc_ok[i, addr] = True
+        if tdc:
+            for ch, (val, flag) in tdc.items():
+                b.tdc[i, ch] = val
+                b.tdcflag[i, ch] = flag
+                b.tdc_ok[i, ch] = True
+        self.n += 1
+
+    def appendEvent(self, ev, weight=1.):
+        '''Append a DREvent'''
+        self.append(ev.EventNumber, ev.SpillNumber, ev.EventTime, ev.TriggerMask, ev.ADCs, ev.TDCs, ev.ErrorMask, weight)
+
+    def flush(self):
+        '''Return the filled rows as an EventBatch and start a new one'''
+        out = self.batch.head(self.n)
+        self.batch = EventBatch(self.capacity)
+        self.n = 0
+        return out
+
+
+def concat_batches(batches):
+    '''One EventBatch with the rows of a list of batches'''
+    out = EventBatch()
+    batches = [b for b in batches if len(b)]
+    if batches:
+        for k in out.columns():
+            setattr(out, k, np.concatenate([getattr(b, k) for b in batches]))
+    return out
+
+
+def batch_from_events(events):
+    '''Build an EventBatch from a list of DREvent objects (None entries are skipped)'''
+    events = [ev for ev in events if ev is not None]
+    bb = BatchBuilder(max(len(events), 1))
+    for ev in events:
+        bb.appendEvent(ev)
+    return bb.flush()
@@ -0,0 +1,135 @@
+# export_arrow.py
+# Streaming export of decoded runs to Apache Parquet or Arrow IPC stream (python3 + pyarrow)
+#
+# One row per event, one column per channel, so that analyses can read only the channels
+# they need:
+#   evtnumber, spillnumber, evttime, trigmask, errors (decode_utils.DecErrBit bitmask)
+#   adc_000 ... adc_191     uint16, null if the channel is not in the event
+#   tdc_000 ... tdc_031     uint16, null if the channel is not in the event
+#   tdcflag_000 ... _031    uint8 OV/UN flags
+#   [S, C]                  calibrated sums, only if a Calibration is given
+# Events are written in row groups (record batches) of rowGroupSize rows, so the memory
+# used does not depend on the length of the run.
+
+import numpy as np
+import pyarrow as pa
+import decode_utils as bob
+from event_batch import BatchBuilder, NumAdcChannels, NumTdcChannels
+
+Formats = ("parquet", "ipc")
+
+
+def make_schema(calib=None):
+    fields = [pa.field("evtnumber", pa.int64()), pa.field("spillnumber", pa.int64()),
+              pa.field("evttime", pa.int64()), pa.field("trigmask", pa.int32()),
+              pa.field("errors", pa.uint32())]
+    fields += [pa.field("adc_%03d" % ch, pa.uint16()) for ch in range(NumAdcChannels)]
+    fields += [pa.field("tdc_%03d" % ch, pa.uint16()) for ch in range(NumTdcChannels)]
+    fields += [pa.field("tdcflag_%03d" % ch, pa.uint8()) for ch in range(NumTdcChannels)]
+    if calib is not None:
+        fields += [pa.field("S", pa.float64()), pa.field("C", pa.float64())]
+    return pa.schema(fields)
+
+
+def batch_to_arrow(batch, schema, calib=None):
+    '''pyarrow.RecordBatch of an EventBatch'''
+    cols = [pa.array(batch.evtnumber), pa.array(batch.spillnumber), pa.array(batch.evttime),
+            pa.array(batch.trigmask.astype(np.int32)), pa.array(batch.errors)]
+    adc = batch.adc.astype(np.uint16)
+    cols += [pa.array(adc[:, ch], mask=~batch.adc_ok[:, ch]) for ch in range(NumAdcChannels)]
+    tdc = batch.tdc.astype(np.uint16)
+    cols += [pa.array(tdc[:, ch], mask=~batch.tdc_ok[:, ch]) for ch in range(NumTdcChannels)]
+    flag = batch.tdcflag.astype(np.uint8)
+    cols += [pa.array(flag[:, ch], mask=~batch.tdc_ok[:, ch]) for ch in range(NumTdcChannels)]
+    if calib is not None:
+        e = calib.calibrate(batch)
+        cols += [pa.array(e.S), pa.array(e.C)]
+    return pa.RecordBatch.from_arrays(cols, schema=schema)
+
+
+class ArrowExporter:
+    ''' Write decoded events to a Parquet file (fmt="parquet") or an Arrow IPC stream (fmt="ipc").
+    Usage:
+      with ArrowExporter("run.parquet") as ex:
+        for line in lines:
+          ex.addLine(line)
+    '''
+
+    def __init__(self, path, fmt="parquet", rowGroupSize=10000, compression="zstd", calib=None, keepDiscarded=False):
+        if fmt not in Formats:
+            raise ValueError("Unknown format %s, use one of %s" % (fmt, str(Formats)))
+        self.calib = calib
+        self.keepDiscarded = keepDiscarded  # export also events that DRdecode would discard
+        self.schema = make_schema(calib)
+        self.builder = BatchBuilder(rowGroupSize)
+        self.nwritten = 0
+        self.ndiscarded = 0   # events not exported
+        if fmt == "parquet":
+            import pyarrow.parquet as pq
+            self.writer = pq.ParquetWriter(path, self.schema, compression=compression)
+            self.sink = None
+        else:
+            self.sink = pa.OSFile(path, "wb")
+            self.writer = pa.ipc.new_stream(self.sink, self.schema)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def add(self, evtnumber, spillnumber, evttime, trigmask, adc, tdc, errors=0):
+        '''Add one decoded event, same arguments as BatchBuilder.append'''
+        self.builder.append(evtnumber, spillnumber, evttime, trigmask, adc, tdc, errors)
+        if self.builder.full():
+            self.flush()
+
+    def addLine(self, line):
+        '''Decode and add one raw event line (or its words, see hex_words)'''
+        valid, head, adc, tdc = bob.decodeblock(line)
+        errors = bob.error_mask(valid)
+        if "trigmask" not in head or (bob.DiscardMask(errors) and not self.keepDiscarded):
+            self.ndiscarded += 1
+            return
+        self.add(head["evtnumber"], head["spillnumber"], head["evttime"], head["trigmask"], adc, tdc, errors)
+
+    def addBatch(self, batch):
+        '''Write an EventBatch (the pending events are written first)'''
+        self.flush()
+        if len(batch):
+            self.writer.write_batch(batch_to_arrow(batch, self.schema, self.calib))
+            self.nwritten += len(batch)
+
+    def flush(self):
+        '''Write the pending events as one row group'''
+        if len(self.builder) == 0:
+            return
+        batch = self.builder.flush()
+        self.writer.write_batch(batch_to_arrow(batch, self.schema, self.calib))
+        self.nwritten += len(batch)
+
+    def close(self):
+        if self.writer is None:
+            return
+        self.flush()
+        self.writer.close()
+        self.writer = None
+        if self.sink is not None:
+            self.sink.close()
+
+
+# Main: export a run file
+if __name__ == "__main__":
+    import sys
+    import hex_words
+    if len(sys.argv) < 3:
+        print("Usage: python %s <runfile> <output.parquet|output.arrows> [rowGroupSize]" % sys.argv[0])
+        sys.exit(1)
+
+    out = sys.argv[2]
+    fmt = "parquet" if out.endswith(".parquet") else "ipc"
+    rg = int(sys.argv[3]) if len(sys.argv) > 3 else 10000
+    with ArrowExporter(out, fmt, rg) as ex:
+        for words in hex_words.iter_words(sys.argv[1]):
+            ex.addLine(words)
+    print("%d events written to %s (%s), %d discarded" % (ex.nwritten, out, fmt, ex.ndiscarded))
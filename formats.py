@@ -0,0 +1,206 @@
+# formats.py
+# Registry of the data formats with detection of the format of a run file (python3 + numpy)
+#
+# Each Format has a cheap sniff() test of a raw line, a reader of the lines of a run in the
+# form its decoder takes, a per-event decoder and a batch decoder. detect(path) reads the
+# first lines of the run once and picks the format, so that a reprocessing job over runs
+# of several years binds straight to the decoder of each run: no spec to configure and no
+# per-event branching on the data year.
+#  - 2025: raw 32-bit words, the line starts with the event marker ccaaffee; read by
+#          hex_words.iter_words and decoded by DREvent.DRdecode25 (or DRdecodeLazy)
+#  - 2024: ascii header "Event Number ... Trigger Mask ... :" followed by the ADC and TDC
+#          sections (2023 and 2024 test beams); decoded by DREvent.DRdecode24, in batches
+#          by legacy24.Decoder24
+# New formats subclass Format, implement sniff() and decoder() (Format is an abstract base
+# class: a subclass missing one of them cannot be instantiated) and are added with register().
+# Usage:
+#   fmt = formats.detect("run.txt")
+#   decode = fmt.decoder(dumperror = "drevent_error_dump.txt")
+#   for line in fmt.lines("run.txt"):
+#       ev = decode(line)
+# or simply formats.iter_events("run.txt") / formats.iter_batches("run.txt").
+
+import abc
+import collections
+import run_reader
+import DREvent
+from event_batch import BatchBuilder
+
+SniffLines = 10   # non-empty lines of a run looked at by detect()
+
+Registry = collections.OrderedDict()   # name: Format, in sniffing order
+
+
+class Format(abc.ABC):
+    ''' Base class of the data formats: sniff() and decoder() are abstract, lines() and
+    batches() default to the text lines of the run decoded one by one '''
+    name = None
+    years = ()
+
+    @abc.abstractmethod
+    def sniff(self, line):
+        '''True if the raw line (bytes) is in this format'''
+
+    def lines(self, path):
+        '''Lines of a plain or compressed run, as taken by the decoder'''
+        for line in run_reader.iter_lines(path):
+            yield line.decode(errors="replace")
+
+    @abc.abstractmethod
+    def decoder(self, verbose=-1, dumperror=None, lazy=False, select=None, pool=None, chmap=None):
+        '''Function decoding one line into a DREvent (None if the event is discarded)'''
+
+    def batches(self, path, size=1000, **kw):
+        '''EventBatch of every 'size' decoded events of a run'''
+        decode = self.decoder(**kw)
+        pool = kw.get("pool")
+        builder = BatchBuilder(size)
+        for line in self.lines(path):
+            ev = decode(line)
+            if ev is None:
+                continue
+            builder.appendEvent(ev)
+            if pool is not None:
+                pool.release(ev)   # copied into the batch
+            if builder.full():
+                yield builder.flush()
+        if len(builder):
+            yield builder.flush()
+
+    def __repr__(self):
+        return "Format(%s)" % self.name
+
+
+class Format25(Format):
+    name = "2025"
+    years = (2025,)
+
+    def sniff(self, line):
+        w = line.split(None, 1)
+        return bool(w) and w[0].lower() == b"ccaaffee"
+
+    def lines(self, path):
+        import hex_words
+        return hex_words.iter_words(path)
+
+    def decoder(self, verbose=-1, dumperror=None, lazy=False, select=None, pool=None, chmap=None):
+        if lazy:
+            return lambda line: DREvent.DRdecodeLazy(line, verbose, dumperror, select, chmap)
+        return lambda line: DREvent.DRdecode25(line, verbose, dumperror, select, pool, chmap)
+
+    def batches(self, path, size=1000, **kw):
+        if not kw.get("lazy"):
+            kw.setdefault("pool", DREvent.EventPool())
+        return Format.batches(self, path, size, **kw)
+
+
+class Format24(Format):
+    name = "2024"
+    years = (2023, 2024)
+
+    def sniff(self, line):
+        return line.startswith(b"Event Number") and b":" in line
+
+    def decoder(self, verbose=-1, dumperror=None, lazy=False, select=None, pool=None, chmap=None):
+        for opt, val in (("Verbosity", verbose != -1), ("Dump of corrupted data", dumperror is not None),
+                         ("Lazy decoding", lazy), ("Selective decoding", select is not None),
+                         ("Event pool", pool is not None), ("Channel map", chmap is not None)):
+            if val:
+                print("WARNING - %s implemented only for 2025 data format" % opt)
+
+        def decode(line):
+            try:
+                return DREvent.DRdecode24(line)
+            except (ValueError, IndexError):
+                return None   # truncated or corrupted line
+        return decode
+
+    def batches(self, path, size=1000, **kw):
+        import legacy24
+        return legacy24.Decoder24().iterBatches(path, size)
+
+
+def register(fmt, first=False):
+    '''Add a Format to the registry (sniffed before the others if first)'''
+    Registry[fmt.name] = fmt
+    if first:
+        Registry.move_to_end(fmt.name, last=False)
+    return fmt
+
+
+def get(name):
+    '''Format by name ("2025", "2024") or data year'''
+    if isinstance(name, Format):
+        return name
+    name = str(name)
+    if name in Registry:
+        return Registry[name]
+    for fmt in Registry.values():
+        if name in map(str, fmt.years):
+            return fmt
+    raise KeyError("Unknown data format %s (%s)" % (name, ", ".join(Registry)))
+
+
+def sniff(line):
+    '''Format of a raw line (bytes or str), None if no format claims it'''
+    if isinstance(line, str):
+        line = line.encode()
+    for fmt in Registry.values():
+        if fmt.sniff(line):
+            return fmt
+    return None
+
+
+def detect(path):
+    '''Format of a plain or compressed run, from its first non-empty lines'''
+    n = 0
+    for line in run_reader.iter_lines(path):
+        if not line.strip():
+            continue
+        fmt = sniff(line)
+        if fmt is not None:
+            return fmt
+        n += 1
+        if n == SniffLines:
+            break
+    raise ValueError("Unknown data format of %s (%s)" % (path, "no event in the first lines" if n else "empty file"))
+
+
+def iter_events(path, fmt=None, **kw):
+    '''DREvent (or None for discarded events) of every line of a run, with the decoder of its
+       format (detected if not given); kw are the DRdecode options'''
+    fmt = get(fmt) if fmt is not None else detect(path)
+    decode = fmt.decoder(**kw)
+    for line in fmt.lines(path):
+        yield decode(line)
+
+
+def iter_batches(path, size=1000, fmt=None, **kw):
+    '''EventBatch of every 'size' events of a run, with the batch decoder of its format'''
+    fmt = get(fmt) if fmt is not None else detect(path)
+    return fmt.batches(path, size, **kw)
+
+
+register(Format25())
+register(Format24())
+
+
+# Main: detect the format of runs and decode them
+if __name__ == "__main__":
+    import sys
+    import time
+    if len(sys.argv) < 2:
+        print("Usage: python %s <runfile> [<runfile> ...]" % sys.argv[0])
+        sys.exit(1)
+    for path in sys.argv[1:]:
+        try:
+            fmt = detect(path)
+        except (ValueError, OSError) as err:
+            print("%s: %s" % (path, err))
+            continue
+        t0 = time.time()
+        n = ndisc = 0
+        for ev in iter_events(path, fmt):
+            n += 1
+            ndisc += ev is None
+        print("%s: format %s - %d events (%d discarded) - %.3f s" % (path, fmt.name, n, ndisc, time.time() - t0))
@@ -0,0 +1,132 @@
+# hex_words.py
+# Bytes-mode reader of run files with bulk hex word conversion (python3 + numpy)
+#
+# The run files are read in large binary chunks (no text layer, no per-line decoding), cut
+# at the last newline, and all the hex words of the chunk are converted to uint32 at once
+# with numpy: no Python string nor int is created per word. Each line is then handed to
+# decode_utils.decodeblock (or DREvent.DRdecode) as its uint32 array.
+# Lines with anything else than hex words of at most 8 digits separated by blanks are
+# returned as text instead, so that the reference decoding path reports them as usual.
+# Usage:
+#   for words in hex_words.iter_words("run.txt"):
+#       valid, head, adc, tdc = decode_utils.decodeblock(words)
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+import run_reader
+
+ChunkSize = 4 << 20   # bytes converted at once
+
+HexLut = np.full(256, 255, dtype=np.uint8)
+for _i, _c in enumerate(b"0123456789abcdef"):
+    HexLut[_c] = _i
+for _i, _c in enumerate(b"ABCDEF"):
+    HexLut[_c] = 10 + _i
+
+_Other = np.ones(256, dtype=bool)         # neither a hex digit nor a blank
+_Other[HexLut != 255] = False
+_Other[list(b" \t\r\n\v\f")] = False
+
+
+def chunk_words(buf):
+    '''Convert the lines of buf (bytes ending with a newline) at once.
+       Returns (words, first, ok): the uint32 words of all the lines, the index in words of
+       the first word of each line (nlines+1 entries), and which lines could be converted'''
+    a = np.frombuffer(buf, dtype=np.uint8)
+    nl = np.flatnonzero(a == 10)
+    # digit values, after 7 padding bytes so that the 8 bytes ending at any digit exist
+    pad = np.zeros(len(a) + 7, dtype=np.uint8)
+    nib = pad[7:]
+    np.take(HexLut, a, out=nib)
+    edge = np.zeros(len(a) + 2, dtype=bool)
+    edge[1:-1] = nib != 255
+    nhex = np.count_nonzero(edge)
+    b = np.flatnonzero(edge[1:] != edge[:-1])
+    starts = b[0::2]                            # first digit of each word
+    ends = b[1::2] - 1                          # last digit of each word
+    length = ends - starts + 1
+    # the 8 bytes ending at the last digit, as big-endian nibbles; the bytes before a
+    # shorter word are set to 0
+    w = sliding_window_view(pad, 8)[ends]
+    short = np.flatnonzero(length < 8)
+    if len(short):
+        ws = w[short]
+        ws[np.arange(8) < (8 - length[short])[:, None]] = 0
+        w[short] = ws
+    words = ((w[:, 0::2] << 4) | w[:, 1::2]).view(">u4").ravel().astype(np.uint32)
+    first = np.searchsorted(starts, np.r_[0, nl + 1])
+    ok = np.ones(len(nl), dtype=bool)
+    long = np.flatnonzero(length > 8)
+    if len(long):
+        ok[np.searchsorted(nl, starts[long])] = False
+    if len(a) - nhex != len(nl) + np.count_nonzero(a == 32) + np.count_nonzero(a == 9) + np.count_nonzero(a == 13):
+        ok[np.searchsorted(nl, np.flatnonzero(_Other[a]))] = False
+    return words, first, ok
+
+
+def iter_chunks(f, size=ChunkSize):
+    '''Chunks of complete lines of a binary stream (the last one may miss the newline)'''
+    rest = b""
+    while True:
+        data = f.read(size)
+        if not data:
+            break
+        buf = rest + data if rest else data
+        cut = buf.rfind(b"\n") + 1
+        if cut == 0:
+            rest = buf
+            continue
+        rest = buf[cut:]
+        yield buf[:cut]
+    if rest:
+        yield rest + b"\n"
+
+
+def words_of_stream(f, size=ChunkSize):
+    '''For each line of a binary stream: its uint32 word array, or its text (str) when it
+       cannot be converted in bulk'''
+    for buf in iter_chunks(f, size):
+        words, first, ok = chunk_words(buf)
+        if ok.all():
+            for i in range(len(ok)):
+                yield words[first[i]:first[i + 1]]
+            continue
+        lines = buf.split(b"\n")
+        for i in range(len(ok)):
+            yield words[first[i]:first[i + 1]] if ok[i] else lines[i].decode(errors="replace")
+
+
+def iter_words(path, threads=None, size=ChunkSize):
+    '''words_of_stream of a plain or compressed run file'''
+    with run_reader.open_run(path, threads) as f:
+        for w in words_of_stream(f, size):
+            yield w
+
+
+def words_to_line(words):
+    '''Text line of a word array, for the error dumps'''
+    return " ".join("%x" % w for w in words)
+
+
+# Main: compare the conversion with the text path and time both
+if __name__ == "__main__":
+    import sys
+    import time
+    if len(sys.argv) != 2:
+        print("Usage: python %s <runfile>" % sys.argv[0])
+        sys.exit(1)
+    t0 = time.time()
+    ref = []
+    for line in run_reader.iter_lines(sys.argv[1]):
+        try:
+            ref.append([int(w, 16) for w in line.decode().split()])
+        except ValueError:
+            ref.append(None)   # left to the reference decoding path
+    t1 = time.time()
+    fast = list(iter_words(sys.argv[1]))
+    t2 = time.time()
+    ndiff = sum(1 for r, w in zip(ref, fast) if isinstance(w, str) != (r is None) or (r is not None and w.tolist() != r))
+    print("Lines       : %d (%d converted in bulk)" % (len(fast), sum(1 for w in fast if not isinstance(w, str))))
+    print("Differences : %d" % (ndiff + abs(len(ref) - len(fast))))
+    print("Text path   : %.3f s" % (t1 - t0))
+    print("Bytes path  : %.3f s" % (t2 - t1))
@@ -0,0 +1,99 @@
+# histo_cache.py
+# Persistent cache of the DrMon histograms of a run (python3 + ROOT)
+# The cache file is keyed by the absolute path of the run file; it stores the histograms,
+# the size and mtime of the run file and the last processed line and byte offset.
+# Compressed runs are keyed on size and mtime only: their offsets are positions in the
+# decompressed stream, so the tail check of a grown file does not apply to them.
+
+import hashlib
+import json
+import os
+import zlib
+import ROOT
+import run_reader
+
+CacheDir = os.path.expanduser("~/.cache/drmon")
+CacheVersion = 3
+MetaName = "drmon_meta"
+TailCheck = 4096  # bytes before the saved offset used to check that a grown file is the same run
+
+
+def _tailCrc(path, offset):
+    '''crc32 of the TailCheck bytes before offset, None for compressed runs'''
+    if run_reader.compression(path):
+        return None
+    start = max(0, offset - TailCheck)
+    with open(path, "rb") as f:
+        f.seek(start)
+        return zlib.crc32(f.read(offset - start))
+
+
+class HistoCache:
+    ''' Save/restore the histograms and the read position of a run file.
+    load() returns the saved state if the run file is unchanged (same size and mtime) or
+    grew after the save (same bytes before the saved offset, plain runs only), None otherwise. '''
+
+    def __init__(self, cachedir=CacheDir):
+        self.cachedir = cachedir
+
+    def pathFor(self, runfile):
+        key = hashlib.sha1(os.path.abspath(runfile).encode()).hexdigest()[:16]
+        return os.path.join(self.cachedir, "%s_%s.root" % (os.path.basename(runfile), key))
+
+    def save(self, runfile, hDict, state):
+        '''Write the histograms and state (json-able dict, must contain "offset")'''
+        os.makedirs(self.cachedir, exist_ok=True)
+        st = os.stat(runfile)
+        meta = dict(state)
+        meta.update({"version": CacheVersion, "path": os.path.abspath(runfile),
+                     "size": st.st_size, "mtime": st.st_mtime,
+                     "tailcrc": _tailCrc(runfile, state["offset"]),
+                     "histos": sorted(hDict.keys())})
+        path = self.pathFor(runfile)
+        tmp = path + ".tmp.root"
+        f = ROOT.TFile(tmp, "RECREATE")
+        for name, h in hDict.items():
+            h.Write(name.replace("/", "_over_"))
+        ROOT.TNamed(MetaName, json.dumps(meta)).Write()
+        f.Close()
+        os.replace(tmp, path)
+
+    def load(self, runfile, hDict, **expect):
+        '''Restore the histograms of hDict; expect: state entries that must match
+           (e.g. sample, trigCut). Returns the saved state or None'''
+        path = self.pathFor(runfile)
+        if not os.path.isfile(path) or not os.path.isfile(runfile):
+            return None
+        f = ROOT.TFile.Open(path)
+        if not f or f.IsZombie():
+            return None
+        try:
+            m = f.Get(MetaName)
+            if not m:
+                return None
+            meta = json.loads(m.GetTitle())
+            if meta.get("version") != CacheVersion or meta.get("path") != os.path.abspath(runfile):
+                return None
+            if meta.get("histos") != sorted(hDict.keys()):
+                return None
+            for k, v in expect.items():
+                if meta.get(k) != v:
+                    return None
+            st = os.stat(runfile)
+            unchanged = st.st_size == meta["size"] and st.st_mtime == meta["mtime"]
+            grown = (meta["tailcrc"] is not None and st.st_size > meta["size"]
+                     and _tailCrc(runfile, meta["offset"]) == meta["tailcrc"])
+            if not (unchanged or grown):
+                return None
+            cached = {}
+            for name in hDict:
+                h = f.Get(name.replace("/", "_over_"))
+                if not h:
+                    return None
+                cached[name] = h
+            for name, h in hDict.items():
+                h.Reset()
+                h.Add(cached[name])
+            return meta
+        finally:
+            f.Close()
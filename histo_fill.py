@@ -0,0 +1,314 @@
+# histo_fill.py
+# Histogram fill engine for DrMon (python3 + numpy)
+# Channel groups and histogram handles are resolved once, when the engine is built on
+# the booked histograms: the per-event path does no name formatting and no map scans.
+
+import numpy as np
+from event_batch import NumAdcChannels, NumTdcChannels
+from calibration import Calibration
+from spills import PhysTrigger, PedTrigger
+import dwc
+
+TriggerViews = ("phys", "pede", "oth")  # physics, pedestal and any other trigger mask
+DwcKinds = ("l-r", "l/r", "u-d", "u/d", "XY", "XY_mm")  # DWC histograms of each chamber ("dw1l-r", ...)
+DwcPairs = ("dwx1/x2", "dwx1-x2", "dwy1/y2", "dwy1-y2")  # chamber 1 against chamber 2
+
+
+def isPMT(ch):
+    return bool(int(ch) < 128)
+
+
+def getChannel(mapadc, phys):
+    '''Address of a physical channel name, -1 if not in the map'''
+    for ch, pl in mapadc.items():
+        if pl["phys"] == phys:
+            return int(ch)
+    return -1
+
+
+def fillN(h, x, w=None):
+    '''Fill a 1D histogram with an array of values'''
+    if len(x) == 0:
+        return
+    x = np.ascontiguousarray(x, dtype=np.float64)
+    w = np.ones(len(x)) if w is None else np.ascontiguousarray(w, dtype=np.float64)
+    h.FillN(len(x), x, w)
+
+
+def fillN2(h, x, y, w=None):
+    '''Fill a 2D histogram with arrays of values'''
+    if len(x) == 0:
+        return
+    x = np.ascontiguousarray(x, dtype=np.float64)
+    y = np.ascontiguousarray(y, dtype=np.float64)
+    w = np.ones(len(x)) if w is None else np.ascontiguousarray(w, dtype=np.float64)
+    h.FillN(len(x), x, y, w)
+
+
+def trigger_view(trigmask):
+    '''Trigger view ("phys", "pede" or "oth") of a trigger mask'''
+    return "phys" if trigmask == PhysTrigger else "pede" if trigmask == PedTrigger else "oth"
+
+
+def trigger_masks(trigmask):
+    '''Row masks of each trigger view for an array of trigger masks'''
+    phys = trigmask == PhysTrigger
+    pede = trigmask == PedTrigger
+    return {"phys": phys, "pede": pede, "oth": ~(phys | pede)}
+
+
+class HistoSet:
+    ''' Handles of one set of DrMon histograms, hDict: name -> histogram '''
+
+    def __init__(self, hDict):
+        self.hAdc = [hDict.get("adc-%03d" % ch) for ch in range(NumAdcChannels)]
+        self.hTdc = [hDict.get("tdc-%03d" % ch) for ch in range(NumTdcChannels)]
+        self.hTrMask = hDict["trMask"]
+        self.hChere = hDict["chere1/2"]
+        self.hTotS = hDict["PmtTotS"]
+        self.hTotC = hDict["PmtTotC"]
+        self.hTotSC = hDict["PmtTotSC"]
+        self.hMapS = hDict["HitMap_S"]
+        self.hMapC = hDict["HitMap_C"]
+        self.hTdcSz = hDict["tdc_sz"]
+        # DWC: one tuple of DwcKinds histograms per booked chamber, the DwcPairs histograms
+        self.hDwc = []
+        while "dw%dl-r" % (len(self.hDwc) + 1) in hDict:
+            n = len(self.hDwc) + 1
+            self.hDwc.append(tuple(hDict["dw%d%s" % (n, k)] for k in DwcKinds))
+        self.hDwcPairs = tuple(hDict[k] for k in DwcPairs) if len(self.hDwc) >= 2 else None
+
+
+class FillEngine:
+    ''' Fill the DrMon histograms, event by event (fill) or by EventBatch (fillBatch).
+    Build it after booking: hDict is the name -> histogram dictionary of DrMon.
+    views: optional dict trigger view ("phys", "pede", "oth", see TriggerViews) -> histogram
+    dictionary with the same names, filled only with the events of that trigger in the same
+    pass (the events are decoded, calibrated and reconstructed once). '''
+
+    def __init__(self, hDict, mapadc, trigCut=0, dwcSetup=None, views=None):
+        self.trigCut = trigCut
+        self.dwc = dwcSetup or dwc.DwcSetup()
+        self.nUnbooked = 0  # channels found in the data without a histogram
+        self.nMissing = 0   # mapped PMT channels missing in an event
+
+        # (trigger view, histograms): None for the set of all the events
+        views = views or {}
+        self.sets = [(None, HistoSet(hDict))] + [(v, HistoSet(views[v])) for v in TriggerViews if v in views]
+
+        self.cher1 = getChannel(mapadc, "Cher1")
+        self.cher2 = getChannel(mapadc, "Cher2")
+
+        # PMT channels: (addr, tower column, tower row, threshold, isS)
+        self.pmt = []
+        for ch in sorted(mapadc.keys()):
+            phys = mapadc[ch]["phys"]
+            if isPMT(ch) and ('-S' in phys or '-C' in phys):
+                self.pmt.append((ch, int(phys[0]), int(phys[1:3]), mapadc[ch]["monthreshold"], '-S' in phys))
+        self.pmtAddr = np.array([p[0] for p in self.pmt], dtype=np.int64)
+        self.pmtCol = np.array([p[1] for p in self.pmt], dtype=np.float64)
+        self.pmtRow = np.array([p[2] for p in self.pmt], dtype=np.float64)
+        self.pmtThr = np.array([p[3] for p in self.pmt], dtype=np.float64)
+        self.pmtIsS = np.array([p[4] for p in self.pmt], dtype=bool)
+        # total S and C sums use the calibration matrix (pedestals of the json)
+        self.calib = Calibration(mapadc)
+
+    ##### FillEngine method #######
+    def fill(self, event):
+        '''Fill the histograms with one DREvent, in a single pass over its channels'''
+
+        if not event.ADCs: # empty events skipped
+            return
+
+        if self.trigCut and event.TriggerMask != self.trigCut:
+            return
+
+        view = trigger_view(event.TriggerMask)
+        for v, hs in self.sets:
+            if v is None or v == view:
+                self.fillSet(hs, event, count=v is None)
+
+    ##### FillEngine method #######
+    def fillSet(self, hs, event, count=True):
+        '''Fill one HistoSet with one DREvent; count: update nUnbooked and nMissing'''
+        adc = event.ADCs
+
+        # Others
+        hs.hTrMask.Fill(event.TriggerMask)
+        c1 = adc.get(self.cher1)
+        c2 = adc.get(self.cher2)
+        if c1 is not None and c2 is not None:
+            hs.hChere.Fill(c1, c2)
+
+        # ADC
+        hAdc = hs.hAdc
+        for ch, val in adc.items():
+            h = hAdc[ch] if ch < NumAdcChannels else None
+            if h is None:
+                self.nUnbooked += count
+                continue
+            h.Fill(val)
+
+        # PMT hit maps and totals
+        sumS, sumC = 0., 0.
+        hS, hC = hs.hMapS, hs.hMapC
+        ped, gain = self.calib.pedestal, self.calib.gain
+        for ch, col, row, thr, isS in self.pmt:
+            val = adc.get(ch)
+            if val is None:
+                self.nMissing += count
+                continue
+            sig = val - ped[ch]
+            if isS:
+                if sig > thr:
+                    sumS += sig * gain[ch]
+                if val > thr:
+                    hS.Fill(col, row, val)
+            else:
+                if sig > thr:
+                    sumC += sig * gain[ch]
+                if val > thr:
+                    hC.Fill(col, row, val)
+        hs.hTotS.Fill(sumS)
+        hs.hTotC.Fill(sumC)
+        hs.hTotSC.Fill(sumS, sumC)
+
+        # TDC
+        hTdc = hs.hTdc
+        for ch, val in event.TDCs.items():
+            h = hTdc[ch] if ch < NumTdcChannels else None
+            if h is None:
+                self.nUnbooked += count
+                continue
+            h.Fill(val[0])
+        hs.hTdcSz.Fill(len(event.TDCs))
+
+        # DWC
+        self.fillDwc(event.TDCs, hs)
+
+    ##### FillEngine method #######
+    def fillDwc(self, tdc, hs=None):
+        '''DWC histograms of one event; hs: HistoSet (default: the set of all the events)'''
+        hs = hs if hs is not None else self.sets[0][1]
+        pos = self.dwc.reconstructEvent(tdc)
+        for c, (x, y, x_mm, y_mm, _), (hX, hLR, hY, hUD, hXY, hXYmm) in zip(self.dwc.chambers, pos, hs.hDwc):
+            if x is not None:
+                hX.Fill(x)
+                hLR.Fill(tdc[c.l][0], tdc[c.r][0])
+            if y is not None:
+                hY.Fill(y)
+                hUD.Fill(tdc[c.u][0], tdc[c.d][0])
+            if x is not None and y is not None:
+                hXY.Fill(x, y)
+                hXYmm.Fill(x_mm, y_mm)
+
+        if hs.hDwcPairs is None or len(pos) < 2:
+            return
+        hX12, hDX, hY12, hDY = hs.hDwcPairs
+        (x1, y1, x1_mm, y1_mm, _), (x2, y2, x2_mm, y2_mm, _) = pos[0], pos[1]
+        if x1 is not None and x2 is not None:
+            hX12.Fill(x1, x2)
+            hDX.Fill(x1_mm - x2_mm)
+        if y1 is not None and y2 is not None:
+            hY12.Fill(y1, y2)
+            hDY.Fill(y1_mm - y2_mm)
+
+    ##### FillEngine method #######
+    def fillBatch(self, batch):
+        '''Fill the histograms with a whole EventBatch: one FillN call per histogram and
+           trigger view. Calibration and DWC reconstruction are done once for all views.
+           Returns the CalibratedBatch of all the events of the batch (spill counters)'''
+
+        calibrated = self.calib.calibrate(batch)
+        sel = batch.adc_ok.any(axis=1) # empty events skipped
+        if self.trigCut:
+            sel &= batch.trigmask == self.trigCut
+        energy = calibrated
+        if not sel.all():
+            batch = batch.select(sel)
+            energy = calibrated.select(sel)
+        if len(batch) == 0:
+            return calibrated
+
+        res = dwc.reconstructBatch(batch, self.dwc)
+        masks = trigger_masks(batch.trigmask) if len(self.sets) > 1 else {}
+        for v, hs in self.sets:
+            if v is None:
+                self.fillSetBatch(hs, batch, energy, res, count=True)
+                continue
+            m = masks[v]
+            if m.any():
+                self.fillSetBatch(hs, batch.select(m), energy.select(m), res.select(m), count=False)
+        return calibrated
+
+    ##### FillEngine method #######
+    def fillSetBatch(self, hs, batch, energy, res, count=True):
+        '''Fill one HistoSet with an EventBatch, its CalibratedBatch and DwcResult'''
+
+        # Others
+        fillN(hs.hTrMask, batch.trigmask)
+        ok = batch.adc_ok
+        if self.cher1 >= 0 and self.cher2 >= 0:
+            both = ok[:, self.cher1] & ok[:, self.cher2]
+            fillN2(hs.hChere, batch.adc[both, self.cher1], batch.adc[both, self.cher2])
+
+        # ADC
+        for ch in np.flatnonzero(ok.any(axis=0)):
+            if hs.hAdc[ch] is None:
+                self.nUnbooked += int(ok[:, ch].sum()) if count else 0
+                continue
+            fillN(hs.hAdc[ch], batch.adc[ok[:, ch], ch])
+
+        # PMT hit maps and totals
+        vals = batch.adc[:, self.pmtAddr]
+        present = ok[:, self.pmtAddr]
+        if count:
+            self.nMissing += int((~present).sum())
+        hit = present & (vals > self.pmtThr)
+        for h, isS in ((hs.hMapS, self.pmtIsS), (hs.hMapC, ~self.pmtIsS)):
+            m = hit & isS
+            cols = np.broadcast_to(self.pmtCol, m.shape)[m]
+            rows = np.broadcast_to(self.pmtRow, m.shape)[m]
+            fillN2(h, cols, rows, vals[m])
+        fillN(hs.hTotS, energy.S)
+        fillN(hs.hTotC, energy.C)
+        fillN2(hs.hTotSC, energy.S, energy.C)
+
+        # TDC
+        tok = batch.tdc_ok
+        for ch in np.flatnonzero(tok.any(axis=0)):
+            if hs.hTdc[ch] is None:
+                self.nUnbooked += int(tok[:, ch].sum()) if count else 0
+                continue
+            fillN(hs.hTdc[ch], batch.tdc[tok[:, ch], ch])
+        fillN(hs.hTdcSz, tok.sum(axis=1))
+
+        # DWC
+        self.fillDwcBatch(batch, res, hs)
+
+    ##### FillEngine method #######
+    def fillDwcBatch(self, batch, res=None, hs=None):
+        '''DWC histograms of an EventBatch; res: its DwcResult if already reconstructed,
+           hs: HistoSet (default: the set of all the events)'''
+        if res is None:
+            res = dwc.reconstructBatch(batch, self.dwc)
+        hs = hs if hs is not None else self.sets[0][1]
+        for c, (hX, hLR, hY, hUD, hXY, hXYmm) in zip(range(res.x.shape[1]), hs.hDwc):
+            okX, okY = res.okX[:, c], res.okY[:, c]
+            fillN(hX, res.x[okX, c])
+            fillN2(hLR, res.lr[okX, c, 0], res.lr[okX, c, 1])
+            fillN(hY, res.y[okY, c])
+            fillN2(hUD, res.ud[okY, c, 0], res.ud[okY, c, 1])
+            xy = okX & okY
+            fillN2(hXY, res.x[xy, c], res.y[xy, c])
+            fillN2(hXYmm, res.x_mm[xy, c], res.y_mm[xy, c])
+
+        if hs.hDwcPairs is None or res.x.shape[1] < 2:
+            return
+        hX12, hDX, hY12, hDY = hs.hDwcPairs
+        both = res.okX[:, 0] & res.okX[:, 1]
+        fillN2(hX12, res.x[both, 0], res.x[both, 1])
+        fillN(hDX, res.x_mm[both, 0] - res.x_mm[both, 1])
+        both = res.okY[:, 0] & res.okY[:, 1]
+        fillN2(hY12, res.y[both, 0], res.y[both, 1])
+        fillN(hDY, res.y_mm[both, 0] - res.y_mm[both, 1])
@@ -0,0 +1,137 @@
+# lag_metrics.py
+# Streaming percentiles of the monitoring lag (python3 + numpy)
+#
+# LogHistogram counts positive values in logarithmic buckets (relative width 'precision'),
+# so that any percentile is known within that precision with a fixed, small memory and an
+# O(1) add. LagMonitor keeps two of them for the online monitor:
+#  - event age: wall clock at decode time minus the event time of the header (us), i.e.
+#    how old the data shown by the monitor are
+#  - byte backlog: bytes written to the run file and not read yet
+# over the whole run and over the current report window, and warns when the last value is
+# beyond its bound, at most once every warnEvery seconds for each bound.
+
+import math
+import time
+import numpy as np
+
+
+class LogHistogram:
+    ''' Values from 'low' to 'high' in buckets of relative width 'precision'; values below
+    low fall in the first bucket (negative values are counted in nneg), above high in the last '''
+
+    def __init__(self, low=1., high=1e12, precision=0.02):
+        self.low = low
+        self.logBase = math.log1p(precision)
+        self.nbins = int(math.ceil(math.log(high / low) / self.logBase)) + 1
+        self.reset()
+
+    def reset(self):
+        self.counts = np.zeros(self.nbins, dtype=np.int64)
+        self.n = 0
+        self.nneg = 0
+        self.sum = 0.
+        self.min = None
+        self.max = None
+
+    def add(self, x):
+        if x < 0:
+            self.nneg += 1
+        i = int(math.log(x / self.low) / self.logBase) if x > self.low else 0
+        self.counts[min(i, self.nbins - 1)] += 1
+        self.n += 1
+        self.sum += x
+        if self.min is None or x < self.min:
+            self.min = x
+        if self.max is None or x > self.max:
+            self.max = x
+
+    def addArray(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        if len(x) == 0:
+            return
+        self.nneg += int((x < 0).sum())
+        i = np.zeros(len(x), dtype=np.int64)
+        up = x > self.low
+        i[up] = (np.log(x[up] / self.low) / self.logBase).astype(np.int64)
+        np.add.at(self.counts, np.minimum(i, self.nbins - 1), 1)
+        self.n += len(x)
+        self.sum += float(x.sum())
+        self.min = float(x.min()) if self.min is None else min(self.min, float(x.min()))
+        self.max = float(x.max()) if self.max is None else max(self.max, float(x.max()))
+
+    def percentile(self, p):
+        '''Value below which p percent of the values are (bucket centre)'''
+        if self.n == 0:
+            return None
+        k = np.searchsorted(np.cumsum(self.counts), p / 100. * self.n, side="left")
+        if k == 0:
+            return min(self.low, self.max)
+        v = self.low * math.exp((k + 0.5) * self.logBase)
+        return min(max(v, self.min), self.max)
+
+    def mean(self):
+        return self.sum / self.n if self.n else None
+
+
+Percentiles = (50, 90, 99)
+
+
+class LagMonitor:
+    ''' Event age (s) and byte backlog of an online reader.
+    maxAge: bound on the event age in seconds, maxBacklog: bound on the backlog in bytes '''
+
+    def __init__(self, maxAge=30., maxBacklog=64e6, warnEvery=10.):
+        self.maxAge = maxAge
+        self.maxBacklog = maxBacklog
+        self.warnEvery = warnEvery
+        self.age = LogHistogram(1e-3, 1e7)         # s
+        self.backlog = LogHistogram(1., 1e12)      # bytes
+        self.ageWindow = LogHistogram(1e-3, 1e7)
+        self.backlogWindow = LogHistogram(1., 1e12)
+        self.lastAge = None
+        self.lastBacklog = None
+        self.lastWarn = {"age": None, "backlog": None}   # time of the last warning of each bound
+        self.nwarnings = 0
+
+    def add(self, evttime, backlog, now=None):
+        '''Add an event with header time evttime (us) read when backlog bytes were still to be
+           read; returns a warning message if a bound is exceeded, otherwise None'''
+        if now is None:
+            now = time.time()
+        age = now - evttime * 1e-6
+        self.lastAge, self.lastBacklog = age, backlog
+        for h in (self.age, self.ageWindow):
+            h.add(age)
+        for h in (self.backlog, self.backlogWindow):
+            h.add(backlog)
+        over = [k for k, v, bound in (("age", age, self.maxAge), ("backlog", backlog, self.maxBacklog)) if v > bound]
+        if not over:
+            return None
+        self.nwarnings += 1
+        due = [k for k in over if self.lastWarn[k] is None or now - self.lastWarn[k] >= self.warnEvery]
+        if not due:
+            return None
+        for k in due:
+            self.lastWarn[k] = now
+        return "WARNING - monitor lag: event age %.1f s (bound %.1f s), backlog %.1f MB (bound %.1f MB)" % (
+            age, self.maxAge, backlog / 1e6, self.maxBacklog / 1e6)
+
+    def report(self, window=True):
+        '''Percentile line of the current window (reset) or of the whole run'''
+        ha, hb = (self.ageWindow, self.backlogWindow) if window else (self.age, self.backlog)
+        if ha.n == 0:
+            return "Lag: no events"
+        pa = " ".join("p%d %.3g" % (p, ha.percentile(p)) for p in Percentiles)
+        pb = " ".join("p%d %.3g" % (p, hb.percentile(p) / 1e6) for p in Percentiles)
+        line = "Lag over %d events: age [s] %s max %.3g - backlog [MB] %s max %.3g" % (ha.n, pa, ha.max, pb, hb.max / 1e6)
+        if window:
+            ha.reset()
+            hb.reset()
+        return line
+
+    def counters(self):
+        c = {"nevents": self.age.n, "nwarnings": self.nwarnings}
+        for p in Percentiles:
+            c["age_p%d" % p] = self.age.percentile(p)
+            c["backlog_p%d" % p] = self.backlog.percentile(p)
+        return c
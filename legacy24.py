@@ -0,0 +1,239 @@
+# legacy24.py
+# Batch decoder of the ascii data format up to 2024 (python3 + numpy)
+#
+# Same fields as DREvent.DRdecode24, for whole chunks of lines at once: each line is cut
+# once into its header tokens and its ADC and TDC sections, then the sections of all the
+# lines are tokenized and converted together by hex_words.chunk_words (the decimal fields
+# are recovered from their hex reading) and scattered into an EventBatch, the columnar
+# structure of the 2025 path (event_batch.py), so that old and new runs go through the
+# same analysis code.
+# The TDC verification number goes to the tdcflag column. The conditions that DRdecode24
+# prints on every event (hexadecimal TDC size, invalid trigger mask) are counted instead.
+# DRdecode24 keeps the event time as a string: here it is an integer, -1 (and counted) if
+# the token is not one.
+# The lines with tokens that the bulk conversion does not take (signs, decimal tokens of
+# more than 8 digits, 0x prefixes, ...) are decoded by DRdecode24; the lines on which it
+# raises are skipped and counted.
+# Usage:
+#   dec = Decoder24()
+#   for batch in dec.iterBatches("run2024.txt"):
+#       ...
+#   dec.dump()
+
+import contextlib
+import io
+import sys
+import numpy as np
+import run_reader
+import DREvent
+from event_batch import EventBatch, NumAdcChannels, NumTdcChannels, batch_from_events, concat_batches
+from hex_words import chunk_words
+
+BatchLines = 1000   # lines decoded at once
+
+
+def _sectionWords(sections):
+    '''Words of one section per line converted at once as hex (hex_words.chunk_words), the
+       number of words of each section and which sections could be converted'''
+    words, first, ok = chunk_words(b"\n".join(sections) + b"\n")
+    return words, np.diff(first), ok
+
+
+def _decimal(words):
+    '''Value of decimal tokens that were converted as hex (at most 8 digits), and which
+       tokens were not decimal'''
+    out = np.zeros(len(words), dtype=np.int64)
+    bad = np.zeros(len(words), dtype=bool)
+    for k in range(8):
+        d = (words >> np.uint32(4 * k)) & np.uint32(0xF)
+        bad |= d > 9
+        out += d.astype(np.int64) * 10 ** k
+    return out, bad
+
+
+class Decoder24:
+    ''' Counters: nlines, nevents, nbad (lines on which DRdecode24 raises, skipped), nbadtrigger
+    (trigger mask set to 0xFFFFFFFF), nbadtime (event time not an integer, set to -1), nhexsize
+    (TDC size in hexadecimal), nbadsize (TDC size unknown, no TDC), nadcrange/ntdcrange
+    (channels outside the EventBatch arrays), nslow (lines decoded by DRdecode24) '''
+
+    def __init__(self):
+        self.nlines = 0
+        self.nevents = 0
+        self.nbad = 0
+        self.nbadtrigger = 0
+        self.nbadtime = 0
+        self.nhexsize = 0
+        self.nbadsize = 0
+        self.nadcrange = 0
+        self.ntdcrange = 0
+        self.nslow = 0
+
+    def _split(self, line):
+        '''Header tokens, ADC section and TDC values section of a line (bytes), as DRdecode24
+           cuts it (the TDC section is empty if DRdecode24 reads no TDC)'''
+        head, _, rest = line.rstrip(b"\r\n").partition(b":")
+        payload = rest.partition(b":")[0]
+        adcs, _, tdcs = payload.partition(b"TDC")
+        tdcs = tdcs.partition(b"TDC")[0]
+        t = tdcs.split(None, 2)
+        size = t[1] if len(t) > 1 else b""
+        if size.isdigit():
+            entries = int(size)
+        else:
+            try:
+                entries = int(size, 16)
+                self.nhexsize += 1
+            except ValueError:
+                entries = -1
+                self.nbadsize += 1
+        if entries <= 0:
+            return head.split(), adcs, b""
+        i = tdcs.find(b"val.s")
+        return head.split(), adcs, tdcs[i + 6:] if i >= 0 else tdcs[2:]
+
+    def _header(self, h):
+        '''(evtnumber, evttime, spillnumber, trigmask) from the header tokens; raises as DRdecode24'''
+        evt, spill = int(h[2]), int(h[6])
+        int(h[9]), int(h[10]), int(h[11])   # event counters, not in the batch
+        trig = h[14]
+        try:
+            trig = int(trig, 16)
+        except ValueError:
+            self.nbadtrigger += 1
+            trig = 0xFFFFFFFF
+        try:
+            t = int(h[4])
+        except ValueError:
+            self.nbadtime += 1
+            t = -1
+        return evt, t, spill, trig
+
+    def decodeLines(self, lines):
+        '''EventBatch of a list of lines (bytes or str)'''
+        lines = [l.encode() if isinstance(l, str) else l for l in lines]
+        self.nlines += len(lines)
+        batch = self._decode(lines)
+        self.nevents += len(batch)
+        return batch
+
+    def _decode(self, lines):
+        n = len(lines)
+        b = EventBatch(n)
+        head = np.zeros((n, 4), dtype=np.int64)
+        good = np.ones(n, dtype=bool)   # lines kept
+        adcSec, tdcSec = [], []
+        for k, line in enumerate(lines):
+            h, a, t = self._split(line)
+            adcSec.append(a)
+            tdcSec.append(t)
+            try:
+                head[k] = self._header(h)
+            except (ValueError, IndexError):
+                good[k] = False   # DRdecode24 raises on the header
+                self.nbad += 1
+        if n == 0:
+            return b
+        b.evtnumber[:], b.evttime[:], b.spillnumber[:], b.trigmask[:] = head.T
+
+        aw, na, aok = _sectionWords(adcSec)
+        tw, nt, tok = _sectionWords(tdcSec)
+        # lines of the bulk conversion: hex words of at most 8 digits, whole pairs and triples
+        fast = good & aok & tok & (na % 2 == 0) & (nt % 3 == 0)
+        arow = np.repeat(np.arange(n), na)
+        sel = fast[arow]
+        aw, arow = aw[sel], arow[sel]
+        trow = np.repeat(np.arange(n), nt)
+        sel = fast[trow]
+        tw, trow = tw[sel], trow[sel]
+        ach, bad = _decimal(aw[0::2])
+        fast[arow[0::2][bad]] = False
+        tval, bad = _decimal(tw)
+        fast[trow[bad]] = False
+
+        m = fast[arow[0::2]]
+        self._fillAdc(b, arow[0::2][m], ach[m], aw[1::2][m].astype(np.int32))
+        t = tval.reshape(-1, 3)
+        m = fast[trow[0::3]]
+        self._fillTdc(b, trow[0::3][m], t[m, 0], t[m, 2], t[m, 1])
+
+        for k in np.flatnonzero(good & ~fast):
+            good[k] = self._slow(b, k, lines[k])
+        return b if good.all() else b.select(good)
+
+    def _fillAdc(self, b, row, ch, val):
+        inside = (ch >= 0) & (ch < NumAdcChannels)
+        self.nadcrange += len(ch) - int(inside.sum())
+        b.adc[row[inside], ch[inside]] = val[inside]
+        b.adc_ok[row[inside], ch[inside]] = True
+
+    def _fillTdc(self, b, row, ch, val, ver):
+        inside = (ch >= 0) & (ch < NumTdcChannels)
+        self.ntdcrange += len(ch) - int(inside.sum())
+        b.tdc[row[inside], ch[inside]] = val[inside]
+        b.tdcflag[row[inside], ch[inside]] = np.clip(ver[inside], -128, 127)
+        b.tdc_ok[row[inside], ch[inside]] = True
+
+    def _slow(self, b, k, line):
+        '''Payload of row k decoded by DRdecode24; False if it raises (line skipped)'''
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):   # warnings counted by _split
+                ev = DREvent.DRdecode24(line.decode(errors="replace"))
+        except (ValueError, IndexError):
+            self.nbad += 1
+            return False
+        self.nslow += 1
+        row = np.full(len(ev.ADCs), k, dtype=np.int64)
+        self._fillAdc(b, row, np.array(list(ev.ADCs), dtype=np.int64),
+                      np.array([v & 0xFFFFFFFF for v in ev.ADCs.values()], dtype=np.uint32).astype(np.int32))
+        tdc = np.array([(ch, val, ver) for ch, (val, ver) in ev.TDCs.items()], dtype=np.int64).reshape(-1, 3)
+        self._fillTdc(b, np.full(len(tdc), k, dtype=np.int64), tdc[:, 0], tdc[:, 1], tdc[:, 2])
+        return True
+
+    def iterBatches(self, path, size=BatchLines):
+        '''EventBatch of every 'size' lines of a plain or compressed run file'''
+        lines = []
+        for line in run_reader.iter_lines(path):
+            lines.append(line)
+            if len(lines) == size:
+                yield self.decodeLines(lines)
+                lines = []
+        if lines:
+            yield self.decodeLines(lines)
+
+    def counters(self):
+        return dict(self.__dict__)
+
+    def dump(self):
+        print("Lines       : %d" % self.nlines)
+        print("Events      : %d" % self.nevents)
+        print("Bad lines   : %d" % self.nbad)
+        print("Warnings    : trigger mask %d, event time %d, hex TDC size %d, unknown TDC size %d" % (
+            self.nbadtrigger, self.nbadtime, self.nhexsize, self.nbadsize))
+        print("Out of range: ADC %d TDC %d channels" % (self.nadcrange, self.ntdcrange))
+        print("DRdecode24  : %d lines" % self.nslow)
+
+
+# Main: decode a 2023/2024 run, optionally (-c) comparing with DRdecode24
+if __name__ == "__main__":
+    import time
+    args = [a for a in sys.argv[1:] if a != "-c"]
+    if len(args) != 1:
+        print("Usage: python %s [-c] <runfile>" % sys.argv[0])
+        sys.exit(1)
+    dec = Decoder24()
+    t0 = time.time()
+    batches = list(dec.iterBatches(args[0]))
+    print("Decoding    : %.3f s" % (time.time() - t0))
+    dec.dump()
+    if "-c" in sys.argv:
+        import DREvent
+        import contextlib
+        import io
+        t0 = time.time()
+        with contextlib.redirect_stdout(io.StringIO()):
+            ref = batch_from_events(DREvent.DRdecode24(l.decode()) for l in run_reader.iter_lines(args[0]))
+        print("DRdecode24  : %.3f s" % (time.time() - t0))
+        fast = concat_batches(batches)
+        diff = [k for k in fast.columns() if not np.array_equal(getattr(fast, k), getattr(ref, k))]
+        print("Differences : %s" % (", ".join(diff) if diff else "none"))
@@ -0,0 +1,64 @@
+# load_shedding.py
+# Adaptive payload sampling of an online reader that lags behind the writer (python3)
+#
+# The lag is the number of bytes written to the run file and not read yet. While it is
+# above highLag, LoadShedder.decode() decodes only the event headers (DRdecode(lazy = True),
+# LazyDREvent.dropPayload(), ev.HeaderOnly) and the payload of one event every 'stride';
+# the stride starts at 2 and is doubled at each check while the lag still grows, up to
+# maxStride. Below lowLag every event is decoded again. All the headers are decoded, so
+# the event counts stay exact; 'fraction' is the share of the events with their payload.
+# Usage:
+#   shedder = LoadShedder()
+#   ev = shedder.decode(line, linecount)
+#   ...
+#   if shedder.check(lag): print("payload decoded for", shedder.tag(), "of the events")
+
+import DREvent
+
+
+class LoadShedder:
+    ''' Stride of the payload decoding from the lag, see the module header '''
+
+    def __init__(self, highLag = 16 << 20, lowLag = 1 << 20, maxStride = 64):
+        self.highLag = highLag
+        self.lowLag = lowLag
+        self.maxStride = maxStride
+        self.stride = 1
+        self.lastLag = 0
+
+    @property
+    def fraction(self):
+        return 1. / self.stride
+
+    def tag(self):
+        return "all" if self.stride == 1 else f"1/{self.stride}"
+
+    def check(self, lag):
+        '''Update the stride from the current lag; returns True if it changed'''
+        old = self.stride
+        if lag > self.highLag:
+            if self.stride == 1:
+                self.stride = 2
+            elif lag > self.lastLag:
+                self.stride = min(2 * self.stride, self.maxStride)
+        elif lag < self.lowLag:
+            self.stride = 1
+        self.lastLag = lag
+        return self.stride != old
+
+    def sampled(self, linecount):
+        return linecount % self.stride == 0
+
+    def decode(self, line, linecount, dumperror = None):
+        '''DREvent of a 2025 line (None if discarded): header-only unless the line is sampled'''
+        if self.stride == 1:
+            return DREvent.DRdecode(line, spec = '2025', verbose = False, dumperror = dumperror)
+        ev = DREvent.DRdecode(line, spec = '2025', verbose = False, dumperror = dumperror, lazy = True)
+        if ev is not None:
+            if self.sampled(linecount):
+                ev.ADCs  # decode the payload here, not on the consumer threads
+                if ev.Discarded:
+                    ev = None
+            else:
+                ev.dropPayload()
+        return ev
@@ -0,0 +1,146 @@
+# pedestals.py
+# Streaming estimate of the ADC pedestals from pedestal-trigger events (python3 + numpy)
+
+import json
+import os
+import time
+import numpy as np
+from event_batch import NumAdcChannels
+
+PedestalTrigger = 0x2  # triggermask of the pedestal events
+
+
+class PedestalEstimator:
+    ''' Per-channel pedestal mean and RMS updated with batches of pedestal events.
+    Batches are merged into the running values with the parallel form of the Welford
+    update, vectorized over all the channels. With window=None every event has the same
+    weight; with window=N the old values are exponentially forgotten with a time
+    constant of N pedestal events, so that the estimate follows pedestal drifts in a run.
+    '''
+
+    def __init__(self, nchannels=NumAdcChannels, window=None, trigger=PedestalTrigger):
+        self.nchannels = nchannels
+        self.trigger = trigger
+        self.decay = None if not window else 1. - 1./window
+        self.weight = np.zeros(nchannels)  # sum of weights (number of events without forgetting)
+        self.mean = np.zeros(nchannels)
+        self.m2 = np.zeros(nchannels)      # weighted sum of squared deviations from the mean
+        self.nevents = 0                   # pedestal events used
+        self.nwritten = 0                  # nevents at the last write
+        self.twritten = time.time()
+
+    @property
+    def rms(self):
+        out = np.zeros(self.nchannels)
+        np.divide(self.m2, self.weight, out=out, where=self.weight > 0)
+        return np.sqrt(out)
+
+    def update(self, adc, ok):
+        '''Update with (M, nchannels) arrays of pedestal-event counts and "channel present" flags'''
+        adc = adc[:, :self.nchannels]
+        ok = ok[:, :self.nchannels]
+        nb = ok.sum(axis=0).astype(float)
+        if not nb.any():
+            return
+        self.nevents += len(adc)
+        vals = np.where(ok, adc, 0.)
+        mb = np.zeros(self.nchannels)
+        np.divide(vals.sum(axis=0), nb, out=mb, where=nb > 0)
+        m2b = (np.where(ok, adc - mb, 0.)**2).sum(axis=0)
+
+        if self.decay is not None:
+            # events of this batch are weighted as if they were all the most recent one
+            forget = self.decay ** nb
+            self.weight *= forget
+            self.m2 *= forget
+
+        na = self.weight
+        n = na + nb
+        frac = np.zeros(self.nchannels)
+        np.divide(nb, n, out=frac, where=n > 0)
+        delta = mb - self.mean
+        self.mean += delta * frac
+        self.m2 += m2b + delta**2 * na * frac
+        self.weight = n
+
+    def updateBatch(self, batch):
+        '''Update with the pedestal-trigger events of an EventBatch'''
+        sel = batch.trigmask == self.trigger
+        if sel.any():
+            self.update(batch.adc[sel], batch.adc_ok[sel])
+
+    def updateEvent(self, ev):
+        '''Update with a single DREvent (ignored if it is not a pedestal event)'''
+        if ev is None or ev.TriggerMask != self.trigger or not ev.ADCs:
+            return
+        adc = np.zeros((1, self.nchannels))
+        ok = np.zeros((1, self.nchannels), dtype=bool)
+        for ch, val in ev.ADCs.items():
+            if ch < self.nchannels:
+                adc[0, ch] = val
+                ok[0, ch] = True
+        self.update(adc, ok)
+
+    def pedestals(self, default):
+        '''Running means of the channels with pedestal events, default for the others'''
+        return np.where(self.weight > 0, self.mean, default)
+
+    def state(self):
+        '''Running values as a dict of lists (histogram cache of DrMon)'''
+        return {"weight": self.weight.tolist(), "mean": self.mean.tolist(), "m2": self.m2.tolist(),
+                "nevents": self.nevents}
+
+    def restore(self, state):
+        for k in ("weight", "mean", "m2"):
+            setattr(self, k, np.array(state[k], dtype=float))
+        self.nevents = self.nwritten = state["nevents"]
+
+    def channelMap(self, mapadc):
+        '''Copy of a channel map (addr -> entry) with updated "pedestal" and "pedrms" fields'''
+        out = {}
+        rms = self.rms
+        for ch, entry in mapadc.items():
+            entry = dict(entry)
+            if ch < self.nchannels and self.weight[ch] > 0:
+                entry["pedestal"] = round(float(self.mean[ch]), 2)
+                entry["pedrms"] = round(float(rms[ch]), 2)
+            out[ch] = entry
+        return out
+
+    def writeJson(self, path, mapadc):
+        '''Write the updated channel json; the file is replaced atomically'''
+        m = self.channelMap(mapadc)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(dict((str(ch), m[ch]) for ch in m), f, indent=4)
+        os.replace(tmp, path)
+        self.nwritten = self.nevents
+        self.twritten = time.time()
+
+    def maybeWrite(self, path, mapadc, every=1000, interval=60.):
+        '''Write the json if at least 'every' new pedestal events were used
+           or 'interval' seconds passed since the last write. Returns True if written'''
+        if self.nevents == self.nwritten:
+            return False
+        if self.nevents - self.nwritten >= every or time.time() - self.twritten >= interval:
+            self.writeJson(path, mapadc)
+            return True
+        return False
+
+
+# Main: estimate the pedestals of a run file and write the updated channel json
+if __name__ == "__main__":
+    import sys
+    import formats
+    from calibration import load_channel_map
+    if len(sys.argv) < 4:
+        print("Usage: python %s <runfile> <channels_in.json> <channels_out.json> [window]" % sys.argv[0])
+        sys.exit(1)
+
+    mapadc = load_channel_map(sys.argv[2])
+    est = PedestalEstimator(window=int(sys.argv[4]) if len(sys.argv) > 4 else None)
+    for ev in formats.iter_events(sys.argv[1]):
+        est.updateEvent(ev)
+        est.maybeWrite(sys.argv[3], mapadc)
+    est.writeJson(sys.argv[3], mapadc)
+    print("%d pedestal events, pedestals written to %s" % (est.nevents, sys.argv[3]))
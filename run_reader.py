@@ -0,0 +1,318 @@
+# run_reader.py
+# Streaming readers for plain and compressed run files (python3)
+#
+# open_run(path) returns a binary buffered stream of the (decompressed) run file, so that
+# the usual line iteration feeds the decoder without an uncompressed copy on disk.
+#  - .gz   gzip; BGZF block-compressed files (bgzip) are decompressed in parallel blocks
+#  - .bz2  bzip2; multi-stream files (pbzip2, lbzip2) are decompressed in parallel streams
+#  - .xz   xz/lzma (serial)
+#  - .zst  zstandard (serial, needs the 'zstandard' package)
+# A truncated compressed file (a run still being compressed, an interrupted copy) is read up
+# to its last complete line, with a warning.
+# Plain files can have an offset index <run>.idx.npy (build_index) with the byte offset of
+# every line, for random access to the events without reading the whole file.
+
+import bz2
+import gzip
+import io
+import lzma
+import mmap
+import os
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CompressedSuffixes = (".gz", ".bz2", ".xz", ".zst")
+IndexSuffix = ".idx.npy"
+TaskSize = 1 << 20  # compressed bytes decompressed by one parallel task
+BufferSize = 1 << 20
+
+_Bz2Magic = b"\x31\x41\x59\x26\x53\x59"  # first block magic, after "BZh[1-9]"
+
+
+def compression(path):
+    '''Compression suffix of path, "" for plain files'''
+    for s in CompressedSuffixes:
+        if path.endswith(s):
+            return s
+    return ""
+
+
+def find_run(path):
+    '''path if it exists, else the first existing compressed variant of it, else None'''
+    if os.path.isfile(path):
+        return path
+    for s in CompressedSuffixes:
+        if os.path.isfile(path + s):
+            return path + s
+    return None
+
+
+# ---- Stream boundaries --------------------------------------------------------
+
+def _bz2_starts(mm):
+    '''Candidate start offsets of the bzip2 streams of a multi-stream file'''
+    starts = []
+    pos = 0
+    while True:
+        pos = mm.find(b"BZh", pos)
+        if pos < 0:
+            break
+        if b"1" <= mm[pos+3:pos+4] <= b"9" and mm[pos+4:pos+10] == _Bz2Magic:
+            starts.append(pos)
+        pos += 1
+    return starts
+
+
+def _bgzf_starts(mm):
+    '''Start offsets of the blocks of a BGZF file, None if it is not BGZF'''
+    size = len(mm)
+    starts = []
+    pos = 0
+    while pos < size:
+        # gzip header with FEXTRA, XLEN at 10, then the 'BC' subfield with BSIZE
+        if mm[pos:pos+4] != b"\x1f\x8b\x08\x04" or pos + 18 > size:
+            return None
+        xlen = struct.unpack_from("<H", mm, pos + 10)[0]
+        p, end = pos + 12, pos + 12 + xlen
+        bsize = None
+        while p + 4 <= end:
+            sid, slen = mm[p:p+2], struct.unpack_from("<H", mm, p + 2)[0]
+            if sid == b"BC" and slen == 2:
+                bsize = struct.unpack_from("<H", mm, p + 4)[0]
+                break
+            p += 4 + slen
+        if bsize is None:
+            return None
+        starts.append(pos)
+        pos += bsize + 1
+    return starts
+
+
+def _group(starts, size):
+    '''Group consecutive streams [start, end) into tasks of about TaskSize bytes'''
+    ends = starts[1:] + [size]
+    tasks, cur, curSize = [], [], 0
+    for a, b in zip(starts, ends):
+        cur.append((a, b))
+        curSize += b - a
+        if curSize >= TaskSize:
+            tasks.append(cur)
+            cur, curSize = [], 0
+    if cur:
+        tasks.append(cur)
+    return tasks
+
+
+def _inflate(mm, ranges, kind):
+    '''Decompress independent streams; returns (data, None) or (data so far, failing offset)'''
+    out = []
+    for a, b in ranges:
+        d = bz2.BZ2Decompressor() if kind == ".bz2" else zlib.decompressobj(31)
+        try:
+            data = d.decompress(mm[a:b])
+        except (OSError, EOFError, zlib.error):
+            return b"".join(out), a
+        if not d.eof or d.unused_data:
+            return b"".join(out), a
+        out.append(data)
+    return b"".join(out), None
+
+
+def _serial(path, kind, offset=0):
+    '''Serial decompressed chunks of path from compressed byte offset'''
+    fh = open(path, "rb")
+    fh.seek(offset)
+    if kind == ".bz2":
+        f = bz2.BZ2File(fh)
+    elif kind == ".gz":
+        f = gzip.GzipFile(fileobj=fh)
+    elif kind == ".xz":
+        f = lzma.LZMAFile(fh)
+    elif kind == ".zst":
+        if zstandard is None:
+            fh.close()
+            raise IOError("reading %s needs the 'zstandard' package" % path)
+        f = zstandard.ZstdDecompressor().stream_reader(fh, read_across_frames=True)
+    with fh, f:
+        read = getattr(f, "read1", f.read)  # one decompression step: no data lost on EOFError
+        while True:
+            data = read(BufferSize)
+            if not data:
+                break
+            yield data
+
+
+def _parallel(path, kind, threads):
+    '''Decompressed chunks of path, in order, decompressing independent streams in parallel.
+       Falls back to serial decompression from the first range that is not a full stream.'''
+    with open(path, "rb") as fh:
+        if os.fstat(fh.fileno()).st_size == 0:
+            return
+        mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    failed = 0
+    try:
+        starts = _bz2_starts(mm) if kind == ".bz2" else _bgzf_starts(mm)
+        if starts and len(starts) > 1 and starts[0] == 0:
+            failed = yield from _inflateAll(mm, starts, kind, threads)
+    finally:
+        mm.close()
+    if failed is not None:
+        yield from _serial(path, kind, failed)
+
+
+def _inflateAll(mm, starts, kind, threads):
+    '''Yield the decompressed streams in order with at most 2*threads tasks in flight;
+       returns None at the end or the offset of the first range that failed'''
+    it = iter(_group(starts, len(mm)))
+    with ThreadPoolExecutor(threads) as pool:
+        pending = [pool.submit(_inflate, mm, t, kind) for _, t in zip(range(2*threads), it)]
+        try:
+            while pending:
+                data, failed = pending.pop(0).result()
+                if data:
+                    yield data
+                if failed is not None:
+                    return failed
+                t = next(it, None)
+                if t is not None:
+                    pending.append(pool.submit(_inflate, mm, t, kind))
+        finally:
+            for p in pending:
+                p.cancel()
+    return None
+
+
+def _complete_lines(path, chunks):
+    '''The chunks cut at line ends; if the compressed file ends before its end-of-stream
+       marker (EOFError), warn and stop after the last complete line'''
+    tail = b""
+    try:
+        for data in chunks:
+            nl = data.rfind(b"\n")
+            if nl < 0:
+                tail += data
+                continue
+            yield tail + data[:nl+1]
+            tail = data[nl+1:]
+    except EOFError as err:
+        print("WARNING - %s is truncated (%s): read up to its last complete line" % (path, err))
+        return
+    finally:
+        chunks.close()
+    if tail:
+        yield tail
+
+
+# ---- Stream interface ---------------------------------------------------------
+
+class _ChunkStream(io.RawIOBase):
+    '''Raw read-only stream over a generator of byte chunks'''
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.buf = b""
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while self.pos >= len(self.buf):
+            self.buf = next(self.chunks, b"")
+            self.pos = 0
+            if not self.buf:
+                return 0
+        n = min(len(b), len(self.buf) - self.pos)
+        b[:n] = self.buf[self.pos:self.pos+n]
+        self.pos += n
+        return n
+
+    def close(self):
+        if not self.closed:
+            self.chunks.close()
+        super().close()
+
+
+def open_run(path, threads=None):
+    '''Open a run file for binary reading, decompressing it on the fly.
+       threads: decompression threads for multi-stream files (default: cpu count)'''
+    kind = compression(path)
+    if not kind:
+        return open(path, "rb")
+    threads = threads or os.cpu_count() or 1
+    if kind in (".bz2", ".gz") and threads > 1:
+        chunks = _parallel(path, kind, threads)
+    else:
+        chunks = _serial(path, kind)
+    return io.BufferedReader(_ChunkStream(_complete_lines(path, chunks)), BufferSize)
+
+
+def iter_lines(path, threads=None):
+    '''Iterate over the lines (bytes, with the newline) of a plain or compressed run file'''
+    with open_run(path, threads) as f:
+        for line in f:
+            yield line
+
+
+# ---- Offset index -------------------------------------------------------------
+
+def index_path(path):
+    return path + IndexSuffix
+
+
+def line_offsets(path, start=0):
+    '''Offsets of the complete lines of a plain file from byte start (a line start):
+       N+1 offsets, line i is [off[i], off[i+1]) and off[N] is the end of the last complete line'''
+    import numpy as np
+    parts = [np.array([start], dtype=np.int64)]
+    with open(path, "rb") as f:
+        f.seek(start)
+        pos = start
+        while True:
+            data = f.read(BufferSize * 16)
+            if not data:
+                break
+            nl = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == 10)
+            parts.append(nl.astype(np.int64) + (pos + 1))
+            pos += len(data)
+    return np.concatenate(parts)
+
+
+def build_index(path):
+    '''Write (or extend, if the run grew) the offset index of a plain run file; returns it'''
+    import numpy as np
+    if compression(path):
+        raise ValueError("offset index not supported for compressed file %s" % path)
+    old = load_index(path)
+    if old is not None and len(old) > 1:
+        offs = np.concatenate([old[:-1], line_offsets(path, int(old[-1]))])
+    else:
+        offs = line_offsets(path)
+    tmp = index_path(path) + ".tmp.npy"
+    np.save(tmp, offs)
+    os.replace(tmp, index_path(path))
+    return offs
+
+
+def load_index(path):
+    '''Offset index of path, or None if there is none or it does not match the file'''
+    import numpy as np
+    ip = index_path(path)
+    if not os.path.isfile(ip):
+        return None
+    offs = np.load(ip)
+    if offs.ndim != 1 or len(offs) == 0 or offs[-1] > os.path.getsize(path):
+        return None
+    if os.path.getmtime(ip) < os.path.getmtime(path) and offs[-1] > 0:
+        # the run grew (or was rewritten) after the index: the indexed part must still end a line
+        with open(path, "rb") as f:
+            f.seek(int(offs[-1]) - 1)
+            if f.read(1) != b"\n":
+                return None
+    return offs
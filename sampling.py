@@ -0,0 +1,188 @@
+# sampling.py
+# Event sampling strategies for the run readers (python3)
+#
+# A sampler reads the lines of a run from a binary stream and yields only the sampled
+# events, as records (line number, byte offset after the line, raw line, weight). The
+# weight is the number of events of the run represented by the sampled one, to be carried
+# along with every statistics filled from it (EventBatch.weight).
+#  - Every:      all the lines, weight 1
+#  - Stride:     one line every n; with an offset index (run_reader.build_index) the
+#                skipped lines are not even read
+#  - Reservoir:  k random lines per spill (reservoir sampling), weight nSpill/k; on a
+#                growing file the spill still being written is held back until it closes
+#  - TimeBudget: as many lines as can be decoded in a CPU time budget per read; the
+#                stride is adapted to the bytes still to read and the measured decoding cost,
+#                and the read stops when the budget is spent
+# After the loop, nextLine and offset give the position reached in the stream. pending is
+# the (line, offset) of the first line read but held back by the sampler (None if none):
+# a new sampler restarting from a saved position must restart from there.
+
+import math
+import os
+import random
+import time
+
+
+class Every:
+    ''' All the lines '''
+
+    def __init__(self):
+        self.nextLine = 0
+        self.offset = 0
+        self.complete = True
+        self.pending = None
+
+    def tag(self):
+        '''Description of the sampling, for logs and caches'''
+        return "all"
+
+    def _lines(self, f, first, pos):
+        '''(line, offset after it, raw) of the complete lines of f, positioned at line first / byte pos'''
+        for i, raw in enumerate(f, first):
+            if not raw.endswith(b"\n") and self.complete:
+                return  # last line still being written
+            pos += len(raw)
+            yield i, pos, raw
+
+    def records(self, f, first=0, pos=0, complete=True):
+        '''Sampled records of f; complete: stop at a line without newline'''
+        self.complete = complete
+        self.nextLine, self.offset = first, pos
+        for i, pos, raw in self._lines(f, first, pos):
+            self.nextLine, self.offset = i + 1, pos
+            yield i, pos, raw, 1.
+
+
+class Stride(Every):
+    ''' One line every n (lines with number % n == 0) '''
+
+    def __init__(self, n, offsets=None):
+        Every.__init__(self)
+        self.n = n
+        self.offsets = offsets  # line offsets of the offset index, if any
+
+    def tag(self):
+        return "stride %d" % self.n
+
+    def records(self, f, first=0, pos=0, complete=True):
+        self.complete = complete
+        self.nextLine, self.offset = first, pos
+        offs = self.offsets
+        if offs is not None and first < len(offs) - 1 and offs[first] == pos:
+            # random access through the index, the skipped lines are not read
+            nidx = len(offs) - 1
+            for i in range(first + (-first) % self.n, nidx, self.n):
+                f.seek(int(offs[i]))
+                raw = f.read(int(offs[i + 1] - offs[i]))
+                self.nextLine, self.offset = i + 1, int(offs[i + 1])
+                yield i, self.offset, raw, float(self.n)
+            self.nextLine, self.offset = nidx, int(offs[nidx])
+            f.seek(self.offset)
+            first, pos = self.nextLine, self.offset
+        for i, pos, raw in self._lines(f, first, pos):
+            self.nextLine, self.offset = i + 1, pos
+            if i % self.n == 0:
+                yield i, pos, raw, float(self.n)
+
+
+def spill_of(raw):
+    '''Spill number from the event header of a raw 2025 line, None if it cannot be read'''
+    w = raw.split(None, 3)
+    try:
+        return int(w[2], 16)
+    except (IndexError, ValueError):
+        return None
+
+
+class Reservoir(Every):
+    ''' k random lines per spill. The lines of a spill are yielded (in file order) when the
+    next spill starts, with weight nSpill/k. At the end of a complete stream (complete=False)
+    the last spill is yielded too; otherwise it may still grow, and its reservoir is carried
+    over to the next call of records() if that resumes at nextLine/offset '''
+
+    def __init__(self, k, seed=None):
+        Every.__init__(self)
+        self.k = k
+        self.rng = random.Random(seed)
+        self.lastRead = None
+        self.open = None   # (spill, n, reservoir, (line, offset) of its first line) held back
+
+    def tag(self):
+        return "reservoir %d/spill" % self.k
+
+    def records(self, f, first=0, pos=0, complete=True):
+        self.complete = complete
+        self.nextLine, self.offset = first, pos
+        carried = self.open if self.lastRead == (first, pos) else None
+        spill, n, res, start = carried or (None, 0, [], (first, pos))
+        self.open = self.pending = None
+        self.lastRead = (first, pos)
+        for i, pos, raw in self._lines(f, first, pos):
+            sp = spill_of(raw)
+            if sp != spill and n:
+                for r in self._flush(n, res):
+                    yield r
+                n, res, start = 0, [], (i, pos - len(raw))
+            spill = sp
+            n += 1
+            if len(res) < self.k:
+                res.append((i, pos, raw))
+            else:
+                j = self.rng.randrange(n)
+                if j < self.k:
+                    res[j] = (i, pos, raw)
+            self.lastRead = (i + 1, pos)
+        if n and not complete:
+            for r in self._flush(n, res):
+                yield r
+        elif n:
+            self.open = (spill, n, res, start)
+            self.pending = start
+            self.nextLine, self.offset = self.lastRead
+
+    def _flush(self, n, res):
+        w = float(n) / len(res)
+        for i, pos, raw in sorted(res):
+            yield i, pos, raw, w
+        # position after the last line of the spill, not of the last sampled one
+        self.nextLine, self.offset = self.lastRead
+
+
+class TimeBudget(Every):
+    ''' Decode as many lines as fit in 'budget' seconds of CPU time per call of records().
+    The time spent by the consumer between two records is included. The stride is
+    recomputed on every record from the bytes left (up to 'size', by default the size of
+    the file at the start of each call) and the measured cost. When the budget is spent
+    the call returns; nextLine/offset are then at the first line not sampled '''
+
+    def __init__(self, budget, size=None):
+        Every.__init__(self)
+        self.budget = budget
+        self.size = size      # bytes of the stream to read, None: fstat of the file
+        self.stride = 1
+
+    def tag(self):
+        return "budget %gs" % self.budget
+
+    def records(self, f, first=0, pos=0, complete=True):
+        self.complete = complete
+        self.nextLine, self.offset = first, pos
+        size = self.size if self.size is not None else os.fstat(f.fileno()).st_size
+        start, t0, nsel, skip = pos, time.process_time(), 0, 0
+        for i, pos, raw in self._lines(f, first, pos):
+            if skip > 0:
+                self.nextLine, self.offset = i + 1, pos
+                skip -= 1
+                continue
+            used = time.process_time() - t0
+            left = self.budget - used
+            if left <= 0:
+                return   # this line and the next ones are left to the next call
+            self.nextLine, self.offset = i + 1, pos
+            nsel += 1
+            # cost of one sampled record and lines still to read (from the mean line length)
+            cost = used / nsel
+            lines = (max(size, pos) - pos) * (i + 1 - first) / float(pos - start)
+            self.stride = max(1, min(int(math.ceil(lines * cost / left)), int(round(lines)) + 1))
+            yield i, pos, raw, float(self.stride)
+            skip = self.stride - 1
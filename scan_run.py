@@ -0,0 +1,252 @@
+# scan_run.py
+# Header-only fast scan of a run file (python3 + numpy)
+#
+# Reads only the 14-word event header of each line (the module payload is never split nor
+# converted) and parses the header words of many events at once with numpy. Reports the
+# events per trigger mask, the spills, the event number range with gaps and duplicates
+# and the time span of the run.
+# If the run has an offset index (run_reader.build_index, option -i) only the header bytes
+# of each line are read; with -p N the file is scanned by N processes.
+
+import getopt
+import mmap
+import os
+import sys
+import numpy as np
+import run_reader
+from hex_words import HexLut
+from spills import PhysTrigger, PedTrigger
+
+HeaderWords = 14
+HeaderBytes = 160      # 14 hex words of at most 8 digits, with separators
+BlockSize = 16 << 20   # bytes read at once when looking for the line ends
+MaxGaps = 10           # event number gaps listed in the report
+
+
+def hex_to_u32(tokens):
+    '''Convert a list of hex tokens (bytes) to a uint32 array; returns (values, ok)'''
+    if not tokens:
+        return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=bool)
+    a = np.array(tokens)
+    width = a.dtype.itemsize
+    b = a.view(np.uint8).reshape(len(tokens), width)
+    length = np.count_nonzero(b, axis=1)
+    ok = (length > 0) & (length <= 8)
+    val = np.zeros(len(tokens), dtype=np.int64)
+    for j in range(min(width, 8)):
+        nib = HexLut[b[:, j]]
+        inside = j < length
+        ok &= ~inside | (nib != 255)
+        val = np.where(inside, (val << 4) | nib, val)
+    return val.astype(np.uint32), ok
+
+
+def parse_headers(prefixes):
+    '''Event headers of the line prefixes: (N,14) uint32 array of the valid headers and
+       the number of lines with an invalid header (same checks as parse_evt_header)'''
+    words = [p.split(None, HeaderWords)[:HeaderWords] for p in prefixes]
+    full = np.array([len(w) == HeaderWords for w in words], dtype=bool)
+    flat = [t for w, f in zip(words, full) if f for t in w]
+    val, ok = hex_to_u32(flat)
+    eh = val.reshape(-1, HeaderWords).astype(np.int64)
+    good = ok.reshape(-1, HeaderWords).all(axis=1)
+    good &= (eh[:, 0] == 0xccaaffee) & (eh[:, 13] == 0xaccadead) & (eh[:, 3] == 0xe) & (eh[:, 4] == 0x1)
+    good &= eh[:, 6] == eh[:, 3] + eh[:, 4] + eh[:, 5]
+    return eh[good], len(prefixes) - int(good.sum())
+
+
+class ScanResult:
+    ''' Header columns of the scanned events, in file order '''
+
+    def __init__(self, evtnumber=None, spillnumber=None, evttime=None, trigmask=None, nbad=0):
+        empty = np.zeros(0, dtype=np.int64)
+        self.evtnumber = evtnumber if evtnumber is not None else empty
+        self.spillnumber = spillnumber if spillnumber is not None else empty
+        self.evttime = evttime if evttime is not None else empty
+        self.trigmask = trigmask if trigmask is not None else empty
+        self.nbad = nbad   # lines with an invalid event header
+
+    @classmethod
+    def fromHeaders(cls, eh, nbad):
+        return cls(eh[:, 1], eh[:, 2], eh[:, 7] * 1000000 + eh[:, 8], eh[:, 9], nbad)
+
+    @classmethod
+    def merge(cls, parts):
+        parts = list(parts)
+        if not parts:
+            return cls()
+        return cls(*[np.concatenate([getattr(p, k) for p in parts])
+                     for k in ("evtnumber", "spillnumber", "evttime", "trigmask")],
+                   nbad=sum(p.nbad for p in parts))
+
+    def __len__(self):
+        return len(self.evtnumber)
+
+    def triggers(self):
+        '''{trigmask: events}'''
+        m, n = np.unique(self.trigmask, return_counts=True)
+        return dict(zip(m.tolist(), n.tolist()))
+
+    def spills(self):
+        '''{spillnumber: events}'''
+        s, n = np.unique(self.spillnumber, return_counts=True)
+        return dict(zip(s.tolist(), n.tolist()))
+
+    def gaps(self):
+        '''(first, last) missing event number ranges between the first and the last event'''
+        u = np.unique(self.evtnumber)
+        d = np.flatnonzero(np.diff(u) > 1)
+        return list(zip((u[d] + 1).tolist(), (u[d + 1] - 1).tolist()))
+
+    def nduplicates(self):
+        return len(self) - len(np.unique(self.evtnumber))
+
+    def report(self, fname="", maxGaps=MaxGaps):
+        names = {PhysTrigger: "phys", PedTrigger: "pede"}
+        print("File name   :", fname)
+        print("Events      :", len(self))
+        print("Bad headers :", self.nbad)
+        if len(self) == 0:
+            return
+        for m, n in sorted(self.triggers().items()):
+            print("Trigger %-4s: %d (%s)" % (m, n, names.get(m, "other")))
+        sp = self.spills()
+        cnt = list(sp.values())
+        print("Spills      : %d [%d - %d], %d - %d events per spill" % (len(sp), min(sp), max(sp), min(cnt), max(cnt)))
+        gaps = self.gaps()
+        print("EventNumber : %d - %d" % (self.evtnumber.min(), self.evtnumber.max()))
+        print("Missing     : %d in %d gaps" % (sum(b - a + 1 for a, b in gaps), len(gaps)))
+        for a, b in gaps[:maxGaps]:
+            print("              %d - %d" % (a, b))
+        if len(gaps) > maxGaps:
+            print("              ...")
+        print("Duplicates  :", self.nduplicates())
+        t0, t1 = int(self.evttime.min()), int(self.evttime.max())
+        dur = (t1 - t0) * 1e-6
+        print("Time span   : %d - %d us, %.2f s, %.1f Hz" % (t0, t1, dur, (len(self) - 1) / dur if dur > 0 else 0.))
+
+
+# ---- Scanners -----------------------------------------------------------------
+
+def _scanBuffer(buf, starts, ends):
+    prefixes = [buf[a:min(b, a + HeaderBytes)] for a, b in zip(starts.tolist(), ends.tolist()) if b > a]
+    return ScanResult.fromHeaders(*parse_headers(prefixes))
+
+
+def scan_stream(f, limit=None):
+    '''Scan the lines of a binary stream, at most limit bytes'''
+    parts = []
+    rest = b""
+    left = limit
+    while True:
+        n = BlockSize if left is None else min(BlockSize, left)
+        data = f.read(n) if n > 0 else b""
+        if left is not None:
+            left -= len(data)
+        if not data:
+            break
+        buf = rest + data
+        nl = np.flatnonzero(np.frombuffer(buf, dtype=np.uint8) == 10)
+        if len(nl) == 0:
+            rest = buf
+            continue
+        parts.append(_scanBuffer(buf, np.r_[0, nl[:-1] + 1], nl))
+        rest = buf[nl[-1] + 1:]
+    if rest.strip():
+        parts.append(_scanBuffer(rest, np.array([0]), np.array([len(rest)])))
+    return ScanResult.merge(parts)
+
+
+def scan_indexed(path, offs):
+    '''Scan the lines of the offset index offs, reading only their headers'''
+    with open(path, "rb") as fh:
+        if os.fstat(fh.fileno()).st_size == 0 or len(offs) < 2:
+            return ScanResult()
+        mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        parts = []
+        step = BlockSize // 1024
+        for i in range(0, len(offs) - 1, step):
+            o = offs[i:i + step + 1]
+            parts.append(_scanBuffer(mm, o[:-1], o[1:] - 1))
+        return ScanResult.merge(parts)
+    finally:
+        mm.close()
+
+
+def scan_range(path, start, end):
+    '''Scan the lines of a plain file between byte start (a line start) and end'''
+    with open(path, "rb") as f:
+        f.seek(start)
+        return scan_stream(f, end - start)
+
+
+def _lineStart(f, pos):
+    '''Offset of the first line starting at or after pos'''
+    if pos == 0:
+        return 0
+    f.seek(pos - 1)
+    while True:
+        data = f.read(1 << 16)
+        if not data:
+            return f.tell()
+        i = data.find(b"\n")
+        if i >= 0:
+            return f.tell() - len(data) + i + 1
+
+
+def scan(path, procs=1, useIndex=True):
+    '''Scan a plain or compressed run file, with procs processes (plain files only)'''
+    if run_reader.compression(path):
+        with run_reader.open_run(path) as f:
+            return scan_stream(f)
+    offs = run_reader.load_index(path) if useIndex else None
+    size = os.path.getsize(path)
+    done = int(offs[-1]) if offs is not None else 0
+    if procs <= 1:
+        parts = [scan_indexed(path, offs)] if offs is not None else []
+        parts.append(scan_range(path, done, size))
+        return ScanResult.merge(parts)
+
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(procs) as pool:
+        futures = []
+        if offs is not None:
+            for lines in np.array_split(np.arange(len(offs) - 1), procs):
+                if len(lines):
+                    futures.append(pool.submit(scan_indexed, path, offs[lines[0]:lines[-1] + 2]))
+        with open(path, "rb") as f:
+            cuts = sorted(set(_lineStart(f, done + (size - done) * i // procs) for i in range(procs)))
+        for a, b in zip(cuts, cuts[1:] + [size]):
+            futures.append(pool.submit(scan_range, path, a, b))
+        return ScanResult.merge(f.result() for f in futures)
+
+
+def Usage():
+    print("Scan the event headers of a run file and print the run statistics")
+    print("Usage: python scan_run.py [options] <runfile>")
+    print("   -p procs    Number of processes (plain files only, def=1)")
+    print("   -i          Build or update the offset index of the run before the scan")
+    print("   -n          Do not use the offset index")
+    print("   -g maxGaps  Number of event number gaps listed (def=%d)" % MaxGaps)
+    sys.exit(2)
+
+
+# Main: scan a run file
+if __name__ == "__main__":
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "p:ing:h")
+    except getopt.GetoptError:
+        Usage()
+    opts = dict(opts)
+    if len(args) != 1 or "-h" in opts:
+        Usage()
+
+    fname = run_reader.find_run(args[0])
+    if fname is None:
+        print("File not found:", args[0])
+        sys.exit(1)
+    if "-i" in opts:
+        print("Index       : %d lines" % (len(run_reader.build_index(fname)) - 1))
+    res = scan(fname, int(opts.get("-p", 1)), "-n" not in opts)
+    res.report(fname, int(opts.get("-g", MaxGaps)))
@@ -0,0 +1,294 @@
+# shm_ring.py
+# Shared-memory ring buffer of decoded events (python3 + numpy)
+#
+# One decoder process writes the decoded events into a fixed-size ring of slots in a
+# multiprocessing.shared_memory block; any number of consumer processes read it at their
+# own pace, so the raw stream is decoded once per host whatever the number of monitors.
+#  - Each slot holds the header fields and fixed-width ADC/TDC arrays (EventBatch columns)
+#    and a sequence word used as a seqlock: odd while the slot is written, 2*(seq+1) when
+#    event number seq of the stream is complete in it.
+#  - The ring header holds the number of events written (write_seq).
+#  - Each RingReader keeps its own cursor (next event to read); if the writer laps it the
+#    overwritten events are counted as lost (overrun) and the cursor jumps forward.
+# Usage:
+#   python shm_ring.py publish <runfile> [-f] [-n name] [-s nslots]   decode (and follow) a run
+#   python shm_ring.py dump [-n name]                                 print the events of the ring
+
+import getopt
+import sys
+import time
+import numpy as np
+from multiprocessing import shared_memory
+from event_batch import EventBatch, NumAdcChannels, NumTdcChannels
+
+DefaultName = "drdaq_events"
+DefaultSlots = 1 << 14
+Magic = 0x44524e47  # "DRNG"
+Version = 1
+
+HeaderDtype = np.dtype([("magic", np.uint32), ("version", np.uint32), ("nslots", np.uint64),
+                        ("write_seq", np.uint64), ("pad", np.uint64, 5)])  # 64 bytes
+
+SlotDtype = np.dtype([("seq", np.uint64),
+                      ("evtnumber", np.int64), ("spillnumber", np.int64), ("evttime", np.int64),
+                      ("trigmask", np.int64), ("errors", np.uint32), ("weight", np.float32),
+                      ("adc", np.int32, NumAdcChannels), ("adc_ok", np.bool_, NumAdcChannels),
+                      ("tdc", np.int32, NumTdcChannels), ("tdcflag", np.int8, NumTdcChannels),
+                      ("tdc_ok", np.bool_, NumTdcChannels)])
+
+Columns = ("evtnumber", "spillnumber", "evttime", "trigmask", "errors", "weight",
+           "adc", "adc_ok", "tdc", "tdcflag", "tdc_ok")
+
+
+def _attach(name):
+    '''Attach to an existing block without letting this process unlink it at exit'''
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    # older python registers every attached block with the resource tracker
+    from multiprocessing import resource_tracker
+    register = resource_tracker.register
+    resource_tracker.register = lambda *args: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+class _Ring:
+    def _map(self, shm):
+        self.shm = shm
+        self.head = np.ndarray((), dtype=HeaderDtype, buffer=shm.buf)
+        self.nslots = int(self.head["nslots"])
+        self.slots = np.ndarray((self.nslots,), dtype=SlotDtype, buffer=shm.buf, offset=HeaderDtype.itemsize)
+        self.cols = dict((c, self.slots[c]) for c in SlotDtype.names)  # views of the slot fields
+
+    @property
+    def writeSeq(self):
+        return int(self.head["write_seq"])
+
+    def close(self):
+        if self.shm is not None:
+            del self.head, self.slots, self.cols
+            self.shm.close()
+            self.shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class RingWriter(_Ring):
+    ''' Single writer of the ring: creates the shared memory block (unlinked by close) '''
+
+    def __init__(self, name=DefaultName, nslots=DefaultSlots):
+        size = HeaderDtype.itemsize + nslots * SlotDtype.itemsize
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # left over by a writer that did not close: reuse it from scratch
+            old = _attach(name)
+            old.close()
+            old.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.name = name
+        head = np.ndarray((), dtype=HeaderDtype, buffer=shm.buf)
+        head["nslots"] = nslots
+        head["write_seq"] = 0
+        head["version"] = Version
+        head["magic"] = Magic
+        del head
+        self._map(shm)
+        self.slots["seq"] = 0
+
+    def publish(self, batch):
+        '''Write the events of an EventBatch (only the last nslots if it is larger)'''
+        n = len(batch)
+        if n == 0:
+            return
+        # the events that do not fit are counted as written (and lost by the readers)
+        first = max(0, n - self.nslots)
+        w = self.writeSeq + first
+        while first < n:
+            slot = w % self.nslots
+            k = min(n - first, self.nslots - slot)
+            self._write(slot, w, batch, first, k)
+            first += k
+            w += k
+        self.head["write_seq"] = w
+
+    def _write(self, slot, w, batch, first, k):
+        s = self.slots[slot:slot+k]
+        seq = np.arange(w, w + k, dtype=np.uint64)
+        s["seq"] = 2 * seq + 1  # being written
+        for c in Columns:
+            s[c] = getattr(batch, c)[first:first+k]
+        s["seq"] = 2 * seq + 2
+
+    def publishEvent(self, ev, weight=1.):
+        '''Write one DREvent straight into its slot'''
+        w = self.writeSeq
+        i = w % self.nslots
+        col = self.cols
+        col["seq"][i] = 2 * w + 1  # being written
+        col["evtnumber"][i] = ev.EventNumber
+        col["spillnumber"][i] = ev.SpillNumber
+        col["evttime"][i] = ev.EventTime
+        col["trigmask"][i] = ev.TriggerMask
+        col["errors"][i] = ev.ErrorMask
+        col["weight"][i] = weight
+        adc, adcOk = col["adc"][i], col["adc_ok"][i]
+        adc[:] = 0
+        adcOk[:] = False
+        if ev.ADCs:
+            addr = np.fromiter(ev.ADCs, dtype=np.int64, count=len(ev.ADCs))
+            adc[addr] = np.fromiter(ev.ADCs.values(), dtype=np.int32, count=len(ev.ADCs))
+            adcOk[addr] = True
+        tdc, tdcFlag, tdcOk = col["tdc"][i], col["tdcflag"][i], col["tdc_ok"][i]
+        tdc[:] = 0
+        tdcFlag[:] = 0
+        tdcOk[:] = False
+        for ch, (val, flag) in ev.TDCs.items():
+            tdc[ch] = val
+            tdcFlag[ch] = flag
+            tdcOk[ch] = True
+        col["seq"][i] = 2 * w + 2
+        self.head["write_seq"] = w + 1
+
+    def close(self):
+        shm = self.shm
+        _Ring.close(self)
+        if shm is not None:
+            shm.unlink()
+
+
+class RingReader(_Ring):
+    ''' One consumer of the ring, with its own cursor.
+    start: "latest" (only events written from now on) or "oldest" (all the events still in the ring)
+    Counters: nread, nlost (overwritten before being read), noverruns '''
+
+    def __init__(self, name=DefaultName, start="latest"):
+        shm = _attach(name)
+        head = np.ndarray((), dtype=HeaderDtype, buffer=shm.buf)
+        ok = head["magic"] == Magic and head["version"] == Version
+        del head
+        if not ok:
+            shm.close()
+            raise ValueError("%s is not an event ring (version %d)" % (name, Version))
+        self.name = name
+        self._map(shm)
+        w = self.writeSeq
+        self.cursor = w if start == "latest" else max(0, w - self.nslots)
+        self.nread = 0
+        self.nlost = 0
+        self.noverruns = 0
+
+    def lag(self):
+        '''Events written and not yet read'''
+        return self.writeSeq - self.cursor
+
+    def read(self, maxEvents=None):
+        '''EventBatch of the events written after the cursor (at most maxEvents); the events
+           overwritten while being copied are dropped and counted as lost'''
+        w = self.writeSeq
+        if w - self.cursor > self.nslots:
+            self.noverruns += 1
+            self.nlost += w - self.nslots - self.cursor
+            self.cursor = w - self.nslots
+        end = w if maxEvents is None else min(w, self.cursor + maxEvents)
+        if end <= self.cursor:
+            return EventBatch()
+        seqs = np.arange(self.cursor, end, dtype=np.uint64)
+        rows = self.slots[seqs % self.nslots].copy()
+        good = rows["seq"] == 2 * seqs + 2
+        # the slots must not have been overwritten during the copy
+        good &= self.slots["seq"][seqs % self.nslots] == 2 * seqs + 2
+        if not good.all():
+            self.nlost += int((~good).sum())
+            rows = rows[good]
+        self.cursor = end
+        out = EventBatch()
+        for c in Columns:
+            setattr(out, c, rows[c].astype(getattr(out, c).dtype))
+        self.nread += len(out)
+        return out
+
+    def follow(self, poll=0.1, maxEvents=None):
+        '''Generator of EventBatch, waiting for new events'''
+        while True:
+            b = self.read(maxEvents)
+            if len(b):
+                yield b
+            else:
+                time.sleep(poll)
+
+
+def Usage():
+    print("Usage: python shm_ring.py publish <runfile> [-f] [-n name] [-s nslots]")
+    print("       python shm_ring.py dump [-n name] [-o]")
+    print("   -f          Follow the run file while it is being written (plain files only)")
+    print("   -n name     Name of the shared memory block (def=%s)" % DefaultName)
+    print("   -s nslots   Number of events in the ring (def=%d)" % DefaultSlots)
+    print("   -o          Start from the oldest event in the ring (def=new events only)")
+    sys.exit(2)
+
+
+def publish_run(fname, name, nslots, follow):
+    import DREvent
+    import run_reader
+    if follow and run_reader.compression(fname):
+        # a compressed stream cannot be followed nor seeked back over a partial line
+        print("WARNING - %s is compressed: published up to its end, not followed" % fname)
+        follow = False
+    with RingWriter(name, nslots) as ring:
+        print("Publishing %s in ring %s (%d slots, %.1f MB)" % (fname, name, nslots, ring.shm.size / 1e6))
+        with run_reader.open_run(fname) as f:
+            try:
+                while True:
+                    raw = f.readline()
+                    if raw.endswith(b"\n") or (raw and not follow):
+                        ev = DREvent.DRdecode(raw.decode())
+                        if ev is not None:
+                            ring.publishEvent(ev)
+                    elif follow:
+                        if raw:
+                            f.seek(-len(raw), 1)  # line still being written
+                        time.sleep(0.2)
+                    else:
+                        break
+            except KeyboardInterrupt:
+                pass
+        print("%d events published" % ring.writeSeq)
+
+
+def dump_ring(name, start):
+    with RingReader(name, start) as ring:
+        try:
+            for b in ring.follow():
+                for i in range(len(b)):
+                    print("Event %d Spill %d Trig %d - %d ADCs %d TDCs" % (b.evtnumber[i], b.spillnumber[i], b.trigmask[i],
+                                                                         b.adc_ok[i].sum(), b.tdc_ok[i].sum()))
+                if ring.nlost:
+                    print("Lost %d events in %d overruns" % (ring.nlost, ring.noverruns))
+        except KeyboardInterrupt:
+            pass
+        print("%d events read, %d lost" % (ring.nread, ring.nlost))
+
+
+# Main: publish a run or dump the ring
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("publish", "dump"):
+        Usage()
+    try:
+        opts, args = getopt.gnu_getopt(sys.argv[2:], "fn:s:o")
+    except getopt.GetoptError:
+        Usage()
+    opts = dict(opts)
+    name = opts.get("-n", DefaultName)
+    if sys.argv[1] == "publish":
+        if len(args) != 1:
+            Usage()
+        publish_run(args[0], name, int(opts.get("-s", DefaultSlots)), "-f" in opts)
+    else:
+        dump_ring(name, "oldest" if "-o" in opts else "latest")
@@ -0,0 +1,213 @@
+# spills.py
+# Per-spill aggregation of the event stream, keyed by SpillNumber (python3 + numpy)
+
+import collections
+import numpy as np
+
+PhysTrigger = 0x1
+PedTrigger = 0x2
+
+
+class SpillSummary:
+    ''' Counters of one spill. Times are the event times in microseconds '''
+
+    logHead = "#spill   nphys    nped    noth   ndisc    nerr           tstart_us   dur_s  rate_Hz    meanS    meanC  weight"
+
+    def __init__(self, spill):
+        self.spill = spill
+        self.nphys = 0
+        self.nped = 0
+        self.noth = 0
+        self.ndisc = 0     # events discarded by the decoder
+        self.nerr = 0      # decoded events with (non fatal) decoding errors
+        self.tfirst = None
+        self.tlast = None
+        self.sumS = 0.     # S and C sums of the physics events
+        self.sumC = 0.
+        self.nE = 0
+        self.wsum = 0.     # sum of the sampling weights of the events (nevents if not sampled)
+
+    @property
+    def nevents(self):
+        return self.nphys + self.nped + self.noth
+
+    @property
+    def weight(self):
+        '''Mean sampling weight of the events of the spill'''
+        return self.wsum / self.nevents if self.nevents else 1.
+
+    @property
+    def duration(self):
+        '''Seconds between the first and the last event'''
+        if self.tfirst is None:
+            return 0.
+        return (self.tlast - self.tfirst) * 1e-6
+
+    @property
+    def rate(self):
+        '''Event rate in Hz (of the events represented by the sampled ones), 0 if it cannot be computed'''
+        d = self.duration
+        return (self.wsum - 1) / d if d > 0 else 0.
+
+    @property
+    def meanS(self):
+        return self.sumS / self.nE if self.nE else 0.
+
+    @property
+    def meanC(self):
+        return self.sumC / self.nE if self.nE else 0.
+
+    def addTimes(self, tmin, tmax):
+        if self.tfirst is None or tmin < self.tfirst:
+            self.tfirst = tmin
+        if self.tlast is None or tmax > self.tlast:
+            self.tlast = tmax
+
+    def line(self):
+        '''One line record for the spill log'''
+        return "%6d %7d %7d %7d %7d %7d %19d %7.2f %8.1f %8.1f %8.1f %7.2f" % (
+            self.spill, self.nphys, self.nped, self.noth, self.ndisc, self.nerr,
+            self.tfirst if self.tfirst is not None else -1, self.duration, self.rate, self.meanS, self.meanC,
+            self.weight)
+
+    def __str__(self):
+        return self.line()
+
+
+class SpillAggregator:
+    ''' Detect the spill boundaries from the SpillNumber of the events in stream order and
+    keep a SpillSummary for each spill. The last 'ring' completed spills are kept in memory,
+    every completed spill is appended to 'logfile' (if given).
+    Counts are of the events added; for sampled streams, the sampling weights give the
+    mean weight of each spill and the rate of the events they represent.
+    Discarded events of unknown spill go to the current spill; before the first spill they
+    are held in ndiscPending and counted in the first one.
+    add*() methods return the list of the spills completed by the call. '''
+
+    def __init__(self, ring=32, logfile=None, physTrigger=PhysTrigger, pedTrigger=PedTrigger):
+        self.spills = collections.deque(maxlen=ring)
+        self.current = None
+        self.logfile = logfile
+        self.physTrigger = physTrigger
+        self.pedTrigger = pedTrigger
+        self.nspills = 0  # completed spills
+        self.ndiscPending = 0  # discarded events of unknown spill seen before the first spill
+
+    def _start(self, spill):
+        closed = []
+        if self.current is not None and self.current.spill != spill:
+            closed = self.close()
+        if self.current is None:
+            self.current = SpillSummary(spill)
+            self.current.ndisc += self.ndiscPending
+            self.ndiscPending = 0
+        return closed
+
+    def close(self):
+        '''Complete the current spill (e.g. at the end of the run)'''
+        if self.current is None:
+            return []
+        s = self.current
+        self.current = None
+        self.spills.append(s)
+        self.nspills += 1
+        if self.logfile:
+            with open(self.logfile, "a") as f:
+                if f.tell() == 0:
+                    f.write(SpillSummary.logHead + "\n")
+                f.write(s.line() + "\n")
+        return [s]
+
+    def add(self, spill, evttime, trigmask, S=None, C=None, nerrors=0, weight=1.):
+        '''Add one decoded event'''
+        closed = self._start(spill)
+        s = self.current
+        s.wsum += weight
+        if trigmask == self.physTrigger:
+            s.nphys += 1
+            if S is not None:
+                s.sumS += S
+                s.sumC += C
+                s.nE += 1
+        elif trigmask == self.pedTrigger:
+            s.nped += 1
+        else:
+            s.noth += 1
+        if nerrors:
+            s.nerr += 1
+        s.addTimes(evttime, evttime)
+        return closed
+
+    def addEvent(self, ev, S=None, C=None, nerrors=0, weight=1.):
+        '''Add a DREvent'''
+        return self.add(ev.SpillNumber, ev.EventTime, ev.TriggerMask, S, C, nerrors, weight)
+
+    def addDiscarded(self, spill=None):
+        '''Count an event discarded by the decoder, in the current spill if its spill is unknown'''
+        closed = self._start(spill) if spill is not None else []
+        if self.current is None:
+            self.ndiscPending += 1
+            return closed
+        self.current.ndisc += 1
+        return closed
+
+    def addBatch(self, batch, energy=None, nerrors=None):
+        '''Add an EventBatch; energy: optional CalibratedBatch of the same events,
+           nerrors: optional (N,) array, non zero for events with decoding errors'''
+        closed = []
+        n = len(batch)
+        if n == 0:
+            return closed
+        sp = batch.spillnumber
+        starts = np.flatnonzero(np.r_[True, sp[1:] != sp[:-1]])
+        ends = np.r_[starts[1:], n]
+        for a, b in zip(starts, ends):
+            closed += self._start(int(sp[a]))
+            s = self.current
+            trig = batch.trigmask[a:b]
+            phys = trig == self.physTrigger
+            ped = trig == self.pedTrigger
+            s.nphys += int(phys.sum())
+            s.nped += int(ped.sum())
+            s.noth += int((b - a) - phys.sum() - ped.sum())
+            s.wsum += float(batch.weight[a:b].sum())
+            if energy is not None:
+                withE = phys & batch.adc_ok[a:b].any(axis=1)  # header-only rows have no energy
+                s.sumS += float(energy.S[a:b][withE].sum())
+                s.sumC += float(energy.C[a:b][withE].sum())
+                s.nE += int(withE.sum())
+            if nerrors is not None:
+                s.nerr += int(np.count_nonzero(nerrors[a:b]))
+            t = batch.evttime[a:b]
+            s.addTimes(int(t.min()), int(t.max()))
+        return closed
+
+    def state(self):
+        '''json-able copy of the ring and of the current spill'''
+        return {"spills": [dict(s.__dict__) for s in self.spills], "nspills": self.nspills,
+                "ndiscPending": self.ndiscPending,
+                "current": dict(self.current.__dict__) if self.current is not None else None}
+
+    def restore(self, state):
+        '''Restore a state() copy'''
+        def summary(d):
+            s = SpillSummary(d["spill"])
+            s.__dict__.update(d)
+            return s
+        self.spills.clear()
+        self.spills.extend(summary(d) for d in state["spills"])
+        self.nspills = state["nspills"]
+        self.ndiscPending = state.get("ndiscPending", 0)
+        self.current = summary(state["current"]) if state["current"] else None
+
+    def recent(self, n=5):
+        '''Last n completed spills, plus the current one'''
+        out = list(self.spills)[-n:]
+        if self.current is not None:
+            out.append(self.current)
+        return out
+
+    def dump(self, n=5):
+        print(SpillSummary.logHead)
+        for s in self.recent(n):
+            print(s.line())
@@ -0,0 +1,79 @@
+# conftest.py
+# pytest setup: the modules are at the top of the repository, the run files in test/
+
+import os
+import sys
+import pytest
+
+TestDir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TestDir))
+
+Run2025 = os.path.join(TestDir, "2025dataformat_500evt.txt")
+
+
+@pytest.fixture(scope="session")
+def run2025():
+    '''Path of the 500-event 2025 run'''
+    return Run2025
+
+
+@pytest.fixture(scope="session")
+def events2025(run2025):
+    '''DREvents of the 2025 run (None for discarded events), decoded line by line'''
+    import DREvent
+    with open(run2025) as f:
+        return [DREvent.DRdecode(line) for line in f]
+
+
+@pytest.fixture(scope="session")
+def batch2025(events2025):
+    '''EventBatch of the 2025 run'''
+    from event_batch import batch_from_events
+    return batch_from_events(ev for ev in events2025 if ev is not None)
+
+
+def modules(words):
+    '''(crate, cratetype, header, trailer) word positions of the modules of a 2025 event'''
+    import decode_utils as bob
+    _, head = bob.parse_evt_header(words[:14])
+    out, i = [], 14
+    while i < 14 + head["payloadsize"]:
+        v, w = bob.parse_head(words[i])
+        if v:
+            break
+        out.append((w["c"], w["t"], i, i + w["n"] + 1))
+        i += w["n"] + 2
+    return out
+
+
+Corruptions = ("dup", "type", "trailer", "marker", "nothex")
+
+
+def corrupt(line, kind, module=0):
+    '''Line of a 2025 event with one corruption in module number 'module':
+       dup: first data word repeated over the second (duplicate channel, 111/112)
+       type: module header with an unknown module type (99)
+       trailer: module trailer overwritten by a data word (2)
+       marker: marker bits of the first data word set (channel error 20-53)
+       nothex: a data word replaced by a token that is not hex'''
+    words = line.split()
+    crate, ctype, head, trail = modules([int(w, 16) for w in words])[module]
+    if kind == "dup":
+        words[head + 2] = words[head + 1]
+    elif kind == "type":
+        words[head] = "%x" % (int(words[head], 16) & ~(0xF << 20) | (0b1111 << 20))
+    elif kind == "trailer":
+        words[trail] = words[head + 1]
+    elif kind == "marker":
+        words[head + 1] = "%x" % (int(words[head + 1], 16) | (1 << 24))
+    elif kind == "nothex":
+        words[head + 1] = "zz%s" % words[head + 1][2:]
+    else:
+        raise ValueError(kind)
+    return " ".join(words) + "\n"
+
+
+@pytest.fixture(scope="session")
+def lines2025(run2025):
+    with open(run2025) as f:
+        return f.readlines()
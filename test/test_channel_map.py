@@ -0,0 +1,53 @@
+import os
+import numpy as np
+import DREvent
+from calibration import load_channel_map
+from channel_map import PhysMap
+from event_batch import NumAdcChannels
+
+Top = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MapADC = os.path.join(Top, "channels2025adc.json")
+MapTDC = os.path.join(Top, "channels2025tdc.json")
+
+
+def test_scatter_same_as_dict_lookup(events2025):
+    pmap = PhysMap.fromJson(MapADC, MapTDC)
+    mapadc = load_channel_map(MapADC)
+    events = [ev for ev in events2025 if ev is not None]
+    for ev in events:
+        phys = pmap.scatter(ev.ADCs, ev.TDCs)
+        for addr, entry in mapadc.items():
+            assert phys.get(entry["phys"]) == ev.ADCs.get(addr)
+        assert not phys.tdc_ok.any()   # the test run has no TDC data
+    # 192 ADC values per event, 52 of them at addresses not in the 140-entry map
+    assert len(pmap.adc) == 140 and len(events[0].ADCs) == 192
+    assert pmap.counters()["adc"] == {"nchannels": 140, "nunmapped": 52 * len(events), "nmissing": 0}
+    assert pmap.counters()["tdc"]["nmissing"] == 14 * len(events)
+
+
+def test_scatter_batch_same_as_scatter(events2025, batch2025):
+    pmap, ref = PhysMap.fromJson(MapADC, MapTDC), PhysMap.fromJson(MapADC, MapTDC)
+    phys = pmap.scatterBatch(batch2025)
+    events = [ev for ev in events2025 if ev is not None]
+    for i, ev in enumerate(events):
+        one = ref.scatter(ev.ADCs, ev.TDCs)
+        np.testing.assert_array_equal(phys.adc_ok[i], one.adc_ok)
+        np.testing.assert_array_equal(phys.adc[i][one.adc_ok], one.adc[one.adc_ok])
+        np.testing.assert_array_equal(phys.towerS[i], one.towerS)
+        np.testing.assert_array_equal(phys.towerC[i], one.towerC)
+    assert pmap.counters() == ref.counters()
+    assert phys.get("preshower").tolist() == [ev.ADCs[31] for ev in events]
+
+
+def test_missing_and_unmapped_hand_made():
+    pmap = PhysMap.fromJson(MapADC, MapTDC)
+    # 105-S at 0, preshower at 31; 95 is not mapped, NumAdcChannels + 3 is out of range
+    phys = pmap.scatter({0: 11, 95: 12, NumAdcChannels + 3: 13}, {0: (500, 0), 1: (510, 1)})
+    assert phys.get("105-S") == 11 and phys.get("preshower") is None
+    assert phys.tower("105")[0] == 11
+    assert phys.get("dwc1-l", "tdc") == 500 and phys.tdcflag[pmap.tdc.col("dwc1-r")] == 1
+    assert phys.get("dwc2-l", "tdc") is None
+    assert pmap.counters() == {"adc": {"nchannels": 140, "nunmapped": 2, "nmissing": 139},
+                               "tdc": {"nchannels": 14, "nunmapped": 0, "nmissing": 12}}
+    pmap.scatter({}, {})
+    assert pmap.adc.nmissing == 139 + 140 and pmap.tdc.nmissing == 12 + 14
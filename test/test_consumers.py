@@ -0,0 +1,47 @@
+import time
+import pytest
+import consumers
+from consumers import Consumer
+
+
+class SlowConsumer(Consumer):
+    def __init__(self, **kw):
+        super().__init__(**kw)
+        self.seen = []
+
+    def process(self, line, ev, fraction):
+        time.sleep(0.001)
+        self.seen.append(line)
+
+
+@pytest.mark.parametrize("policy", [consumers.DropOldest, consumers.Sample])
+def test_lossy_policies_never_block(policy):
+    c = SlowConsumer(maxQueue=10, policy=policy)
+    c.start()
+    t0 = time.time()
+    for i in range(500):
+        c.offer((i, None, 1.))
+    assert time.time() - t0 < 0.3   # the reader is not held back by the slow consumer
+    c.stop()
+    assert c.ndropped > 0
+    assert c.nprocessed + c.ndropped == c.noffered == 500
+    if policy == consumers.DropOldest:
+        assert c.seen[-1] == 499   # the freshest item is kept
+
+
+def test_block_sees_every_item():
+    c = SlowConsumer(maxQueue=10, policy=consumers.Block, blockTimeout=5.)
+    c.start()
+    for i in range(100):
+        c.offer((i, None, 1.))
+    c.stop()
+    assert c.seen == list(range(100))
+    assert c.ndropped == 0
+
+
+def test_spill_consumer_policy(tmp_path):
+    pytest.importorskip("watchdog")
+    import watch_daq
+    assert watch_daq.SpillConsumer(logfile=str(tmp_path / "s.txt")).policy == consumers.DropOldest
+    replay = watch_daq.SpillConsumer(logfile=str(tmp_path / "s.txt"), policy=consumers.Block)
+    assert replay.policy == consumers.Block
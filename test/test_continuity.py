@@ -0,0 +1,68 @@
+import json
+from continuity import ContinuityChecker
+
+
+def check(events):
+    cc = ContinuityChecker()
+    for ev in events:
+        cc.addEvent(ev)
+    return cc
+
+
+def test_clean_run(events2025):
+    cc = check(events2025)
+    assert cc.ok()
+    assert cc.nevents == 500
+    assert (cc.first, cc.last) == (events2025[0].EventNumber, events2025[-1].EventNumber)
+    assert len(cc.offsets) == len(events2025[0].ModCounters)
+
+
+def test_gaps_and_duplicates(events2025):
+    dropped = set(range(10, 15)) | {100} | set(range(300, 320))
+    stream = [ev for i, ev in enumerate(events2025) if i not in dropped]
+    stream[200:200] = events2025[150:153]   # replayed events
+    stream.append(events2025[-1])
+    cc = check(stream)
+    evt = [ev.EventNumber for ev in events2025]
+    assert cc.missing == [[evt[10], evt[14]], [evt[100], evt[100]], [evt[300], evt[319]]]
+    assert cc.duplicates == [[evt[150], evt[152]], [evt[-1], evt[-1]]]
+    assert cc.nmissing == 26 and cc.nduplicates == 4
+    assert cc.noutoforder == 3
+    assert not cc.ok()
+
+
+def test_late_events_fill_gaps(events2025):
+    stream = events2025[:50] + events2025[60:100] + [events2025[55], events2025[50], events2025[59]]
+    cc = check(stream)
+    evt = [ev.EventNumber for ev in events2025]
+    assert cc.missing == [[evt[51], evt[54]], [evt[56], evt[58]]]
+    assert cc.nduplicates == 0
+    assert cc.noutoforder == 3
+
+
+def test_module_counters(events2025):
+    cc = ContinuityChecker()
+    for i, ev in enumerate(events2025[:100]):
+        mods = list(ev.ModCounters)
+        if i == 40:   # one module one event behind
+            crate, ctype, c = mods[1]
+            mods[1] = (crate, ctype, c - 1)
+        cc.add(ev.EventNumber, mods)
+    assert cc.ndesync == 1
+    assert list(cc.desynced) == [events2025[40].EventNumber]
+    assert cc.njumps == 2   # offset changed at event 40 and back at 41
+
+
+def test_batch_and_state(events2025, batch2025):
+    ref = check(events2025[:200] + events2025[210:])
+    cc = ContinuityChecker()
+    evt = batch2025.evtnumber
+    cc.addBatch(evt[:150])
+    saved = json.loads(json.dumps(cc.state()))
+    cc = ContinuityChecker()
+    cc.restore(saved)
+    cc.addBatch(evt[150:200])
+    cc.addBatch(evt[210:])
+    assert cc.missing == ref.missing
+    assert cc.nevents == ref.nevents
+    assert (cc.first, cc.last) == (ref.first, ref.last)
@@ -0,0 +1,89 @@
+import os
+import numpy as np
+import pytest
+import dwc
+from calibration import load_channel_map
+from event_batch import NumTdcChannels
+
+MapTDC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "channels2025tdc.json")
+
+
+def rows(events):
+    '''TDC matrices of hand-made events, each a dict channel: (value, flag)'''
+    n = len(events)
+    tdc = np.zeros((n, NumTdcChannels), dtype=np.int32)
+    flag = np.zeros((n, NumTdcChannels), dtype=np.int8)
+    ok = np.zeros((n, NumTdcChannels), dtype=bool)
+    for i, ev in enumerate(events):
+        for ch, (v, f) in ev.items():
+            tdc[i, ch], flag[i, ch], ok[i, ch] = v, f, True
+    return tdc, flag, ok
+
+
+def full(values, flags=None):
+    return dict((ch, (v, (flags or {}).get(ch, 0))) for ch, v in enumerate(values))
+
+
+Events = [
+    full([100, 40, 70, 90, 500, 500, 510, 490]),           # known positions
+    dict((ch, v) for ch, v in full([100, 40, 70, 90, 500, 500, 510, 490]).items() if ch != 1),  # right missing
+    full([100, 40, 70, 90, 500, 500, 510, 490], {2: 1}),   # overflow on up
+    full([4000, 0, 70, 90, 500, 500, 510, 490]),           # x outside the acceptance
+    {},                                                     # no DWC channel
+]
+
+
+def test_known_positions_and_flags():
+    setup = dwc.DwcSetup([dwc.DwcChamber(0, 1, 2, 3, offX=1.5, offY=-2.), dwc.DwcChamber(4, 5, 6, 7)])
+    res = dwc.reconstruct(*rows(Events), setup=setup)
+    s = setup.chambers[0].slopeX
+    assert res.x[0].tolist() == [60, 0] and res.y[0].tolist() == [-20, 20]
+    assert res.x_mm[0, 0] == pytest.approx(60 * s + 1.5) and res.y_mm[0, 0] == pytest.approx(-20 * s - 2.)
+    assert res.lr[0, 0].tolist() == [100, 40] and res.ud[0, 1].tolist() == [510, 490]
+    assert res.quality[0].tolist() == [dwc.DwcOk, dwc.DwcOk]
+    assert res.quality[1].tolist() == [dwc.DwcMissX, dwc.DwcOk]
+    assert not res.okX[1, 0] and res.x[1, 0] == 0 and res.okY[1, 0]
+    assert res.quality[2].tolist() == [dwc.DwcFlagged, dwc.DwcOk]
+    assert res.quality[3].tolist() == [dwc.DwcOutside, dwc.DwcOk]
+    assert res.quality[4].tolist() == [dwc.DwcMissX | dwc.DwcMissY] * 2
+    # a flag on a missing channel does not count
+    tdc, flag, ok = rows([Events[1]])
+    flag[0, 1] = 1
+    assert dwc.reconstruct(tdc, flag, ok, setup).quality[0, 0] == dwc.DwcMissX
+
+
+def test_event_same_as_batch_hand_made():
+    setup = dwc.DwcSetup()
+    res = dwc.reconstruct(*rows(Events), setup=setup)
+    for i, ev in enumerate(Events):
+        for c, (x, y, x_mm, y_mm, q) in enumerate(setup.reconstructEvent(ev)):
+            assert q == res.quality[i, c]
+            assert (x is not None) == res.okX[i, c] and (y is not None) == res.okY[i, c]
+            if x is not None:
+                assert x == res.x[i, c] and x_mm == pytest.approx(res.x_mm[i, c])
+            if y is not None:
+                assert y == res.y[i, c] and y_mm == pytest.approx(res.y_mm[i, c])
+
+
+def test_event_same_as_batch_random():
+    # the TDC of the 2025 test run has no data words: random rows instead
+    rng = np.random.default_rng(29)
+    events = []
+    for _ in range(300):
+        present = rng.random(8) < 0.85
+        events.append(dict((ch, (int(rng.integers(0, 4096)), int(rng.random() < 0.05)))
+                           for ch in range(8) if present[ch]))
+    setup = dwc.DwcSetup.fromMap(load_channel_map(MapTDC), {2: {"offX": 3., "slopeY": 0.1, "halfSize": 40.}})
+    assert setup.chambers[1].offX == 3. and setup.chambers[1].slopeY == 0.1
+    res = dwc.reconstruct(*rows(events), setup=setup)
+    for i, ev in enumerate(events):
+        for c, (x, y, x_mm, y_mm, q) in enumerate(setup.reconstructEvent(ev)):
+            assert q == res.quality[i, c]
+            assert (x if x is not None else 0) == res.x[i, c]
+            assert (y if y is not None else 0) == res.y[i, c]
+            if x is not None:
+                assert x_mm == pytest.approx(res.x_mm[i, c])
+            if y is not None:
+                assert y_mm == pytest.approx(res.y_mm[i, c])
+    q = res.quality
+    assert all((q & f).any() for f in (dwc.DwcMissX, dwc.DwcMissY, dwc.DwcFlagged, dwc.DwcOutside))
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+import DREvent
+import decode_utils as bob
+from conftest import corrupt, modules
+from error_store import ErrorStore, LookupSuffix
+
+
+def scan(rows, code=None, spill=None):
+    '''Reference selection: mask over all the index rows'''
+    keep = np.ones(len(rows), dtype=bool)
+    if code is not None:
+        keep &= (rows["errors"] & np.uint64(bob.DecErrBit[code])) != 0
+    if spill is not None:
+        keep &= rows["spillnumber"] == spill
+    return np.flatnonzero(keep)
+
+
+def fill(store, lines, kinds=("dup", "type", "trailer", "marker")):
+    for i, line in enumerate(lines):
+        store.line = i
+        nmod = len(modules([int(w, 16) for w in line.split()]))
+        DREvent.DRdecode(corrupt(line, kinds[i % len(kinds)], i % (nmod - 1)), dumperror=store)
+
+
+def test_lookup_matches_scan(tmp_path, lines2025):
+    path = str(tmp_path / "err")
+    with ErrorStore(path) as store:
+        fill(store, lines2025[:200])
+    assert (tmp_path / ("err" + LookupSuffix)).exists()
+    # records appended after the lookup table was written
+    with ErrorStore(path) as store:
+        fill(store, lines2025[200:260])
+    (tmp_path / ("err" + LookupSuffix)).unlink()
+    with ErrorStore(path) as store:
+        store.writeLookup()
+        fill(store, lines2025[260:300])
+        reader = ErrorStore(path, "r")
+        rows = reader.index()
+        assert len(rows) == 300
+        assert reader._lookup(len(rows))["nrecords"] == 260
+        codes, spills = reader.counts(rows)
+        assert set(codes) >= {111, 99, 2, 20}
+        for code in list(codes) + [None]:
+            for spill in list(spills)[:3] + [None, 10 ** 6]:
+                got = reader.select(code, spill, rows=rows)
+                np.testing.assert_array_equal(got, scan(rows, code, spill))
+        evt = rows["evtnumber"]
+        sel = reader.select(111, first=evt[50], last=evt[150])
+        ref = scan(rows, 111)
+        np.testing.assert_array_equal(sel, ref[(evt[ref] >= evt[50]) & (evt[ref] <= evt[150])])
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_not_hex_tokens_flagged(tmp_path, lines2025, lazy):
+    path = str(tmp_path / "err")
+    line = corrupt(lines2025[0], "nothex")
+    with ErrorStore(path) as store:
+        ev = DREvent.DRdecode(line, dumperror=store, lazy=lazy)
+        assert ev is None or (ev.ADCs == {} and ev.Discarded)
+        ev = DREvent.DRdecode(corrupt(lines2025[1], "dup"), dumperror=store, lazy=lazy)
+        assert ev is None or (ev.ADCs == {} and ev.Discarded)
+    reader = ErrorStore(path, "r")
+    rows = reader.index()
+    assert rows["nbad"].tolist() == [1, 0]
+    assert rows["evtnumber"][0] == DREvent.DRdecode(lines2025[0]).EventNumber
+    assert bob.mask_codes(int(rows["errors"][0])) == [1000]
+    assert reader.select(1000).tolist() == [0]
+    words = reader.words(0)
+    assert len(words) == len(line.split())
+    assert words[15] == 0
+    assert "1 tokens not hex" in reader.text(0)
+
+
+def test_watch_daq_closes_store(tmp_path, monkeypatch, lines2025):
+    watch_daq = pytest.importorskip("watch_daq")
+    monkeypatch.chdir(tmp_path)
+    run = tmp_path / "run1.txt"
+    run.write_text("".join(corrupt(l, "dup") for l in lines2025[:20]))
+    tailer = watch_daq.FileTailer(str(run), [])
+    tailer.start()
+    tailer.stop()
+    assert not tailer.is_alive()
+    assert tailer.errors.fdat is None
+    assert tailer.errors.nrecords == 20
+    assert (tmp_path / ("run1" + watch_daq.DecErrorSuffix + LookupSuffix)).exists()
+
+
+def test_watch_daq_survives_not_hex(tmp_path, monkeypatch, lines2025):
+    watch_daq = pytest.importorskip("watch_daq")
+    monkeypatch.chdir(tmp_path)
+    run = tmp_path / "run2.txt"
+    run.write_text("".join(corrupt(l, "nothex") if i % 2 else l for i, l in enumerate(lines2025[:20])))
+    tailer = watch_daq.FileTailer(str(run), [])
+    tailer.start()
+    tailer.stop()
+    assert tailer.ndecoded == 20   # the tailer read past the bad lines
+    assert tailer.errors.nrecords == 10
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from calibration import Calibration, load_channel_map, tower_of
+from event_batch import BatchBuilder, batch_from_events, concat_batches
+
+
+@pytest.fixture(scope="module")
+def mapadc(run2025):
+    import os
+    return load_channel_map(os.path.join(os.path.dirname(os.path.dirname(run2025)), "channels2025adc.json"))
+
+
+def test_batch_rows_match_events(events2025, batch2025):
+    events = [ev for ev in events2025 if ev is not None]
+    assert len(batch2025) == len(events) == 500
+    for i, ev in enumerate(events):
+        assert batch2025.evtnumber[i] == ev.EventNumber
+        assert batch2025.spillnumber[i] == ev.SpillNumber
+        assert batch2025.trigmask[i] == ev.TriggerMask
+        assert batch2025.errors[i] == ev.ErrorMask
+        assert dict(zip(np.flatnonzero(batch2025.adc_ok[i]).tolist(),
+                        batch2025.adc[i][batch2025.adc_ok[i]].tolist())) == ev.ADCs
+        assert dict((ch, (int(batch2025.tdc[i, ch]), int(batch2025.tdcflag[i, ch])))
+                    for ch in np.flatnonzero(batch2025.tdc_ok[i])) == ev.TDCs
+
+
+def test_builder_chunks_concat(events2025, batch2025):
+    events = [ev for ev in events2025 if ev is not None]
+    builder = BatchBuilder(64)
+    chunks = []
+    for ev in events:
+        builder.appendEvent(ev)
+        if builder.full():
+            chunks.append(builder.flush())
+    chunks.append(builder.flush())
+    assert [len(c) for c in chunks[:-1]] == [64] * (len(events) // 64)
+    out = concat_batches(chunks)
+    for c in batch2025.columns():
+        np.testing.assert_array_equal(getattr(out, c), getattr(batch2025, c))
+
+
+def test_calibrate_batch_matches_per_event(events2025, batch2025, mapadc):
+    calib = Calibration(mapadc)
+    energy = calib.calibrate(batch2025)
+    assert (energy.S > 0).any() and (energy.C > 0).any()
+    events = [ev for ev in events2025 if ev is not None]
+    for i, ev in enumerate(events):
+        tw = dict((t, [0., 0.]) for t in calib.towers)
+        for ch, val in ev.ADCs.items():
+            entry = mapadc.get(ch)
+            t = tower_of(entry["phys"]) if entry else None
+            sig = val - entry.get("pedestal", 0) if t else 0
+            if t and sig > entry.get("monthreshold", 0):
+                tw[t[0]][t[1] == "C"] += sig * entry.get("gain", 1.)
+        assert energy.towerS[i] == pytest.approx([tw[t][0] for t in calib.towers])
+        assert energy.towerC[i] == pytest.approx([tw[t][1] for t in calib.towers])
+        assert energy.S[i] == pytest.approx(sum(s for s, _ in tw.values()))
+    sel = batch2025.trigmask == 1
+    np.testing.assert_allclose(calib.calibrate(batch2025.select(sel)).S, energy.select(sel).S)
@@ -0,0 +1,54 @@
+import DREvent
+from conftest import corrupt
+
+Members = DREvent.SlotDREvent.__slots__
+
+
+def same(ev, ref):
+    return all(getattr(ev, k) == getattr(ref, k) for k in Members)
+
+
+def test_pooled_same_as_eager(lines2025):
+    pool = DREvent.EventPool(maxFree=2)
+    for line in lines2025:
+        ev = DREvent.DRdecode(line, pool=pool)
+        assert type(ev) is DREvent.SlotDREvent
+        assert same(ev, DREvent.DRdecode(line))
+        pool.release(ev)
+    assert pool.ncreated == 1 and pool.nreused == len(lines2025) - 1
+
+
+def test_reused_slot_carries_nothing_over(lines2025):
+    pool = DREvent.EventPool()
+    ev = DREvent.DRdecode(lines2025[0], pool=pool)
+    for k in Members:   # everything a consumer could leave behind
+        setattr(ev, k, "stale")
+    pool.release(ev)
+    # errors that do not discard the event, then a clean line
+    masks = []
+    for line in (corrupt(lines2025[1], "marker"), lines2025[2]):
+        ref = DREvent.DRdecode(line, verbose=-1)
+        got = DREvent.DRdecode(line, pool=pool)
+        assert got is ev and same(got, ref)
+        masks.append(got.ErrorMask)
+        pool.release(got)
+    assert masks[0] != 0 and masks[1] == 0 and not ev.HeaderOnly
+
+
+def test_discarded_line_takes_no_slot(lines2025):
+    pool = DREvent.EventPool()
+    assert DREvent.DRdecode(corrupt(lines2025[0], "dup"), pool=pool) is None
+    assert pool.ncreated == 0 and pool.nreused == 0
+
+
+def test_channel_accessors(lines2025):
+    pool = DREvent.EventPool()
+    ref = DREvent.DRdecode(lines2025[3])
+    ev = DREvent.DRdecode(lines2025[3], pool=pool)
+    assert ref.ADCs
+    for ch in ref.ADCs:
+        assert ev.getAdcChannel(ch) == ref.getAdcChannel(ch)
+    assert str(ev) == str(ref) and ev.headLine() == ref.headLine()
+    assert ev.errorCodes() == ref.errorCodes()
+    ev.TDCs = {5: (123, 0)}   # the test run has no TDC data
+    assert ev.getTdcChannel(5) == (123, 0)
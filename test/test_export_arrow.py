@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+from conftest import corrupt
+
+pa = pytest.importorskip("pyarrow")
+import DREvent
+import export_arrow
+from event_batch import BatchBuilder, concat_batches, NumAdcChannels, NumTdcChannels
+
+
+def read_back(path, fmt):
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        return pq.read_table(str(path))
+    with pa.OSFile(str(path), "rb") as f:
+        return pa.ipc.open_stream(f).read_all()
+
+
+def column(table, name):
+    '''Values (0 where null) and validity of a column'''
+    col = table.column(name).combine_chunks()
+    valid = ~np.asarray(col.is_null())
+    return np.asarray(col.fill_null(0)), valid
+
+
+# hand-made event with missing ADC channels and TDC data (the test run has none)
+Sparse = (99999, 7, 123, 1, {0: 5, 40: 4095}, {3: (100, 1), 31: (7, 0)})
+
+
+@pytest.mark.parametrize("fmt", export_arrow.Formats)
+def test_round_trip(tmp_path, lines2025, events2025, batch2025, fmt):
+    # a discarded event (duplicate channel) and one with non-fatal errors
+    extra = [corrupt(lines2025[0], "dup"), corrupt(lines2025[1], "marker")]
+    path = tmp_path / ("run." + fmt)
+    with export_arrow.ArrowExporter(str(path), fmt, rowGroupSize=128) as ex:
+        for line in lines2025 + extra:
+            ex.addLine(line)
+        ex.add(*Sparse)
+    assert ex.nwritten == len(batch2025) + 2 and ex.ndiscarded == 1
+
+    bb = BatchBuilder(2)
+    bb.appendEvent(DREvent.DRdecode(extra[1], verbose=-1))
+    bb.append(*Sparse)
+    ref = concat_batches([batch2025, bb.flush()])
+    assert ref.errors[-2] != 0
+    table = read_back(path, fmt)
+    assert table.schema == export_arrow.make_schema()
+    assert table.num_rows == len(ref)
+    for name in ("evtnumber", "spillnumber", "evttime", "trigmask", "errors"):
+        np.testing.assert_array_equal(column(table, name)[0], getattr(ref, name))
+    for kind, ok, n in (("adc", ref.adc_ok, NumAdcChannels), ("tdc", ref.tdc_ok, NumTdcChannels),
+                        ("tdcflag", ref.tdc_ok, NumTdcChannels)):
+        for ch in range(n):
+            vals, valid = column(table, "%s_%03d" % (kind, ch))
+            np.testing.assert_array_equal(valid, ok[:, ch])
+            np.testing.assert_array_equal(vals, np.where(ok[:, ch], getattr(ref, kind)[:, ch], 0))
+    assert table.column("adc_001").null_count == 1 and table.column("tdc_003").null_count == len(ref) - 1
+
+
+def test_keep_discarded(tmp_path, lines2025):
+    path = tmp_path / "run.parquet"
+    with export_arrow.ArrowExporter(str(path), keepDiscarded=True) as ex:
+        ex.addLine(corrupt(lines2025[0], "dup"))
+        ex.addLine("not an event\n")   # no header: never exported
+    assert ex.nwritten == 1 and ex.ndiscarded == 1
+    assert column(read_back(path, "parquet"), "errors")[0][0] != 0
+
+
+def test_calibrated_sums(tmp_path, batch2025):
+    import os
+    from calibration import Calibration
+    calib = Calibration.fromJson(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                              "channels2025adc.json"))
+    path = tmp_path / "run.arrows"
+    with export_arrow.ArrowExporter(str(path), "ipc", calib=calib) as ex:
+        ex.addBatch(batch2025)
+    table = read_back(path, "ipc")
+    np.testing.assert_allclose(column(table, "S")[0], calib.calibrate(batch2025).S)
+    np.testing.assert_allclose(column(table, "C")[0], calib.calibrate(batch2025).C)
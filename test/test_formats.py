@@ -0,0 +1,53 @@
+import pytest
+import DREvent
+import formats
+
+
+def test_format_is_abstract():
+    with pytest.raises(TypeError):
+        formats.Format()
+
+    class NoDecoder(formats.Format):
+        name = "nodecoder"
+
+        def sniff(self, line):
+            return False
+
+    with pytest.raises(TypeError):
+        NoDecoder()
+
+
+def test_custom_format_registered_first(tmp_path, lines2025):
+    class Tagged(formats.Format):
+        '''2025 lines behind a "#tag " prefix'''
+        name = "tagged"
+        years = (2099,)
+
+        def sniff(self, line):
+            return line.startswith(b"#tag ")
+
+        def decoder(self, **kw):
+            return lambda line: DREvent.DRdecode25(line[5:], -1, None)
+
+    path = tmp_path / "run.txt"
+    path.write_text("".join("#tag " + line for line in lines2025[:20]))
+    fmt = formats.register(Tagged(), first=True)
+    try:
+        assert list(formats.Registry)[0] == "tagged" and formats.get(2099) is fmt
+        assert formats.detect(str(path)) is fmt
+        events = list(formats.iter_events(str(path)))
+        assert [ev.EventNumber for ev in events] == [DREvent.DRdecode(l).EventNumber for l in lines2025[:20]]
+        assert sum(len(b) for b in formats.iter_batches(str(path), size=8)) == 20
+    finally:
+        del formats.Registry["tagged"]
+    with pytest.raises(ValueError):
+        formats.detect(str(path))
+
+
+def test_builtin_formats(run2025):
+    fmt = formats.detect(run2025)
+    assert fmt is formats.get("2025") is formats.get(2025)
+    assert formats.sniff("Event Number 1 Trigger Mask 0 :") is formats.get(2024)
+    assert formats.sniff("not an event") is None
+    with pytest.raises(KeyError):
+        formats.get(1999)
@@ -0,0 +1,56 @@
+import gzip
+import io
+import numpy as np
+import pytest
+import decode_utils as bob
+import hex_words
+from conftest import corrupt
+
+
+def text_words(line):
+    return [int(w, 16) for w in line.split()]
+
+
+def test_chunk_words_same_as_text(lines2025):
+    buf = "".join(lines2025).encode()
+    words, first, ok = hex_words.chunk_words(buf)
+    assert ok.all()
+    assert len(first) == len(lines2025) + 1
+    for i, line in enumerate(lines2025):
+        assert words[first[i]:first[i + 1]].tolist() == text_words(line)
+
+
+@pytest.mark.parametrize("size", [997, 1 << 16, hex_words.ChunkSize])
+def test_stream_chunk_sizes(run2025, lines2025, size):
+    with open(run2025, "rb") as f:
+        got = list(hex_words.words_of_stream(f, size))
+    assert len(got) == len(lines2025)
+    assert all(w.tolist() == text_words(l) for w, l in zip(got, lines2025))
+
+
+def test_compressed_run(tmp_path, run2025, lines2025):
+    path = tmp_path / "run.txt.gz"
+    with open(run2025, "rb") as f, gzip.open(path, "wb") as g:
+        g.write(f.read())
+    got = list(hex_words.iter_words(str(path), threads=1))
+    assert [w.tolist() for w in got] == [text_words(l) for l in lines2025]
+
+
+def test_decode_words_same_as_text(lines2025):
+    lines = lines2025[::5] + [corrupt(l, k, 1) for l in lines2025[:40] for k in ("dup", "type", "trailer", "marker")]
+    buf = "".join(lines).encode()
+    for words, line in zip(hex_words.words_of_stream(io.BytesIO(buf)), lines):
+        assert bob.decodeblock(words) == bob.decodeblock(line)
+
+
+def test_lines_not_converted_in_bulk():
+    lines = [b"ccaaffee 1 2 3", b"CCAAFFEE\t1 A\r", b"ccaaffee 123456789 2", b"ccaaffee zz 2", b"f 0 00000001", b"", b"1 2"]
+    got = list(hex_words.words_of_stream(io.BytesIO(b"\n".join(lines)), 7))   # last line without newline
+    assert got[0].tolist() == [0xccaaffee, 1, 2, 3]
+    assert got[1].tolist() == [0xccaaffee, 1, 0xa]
+    assert got[2] == "ccaaffee 123456789 2"   # word longer than 32 bits: text path
+    assert got[3] == "ccaaffee zz 2"
+    assert got[4].tolist() == [0xf, 0, 1]
+    assert got[5].tolist() == []
+    assert got[6].tolist() == [1, 2]
+    assert hex_words.words_to_line(np.array([0xccaaffee, 1], dtype=np.uint32)) == "ccaaffee 1"
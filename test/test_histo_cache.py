@@ -0,0 +1,59 @@
+import gzip
+import os
+import pytest
+
+ROOT = pytest.importorskip("ROOT")
+import histo_cache
+
+
+def histos(tag):
+    h = ROOT.TH1I("h_%s" % tag, "h", 10, 0, 10)
+    return {"h": h}
+
+
+def save(tmp_path, run, offset, **state):
+    cache = histo_cache.HistoCache(str(tmp_path / "cache"))
+    h = histos("save")
+    for x in range(7):
+        h["h"].Fill(x)
+    state.update(offset=offset)
+    cache.save(str(run), h, state)
+    return cache
+
+
+def test_unchanged_run_restores_histos(tmp_path, run2025):
+    run = tmp_path / "run.txt"
+    run.write_bytes(open(run2025, "rb").read())
+    cache = save(tmp_path, run, 20000, sample=1)
+    h = histos("load")
+    meta = cache.load(str(run), h, sample=1)
+    assert meta is not None and meta["offset"] == 20000
+    assert h["h"].GetEntries() == 7
+    assert cache.load(str(run), histos("other"), sample=2) is None   # other sampling
+
+
+def test_grown_run_appends(tmp_path, run2025):
+    data = open(run2025, "rb").read()
+    run = tmp_path / "run.txt"
+    run.write_bytes(data[:30000])
+    cache = save(tmp_path, run, 30000)
+    with open(str(run), "ab") as f:
+        f.write(data[30000:])
+    assert cache.load(str(run), histos("grown")) is not None
+    run.write_bytes(data[:29000] + b"x" * 1000 + data[30000:])   # same size, bytes changed
+    assert cache.load(str(run), histos("changed")) is None
+
+
+def test_compressed_run_keyed_on_size_mtime(tmp_path, run2025):
+    data = open(run2025, "rb").read()
+    run = tmp_path / "run.txt.gz"
+    with gzip.open(str(run), "wb") as f:
+        f.write(data[:len(data) // 2])
+    # the offset is a position in the decompressed stream, past the end of the .gz file
+    offset = len(data) // 2
+    assert offset > os.path.getsize(str(run))
+    cache = save(tmp_path, run, offset)
+    assert cache.load(str(run), histos("same")) is not None
+    with gzip.open(str(run), "wb") as f:
+        f.write(data)
+    assert cache.load(str(run), histos("rewritten")) is None
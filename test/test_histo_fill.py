@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+from calibration import load_channel_map
+from histo_fill import FillEngine, TriggerViews
+from spills import PhysTrigger
+
+
+class FakeHisto:
+    '''Counts the entries filled with FillN/Fill'''
+    def __init__(self):
+        self.entries = 0.
+
+    def FillN(self, n, *arrays):
+        self.entries += arrays[-1].sum()
+
+    def Fill(self, *args):
+        self.entries += 1
+
+
+class FakeHistos(dict):
+    def __init__(self, ndwc=2, adc=()):
+        dict.__init__(self)
+        for ch in adc:
+            self["adc-%03d" % ch] = FakeHisto()
+        for n in range(1, ndwc + 1):
+            for k in ("XY", "XY_mm", "l-r", "l/r", "u-d", "u/d"):
+                self["dw%d%s" % (n, k)] = FakeHisto()
+        for k in ("x1-x2", "x1/x2", "y1-y2", "y1/y2"):
+            self["dw" + k] = FakeHisto()
+
+    def __missing__(self, key):
+        h = self[key] = FakeHisto()
+        return h
+
+
+@pytest.fixture
+def mapadc(run2025):
+    import os
+    return load_channel_map(os.path.join(os.path.dirname(os.path.dirname(run2025)), "channels2025adc.json"))
+
+
+@pytest.mark.parametrize("trigCut", [0, PhysTrigger])
+def test_fill_batch_returns_calibration_of_all_rows(batch2025, mapadc, trigCut):
+    engine = FillEngine(FakeHistos(), mapadc, trigCut=trigCut)
+    energy = engine.fillBatch(batch2025)
+    ref = engine.calib.calibrate(batch2025)
+    # one row per event of the batch, events cut from the histograms included (spill counters)
+    assert len(energy.S) == len(batch2025)
+    np.testing.assert_array_equal(energy.S, ref.S)
+    np.testing.assert_array_equal(energy.towerC, ref.towerC)
+    sel = batch2025.adc_ok.any(axis=1)
+    if trigCut:
+        sel &= batch2025.trigmask == trigCut
+    assert engine.sets[0][1].hTrMask.entries == sel.sum()
+
+
+def test_dwc_event_same_as_batch(mapadc):
+    # the TDC of the 2025 test run has no data words: random rows instead
+    import dwc
+    from test_dwc import rows
+    rng = np.random.default_rng(28)
+    events = [dict((ch, (int(rng.integers(0, 4096)), int(rng.random() < 0.05)))
+                   for ch in range(8) if rng.random() < 0.85) for _ in range(300)]
+    hEvent, hBatch = FakeHistos(), FakeHistos()
+    byEvent, byBatch = FillEngine(hEvent, mapadc), FillEngine(hBatch, mapadc)
+    for ev in events:
+        byEvent.fillDwc(ev)
+    byBatch.fillDwcBatch(None, dwc.reconstruct(*rows(events), setup=byBatch.dwc))
+    names = [k for k in FakeHistos() if k.startswith("dw")]
+    assert [hEvent[k].entries for k in names] == [hBatch[k].entries for k in names]
+    assert all(hEvent[k].entries > 0 for k in names)
+
+
+@pytest.mark.parametrize("batched", [True, False])
+def test_trigger_views_sum_to_all(events2025, batch2025, mapadc, batched):
+    import copy
+    # the run has physics and pedestal triggers only: move some events to the "oth" view
+    other = np.zeros(len(batch2025), dtype=bool)
+    other[::7] = True
+    hAll = FakeHistos(adc=mapadc.keys())
+    views = dict((v, FakeHistos(adc=mapadc.keys())) for v in TriggerViews)
+    engine = FillEngine(hAll, mapadc, views=views)
+    if batched:
+        batch = batch2025.select(np.ones(len(batch2025), dtype=bool))
+        batch.trigmask[other] = 4
+        engine.fillBatch(batch)
+    else:
+        for ev, oth in zip((ev for ev in events2025 if ev is not None), other):
+            if oth:
+                ev = copy.copy(ev)
+                ev.TriggerMask = 4
+            engine.fill(ev)
+    assert all(views[v]["trMask"].entries > 0 for v in TriggerViews)
+    for name in hAll:
+        assert sum(views[v][name].entries for v in TriggerViews) == pytest.approx(hAll[name].entries), name
+    assert hAll["trMask"].entries == len(batch2025)
+    assert sum(hAll["adc-%03d" % ch].entries for ch in mapadc) > 0
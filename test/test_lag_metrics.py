@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from lag_metrics import LogHistogram, LagMonitor
+
+
+def assert_percentiles(h, x, low, high, precision):
+    for p in (0.5, 1, 10, 25, 50, 75, 90, 99, 99.9, 100):
+        q = np.percentile(x, p, method="inverted_cdf")
+        got = h.percentile(p)
+        if q <= low:   # first bucket: values below low, 0 and negative ones
+            assert x.min() <= got <= low, p
+        elif q > high:   # last bucket: overflow
+            assert high <= got <= x.max(), p
+        else:
+            assert got == pytest.approx(q, rel=precision), p
+
+
+@pytest.mark.parametrize("bulk", [False, True])
+def test_percentiles_within_bucket_resolution(bulk):
+    rng = np.random.default_rng(44)
+    low, high, precision = 1., 1e6, 0.02
+    x = np.concatenate([rng.lognormal(5, 2, 5000), np.zeros(50), -rng.uniform(0, 10, 30),
+                        rng.uniform(2e6, 1e8, 40)])   # 0, negative and overflow values
+    rng.shuffle(x)
+    h = LogHistogram(low, high, precision)
+    if bulk:
+        h.addArray(x[:2500])
+        h.addArray(x[2500:])
+    else:
+        for v in x:
+            h.add(float(v))
+    assert h.n == len(x) and h.nneg == 30
+    assert h.min == x.min() and h.max == x.max()
+    assert h.mean() == pytest.approx(x.mean())
+    assert_percentiles(h, x, low, high, precision)
+
+
+def test_percentiles_of_zeros_and_empty():
+    h = LogHistogram()
+    assert h.percentile(50) is None
+    h.addArray(np.zeros(10))
+    assert h.percentile(50) == 0 and h.percentile(100) == 0
+
+
+def test_warns_once_past_each_bound():
+    m = LagMonitor(maxAge=30., maxBacklog=1e6, warnEvery=10.)
+    us = 1e6
+    assert m.add(100 * us, 1000, now=110.) is None            # age 10 s
+    w = m.add(100 * us, 1000, now=140.)                        # age 40 s: past maxAge
+    assert w is not None and "age 40.0 s" in w
+    assert m.add(101 * us, 1000, now=141.) is None             # still past it: no repeat
+    assert m.add(102 * us, 2e6, now=142.) is not None          # backlog past its own bound
+    assert m.add(103 * us, 2e6, now=143.) is None
+    assert m.add(145 * us, 2e6, now=146.) is None              # backlog warned 4 s ago
+    assert m.add(150 * us, 2e6, now=152.5) is not None         # 10 s after the backlog warning
+    assert m.nwarnings == 6
+    assert m.add(160 * us, 10, now=161.) is None               # back within the bounds
+    assert m.age.n == 8 and m.lastBacklog == 10
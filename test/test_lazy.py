@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+import DREvent
+import decode_utils as bob
+from conftest import corrupt
+
+Header = ("EventNumber", "EventTime", "SpillNumber", "NumOfPhysEv", "NumOfPedeEv", "NumOfSpilEv", "TriggerMask")
+Payload = ("ADCs", "TDCs", "ModCounters", "ErrorMask")
+
+
+def test_lazy_same_as_eager(lines2025):
+    lines = lines2025 + [corrupt(lines2025[0], "marker")]   # non-fatal errors
+    for line in lines:
+        ref = DREvent.DRdecode(line, verbose=-1)
+        ev = DREvent.DRdecode(line, verbose=-1, lazy=True)
+        assert isinstance(ev, DREvent.LazyDREvent) and not ev.isDecoded()
+        assert all(getattr(ev, k) == getattr(ref, k) for k in Header)
+        assert not ev.isDecoded()   # the header alone does not decode the payload
+        assert all(getattr(ev, k) == getattr(ref, k) for k in Payload)
+        assert ev.isDecoded() and not ev.Discarded and not ev.HeaderOnly
+    assert ref.ErrorMask != 0
+
+
+@pytest.mark.parametrize("first", Payload)
+def test_any_payload_member_decodes(lines2025, first):
+    ev = DREvent.DRdecodeLazy(lines2025[5])
+    getattr(ev, first)
+    assert ev.isDecoded() and ev.ADCs == DREvent.DRdecode(lines2025[5]).ADCs
+
+
+def test_late_payload_error_discards(lines2025):
+    line = corrupt(lines2025[2], "dup")
+    assert DREvent.DRdecode(line) is None
+    ev = DREvent.DRdecodeLazy(line)
+    assert ev is not None and not ev.Discarded   # the header is fine
+    assert ev.EventNumber == DREvent.DRdecode(lines2025[2]).EventNumber
+    assert ev.ADCs == {} and ev.TDCs == {} and ev.Discarded
+
+
+def test_bad_header_is_none(lines2025):
+    words = lines2025[0].split()
+    words[0] = "0"
+    assert DREvent.DRdecodeLazy(" ".join(words) + "\n") is None
+    assert DREvent.DRdecodeLazy("") is None
+
+
+def test_drop_payload(lines2025):
+    ref = DREvent.DRdecode(lines2025[7])
+    ev = DREvent.DRdecodeLazy(lines2025[7])
+    ev.dropPayload()
+    assert ev.HeaderOnly and ev.isDecoded() and not ev.Discarded
+    assert all(getattr(ev, k) == getattr(ref, k) for k in Header)
+    assert (ev.ADCs, ev.TDCs, ev.ModCounters, ev.ErrorMask, ev.Phys) == ({}, {}, [], 0, None)
+    # once decoded, the payload stays
+    ev = DREvent.DRdecodeLazy(lines2025[7])
+    ev.ADCs
+    ev.dropPayload()
+    assert not ev.HeaderOnly and ev.ADCs == ref.ADCs
+
+
+def test_select_and_chmap_passed_on(lines2025):
+    import os
+    from channel_map import PhysMap
+    top = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    pmap = PhysMap.fromJson(os.path.join(top, "channels2025adc.json"), os.path.join(top, "channels2025tdc.json"))
+    select = bob.Selection(adc=[64, 65])
+    for line in lines2025[:20]:
+        ref = DREvent.DRdecode(line, select=select, chmap=pmap)
+        ev = DREvent.DRdecode(line, lazy=True, select=select, chmap=pmap)
+        assert ev.ADCs == ref.ADCs and set(ev.ADCs) <= {64, 65}
+        np.testing.assert_array_equal(ev.Phys.adc, ref.Phys.adc)
@@ -0,0 +1,99 @@
+import random
+import numpy as np
+import pytest
+import DREvent
+import formats
+from event_batch import batch_from_events
+from legacy24 import Decoder24
+
+
+def line24(evt, rng, hexSize=False, trigger="1"):
+    '''Synthetic line of the 2023/2024 ascii format (as written by the DAQ of those years)'''
+    adc = sorted(rng.sample(range(96), rng.randint(0, 40)))
+    tdc = sorted(rng.sample(range(16), rng.randint(0, 10)))
+    head = "Event Number %d Time %d Spill %d Events phys/ped/spill %d 0 %d Trigger Mask %s" % (
+        evt, 1720000000 + evt, evt // 100, evt, evt, trigger)
+    adcs = " ".join("%d %x" % (ch, rng.randrange(4096)) for ch in adc)
+    size = ("%x" if hexSize else "%d") % len(tdc)
+    tdcs = " ".join("%d %d %d" % (ch, rng.randint(0, 1), rng.randrange(4096)) for ch in tdc)
+    return "%s : %s TDC Size %s ch ver val.s %s" % (head, adcs, size, tdcs)
+
+
+@pytest.fixture(scope="module")
+def lines24():
+    rng = random.Random(24)
+    return [line24(i, rng, hexSize=i % 7 == 0, trigger="zz" if i == 33 else "%x" % rng.choice([1, 2, 4]))
+            for i in range(300)]
+
+
+def assert_same(a, b):
+    for c in a.columns():
+        np.testing.assert_array_equal(getattr(a, c), getattr(b, c), err_msg=c)
+
+
+def test_batch_decoder_same_as_drdecode24(lines24):
+    ref = batch_from_events(DREvent.DRdecode24(l) for l in lines24)
+    dec = Decoder24()
+    got = dec.decodeLines(lines24)
+    assert_same(got, ref)
+    assert dec.nbadtrigger == 1
+    # sizes below 10 read the same in decimal
+    assert dec.nhexsize == sum(1 for l in lines24 if not l.split("TDC Size ")[1].split()[0].isdigit()) > 0
+    assert dec.nslow == 0
+
+
+def test_bad_lines_skipped(lines24):
+    lines = list(lines24[:20])
+    lines[5] = lines[5][:lines[5].index(":")] + ": 3 1f 4 TDC Size 0 ch ver val.s"   # ADC value missing
+    lines[9] = lines[9].replace("TDC Size ", "TDC Size 9x")   # unknown size: no TDC
+    lines[12] = lines[12][:lines[12].index(":")] + ": 3 1f 4 zz TDC Size 0 ch ver val.s"   # value not hex
+    with pytest.raises(IndexError):
+        DREvent.DRdecode24(lines[5])
+    with pytest.raises(ValueError):
+        DREvent.DRdecode24(lines[12])
+    keep = [l for i, l in enumerate(lines) if i not in (5, 12)]
+    dec = Decoder24()
+    got = dec.decodeLines(lines)
+    assert dec.nbad == 2 and dec.nbadsize == 1 and dec.nslow == 0
+    assert_same(got, batch_from_events(DREvent.DRdecode24(l) for l in keep))
+    assert not got.tdc_ok[8].any()
+
+
+def test_format_detection(tmp_path, lines24):
+    path = tmp_path / "run24.txt"
+    path.write_text("\n".join(lines24) + "\n")
+    fmt = formats.detect(str(path))
+    assert fmt.name == "2024"
+    got = [b for b in formats.iter_batches(str(path), size=64)]
+    assert [len(b) for b in got] == [64] * 4 + [44]
+    events = list(formats.iter_events(str(path)))
+    assert [ev.EventNumber for ev in events] == list(range(300))
+
+
+def test_token_forms_of_drdecode24(lines24):
+    lines = list(lines24[:40])
+    head = lambda l: l[:l.index(":")]
+    # forms that int(x, 10) and int(x, 16) take but the bulk conversion does not
+    lines[3] = head(lines[3]) + ": +3 1f 0000000004 -1 5 0x2a TDC Size 2 ch ver val.s 1 -1 7 +2 0 00000000012"
+    lines[7] = head(lines[7]) + ": 3 1f TDC Size 1 ch ver val.s 4 1 123456789"   # 9 digits
+    slow = (3, 7)
+    dec = Decoder24()
+    got = dec.decodeLines(lines)
+    assert dec.nbad == 0 and dec.nslow == len(slow)
+    assert_same(got, batch_from_events(DREvent.DRdecode24(l) for l in lines))
+    assert got.adc[3, 4] == -1 and got.tdcflag[3, 1] == -1 and got.tdc[7, 4] == 123456789
+
+
+def test_time_and_channel_range(lines24):
+    lines = list(lines24[:10])
+    lines[2] = lines[2].replace("Time %d" % (1720000002), "Time 1720000002.5")
+    lines[4] = lines[4][:lines[4].index(":")] + ": -3 1f 300 2 5 7 TDC Size 0 ch ver val.s"
+    dec = Decoder24()
+    got = dec.decodeLines(lines)
+    assert len(got) == 10 and dec.nbad == 0
+    assert dec.nbadtime == 1 and got.evttime[2] == -1
+    assert DREvent.DRdecode24(lines[2]).EventTime == "1720000002.5"
+    assert dec.nadcrange == 2 and got.adc_ok[4].tolist().count(True) == 1 and got.adc[4, 5] == 7
+    ref = batch_from_events(DREvent.DRdecode24(l) for i, l in enumerate(lines) if i not in (2, 4))
+    keep = [i for i in range(10) if i not in (2, 4)]
+    assert_same(got.select(keep), ref)
@@ -0,0 +1,37 @@
+import DREvent
+from load_shedding import LoadShedder
+
+MB = 1 << 20
+
+
+def test_stride_follows_lag():
+    s = LoadShedder(highLag=16 * MB, lowLag=1 * MB, maxStride=8)
+    assert not s.check(10 * MB) and s.stride == 1   # between the bounds: unchanged
+    assert s.check(20 * MB) and s.stride == 2
+    strides = []
+    for lag in (30, 40, 50, 60):   # still growing: doubled at each check, up to maxStride
+        s.check(lag * MB)
+        strides.append(s.stride)
+    assert strides == [4, 8, 8, 8]
+    assert not s.check(50 * MB) and s.stride == 8   # shrinking but still high: kept
+    assert not s.check(5 * MB) and s.stride == 8    # above lowLag: kept
+    assert s.check(MB // 2) and s.stride == 1 and s.fraction == 1. and s.tag() == "all"
+
+
+def test_decode_while_shedding(lines2025, events2025):
+    s = LoadShedder()
+    s.stride = 4
+    assert s.fraction == 0.25 and s.tag() == "1/4"
+    for i, (line, ref) in enumerate(zip(lines2025, events2025)):
+        ev = s.decode(line, i)
+        if ref is None:
+            assert ev is None or ev.HeaderOnly
+            continue
+        assert (ev.EventNumber, ev.SpillNumber, ev.TriggerMask) == (ref.EventNumber, ref.SpillNumber, ref.TriggerMask)
+        if i % 4 == 0:
+            assert not ev.HeaderOnly and ev.ADCs == ref.ADCs and ev.TDCs == ref.TDCs
+        else:
+            assert ev.HeaderOnly and ev.ADCs == {} and ev.TDCs == {}
+    s.stride = 1
+    ev = s.decode(lines2025[1], 1)
+    assert type(ev) is DREvent.DREvent and ev.ADCs == events2025[1].ADCs
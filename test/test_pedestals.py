@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+from event_batch import EventBatch
+from calibration import Calibration
+from pedestals import PedestalEstimator, PedestalTrigger
+
+
+def pedestal_batch(levels, noise, rng, channels=(0, 1, 2)):
+    '''Pedestal events with the given pedestal level per event on some channels'''
+    b = EventBatch(len(levels))
+    b.trigmask[:] = PedestalTrigger
+    for ch in channels:
+        b.adc[:, ch] = np.round(levels + rng.normal(0, noise, len(levels)))
+        b.adc_ok[:, ch] = True
+    return b
+
+
+def test_welford_merge_matches_numpy(batch2025):
+    ped = batch2025.select(batch2025.trigmask == PedestalTrigger)
+    assert len(ped) > 10
+    est = PedestalEstimator()
+    for start in range(0, len(ped), 7):   # uneven batches
+        est.updateBatch(ped.select(slice(start, start + 7)))
+    ok = ped.adc_ok.any(axis=0)
+    assert est.nevents == len(ped)
+    np.testing.assert_allclose(est.mean[ok], ped.adc[:, ok].mean(axis=0))
+    np.testing.assert_allclose(est.rms[ok], ped.adc[:, ok].std(axis=0), atol=1e-9)
+    assert not est.weight[~ok].any()
+
+
+def test_physics_events_ignored(batch2025):
+    est = PedestalEstimator()
+    est.updateBatch(batch2025.select(batch2025.trigmask != PedestalTrigger))
+    assert est.nevents == 0
+
+
+def test_running_pedestals_follow_drift():
+    rng = np.random.default_rng(1)
+    levels = np.concatenate([np.full(2000, 100.), np.linspace(100., 160., 4000), np.full(2000, 160.)])
+    running = PedestalEstimator(window=200)
+    fixed = PedestalEstimator()
+    calib = Calibration({0: {"phys": "105-S", "pedestal": 90}, 5: {"phys": "505-S", "pedestal": 40}})
+    for start in range(0, len(levels), 100):
+        b = pedestal_batch(levels[start:start + 100], 2., rng)
+        running.updateBatch(b)
+        fixed.updateBatch(b)
+        calib.setPedestals(running.pedestals(calib.pedestal))
+        level = levels[start + 99]
+        if 2000 <= start < 6000:
+            # during the drift the running mean lags by about window * slope
+            assert abs(running.mean[0] - level) < 200 * 60. / 4000 + 2.
+    assert running.mean[0] == pytest.approx(160., abs=1.)
+    assert fixed.mean[0] == pytest.approx(levels.mean(), abs=1.)
+    # the calibration uses the running pedestals, and keeps the json ones elsewhere
+    assert calib.pedestal[0] == pytest.approx(160., abs=1.)
+    assert calib.pedestal[5] == 40
+    sig = calib.subtract(pedestal_batch(np.full(100, 160.), 2., rng))
+    assert abs(sig[:, 0].mean()) < 1.
+
+
+def test_state_restore():
+    rng = np.random.default_rng(2)
+    est = PedestalEstimator(window=100)
+    est.updateBatch(pedestal_batch(np.full(300, 50.), 3., rng))
+    other = PedestalEstimator(window=100)
+    other.restore(est.state())
+    b = pedestal_batch(np.full(50, 60.), 3., rng)
+    est.updateBatch(b)
+    other.updateBatch(b)
+    np.testing.assert_allclose(other.mean, est.mean)
+    np.testing.assert_allclose(other.rms, est.rms)
+
+
+def test_watch_daq_pedestal_consumer(tmp_path):
+    pytest.importorskip("watchdog")
+    import json
+    import DREvent
+    import watch_daq
+    mapPath = tmp_path / "map.json"
+    mapPath.write_text(json.dumps({"0": {"phys": "105-S", "pedestal": 0, "monthreshold": 0}}))
+    c = watch_daq.PedestalConsumer(mapPath=str(mapPath), outPath=str(tmp_path / "ped.json"), window=50)
+    c.start()
+    for i in range(400):
+        ev = DREvent.DREvent()
+        ev.EventNumber = i
+        ev.EventTime = "%d" % (1000 + i)
+        ev.TriggerMask = PedestalTrigger
+        ev.ADCs = {0: 100 + i // 4}   # drifting pedestal
+        c.offer((i, ev, 1.))
+    c.stop()
+    assert c.nerrors == 0
+    # lags the last value (199) by about window * slope, far from the run mean (149.5)
+    assert c.calib.pedestal[0] == pytest.approx(199 - 50 * 0.25, abs=6)
+    out = json.loads((tmp_path / "ped.json").read_text())
+    assert out["0"]["pedestal"] == pytest.approx(c.estimator.mean[0], abs=0.01)
@@ -0,0 +1,87 @@
+import bz2
+import gzip
+import struct
+import zlib
+import pytest
+import run_reader
+
+
+def bgzf(data, size=20000):
+    '''BGZF file (bgzip) of data: gzip members with the BC extra subfield, then the EOF block'''
+    out = []
+    for i in range(0, len(data) + 1, size):
+        part = data[i:i+size]
+        z = zlib.compressobj(6, zlib.DEFLATED, -15)
+        body = z.compress(part) + z.flush()
+        head = b"\x1f\x8b\x08\x04" + b"\0" * 4 + b"\0\xff" + struct.pack("<H", 6)
+        out.append(head + b"BC" + struct.pack("<HH", 2, len(body) + 25) + body
+                   + struct.pack("<II", zlib.crc32(part), len(part)))
+    return b"".join(out)
+
+
+def streams(data, n, compress):
+    '''Multi-stream file (pbzip2, concatenated gzip members): n independent streams'''
+    step = len(data) // n + 1
+    return b"".join(compress(data[i:i+step]) for i in range(0, len(data), step))
+
+
+@pytest.fixture(scope="module")
+def data(run2025):
+    return open(run2025, "rb").read()
+
+
+def no_serial(path, kind, offset=0):
+    raise AssertionError("serial fallback from %d" % offset)
+
+
+def read(path, threads):
+    with run_reader.open_run(str(path), threads) as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("threads", [1, 4])
+def test_multistream_bz2(tmp_path, data, threads, monkeypatch):
+    monkeypatch.setattr(run_reader, "TaskSize", 1 << 16)   # several parallel tasks
+    path = tmp_path / "run.txt.bz2"
+    path.write_bytes(streams(data, 5, bz2.compress))
+    assert len(run_reader._bz2_starts(path.read_bytes())) == 5
+    if threads > 1:
+        monkeypatch.setattr(run_reader, "_serial", no_serial)   # all the streams in parallel
+    with bz2.open(str(path)) as f:
+        assert f.read() == data
+    assert read(path, threads) == data
+
+
+@pytest.mark.parametrize("threads", [1, 4])
+def test_bgzf(tmp_path, data, threads, monkeypatch):
+    monkeypatch.setattr(run_reader, "TaskSize", 1 << 14)
+    path = tmp_path / "run.txt.gz"
+    path.write_bytes(bgzf(data))
+    assert len(run_reader._bgzf_starts(path.read_bytes())) > 10
+    if threads > 1:
+        monkeypatch.setattr(run_reader, "_serial", no_serial)   # all the streams in parallel
+    with gzip.open(str(path)) as f:
+        assert f.read() == data
+    assert read(path, threads) == data
+
+
+def test_plain_gzip_falls_back_to_serial(tmp_path, data):
+    path = tmp_path / "run.txt.gz"
+    path.write_bytes(streams(data, 3, gzip.compress))   # no BC subfield: not BGZF
+    assert run_reader._bgzf_starts(path.read_bytes()) is None
+    assert read(path, 4) == data == gzip.open(str(path)).read()
+
+
+@pytest.mark.parametrize("kind, compress", [(".bz2", bz2.compress), (".gz", gzip.compress)])
+@pytest.mark.parametrize("threads", [1, 4])
+def test_truncated_stops_at_complete_lines(tmp_path, data, kind, compress, threads, capsys):
+    blob = streams(data, 4, compress)
+    path = tmp_path / ("run.txt" + kind)
+    path.write_bytes(blob[:-len(blob) // 10])
+    with pytest.raises(EOFError):
+        (bz2 if kind == ".bz2" else gzip).open(str(path)).read()
+    got = read(path, threads)
+    assert "truncated" in capsys.readouterr().out
+    assert got and got.endswith(b"\n") and data.startswith(got)
+    lines = list(run_reader.iter_lines(str(path), threads))
+    assert b"".join(lines) == got
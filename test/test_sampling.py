@@ -0,0 +1,127 @@
+import io
+import pytest
+import sampling
+
+
+def run_lines(spills, first_evt=0):
+    '''Raw 2025-like lines (event marker, event number, spill number) for the given spill sizes'''
+    out, evt = [], first_evt
+    for sp, n in spills:
+        for _ in range(n):
+            out.append(b"ccaaffee %x %x 0 0\n" % (evt, sp))
+            evt += 1
+    return out
+
+
+def test_reservoir_defers_open_spill_across_reads():
+    lines = run_lines([(1, 50), (2, 80), (3, 30)])
+    k = 5
+    f = io.BytesIO()
+    f.write(b"".join(lines[:70]))   # spill 1 and part of spill 2
+    f.seek(0)
+    s = sampling.Reservoir(k, seed=3)
+    recs = list(s.records(f))
+    assert {sampling.spill_of(r[2]) for r in recs} == {1}
+    assert sum(r[3] for r in recs) == pytest.approx(50)
+    assert s.pending == (50, len(b"".join(lines[:50])))
+    assert (s.nextLine, s.offset) == (70, f.tell())
+    # the file grows, the next read resumes where the previous one stopped
+    f.seek(0, 2)
+    f.write(b"".join(lines[70:]))
+    f.seek(s.offset)
+    more = list(s.records(f, s.nextLine, s.offset))
+    spill2 = [r for r in more if sampling.spill_of(r[2]) == 2]
+    assert len(spill2) == k   # one reservoir for the whole spill, not one per read
+    assert sum(r[3] for r in spill2) == pytest.approx(80)
+    assert s.pending == (130, len(b"".join(lines[:130])))
+    # end of a complete stream: the carried spill is yielded
+    f.seek(s.offset)
+    last = list(s.records(f, s.nextLine, s.offset, complete=False))
+    assert len(last) == k
+    assert sum(r[3] for r in last) == pytest.approx(30)
+    assert s.pending is None
+
+
+def test_reservoir_restart_drops_carried_spill():
+    lines = run_lines([(1, 20), (2, 20)])
+    s = sampling.Reservoir(4, seed=1)
+    list(s.records(io.BytesIO(b"".join(lines))))
+    assert s.pending is not None
+    # reading again from the start is not the continuation of the previous read
+    recs = list(s.records(io.BytesIO(b"".join(lines)), complete=False))
+    assert sum(r[3] for r in recs) == pytest.approx(40)
+
+
+class FakeClock:
+    def __init__(self, step, slowAfter=None):
+        self.t = 0.
+        self.n = 0
+        self.step = step
+        self.slowAfter = slowAfter
+
+    def __call__(self):
+        self.n += 1
+        self.t += self.step * (100 if self.slowAfter and self.n > self.slowAfter else 1)
+        return self.t
+
+
+def test_time_budget_stops_when_spent(monkeypatch):
+    # the consumer gets slower than measured at the start of the read
+    monkeypatch.setattr(sampling.time, "process_time", FakeClock(0.001, slowAfter=10))
+    lines = run_lines([(1, 1000)])
+    data = b"".join(lines)
+    s = sampling.TimeBudget(0.1, len(data))
+    recs = list(s.records(io.BytesIO(data)))
+    assert len(recs) == 9   # t0 and one call per record
+    # the weights represent exactly the lines consumed, the others are left for the next call
+    assert sum(r[3] for r in recs) == s.nextLine < 1000
+    assert s.offset == len(b"".join(lines[:s.nextLine]))
+
+
+def test_time_budget_follows_growing_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(sampling.time, "process_time", FakeClock(0.001))
+    path = tmp_path / "run.txt"
+    path.write_bytes(b"".join(run_lines([(1, 200)])))
+    s = sampling.TimeBudget(1.)
+    with open(path, "rb") as f:
+        recs = list(s.records(f))
+        assert s.nextLine == 200
+        with open(path, "ab") as w:
+            w.write(b"".join(run_lines([(2, 5000)], 200)))
+        f.seek(s.offset)
+        more = list(s.records(f, s.nextLine, s.offset))
+    # the stride is computed from the grown size: the new data are spread over, not cut short
+    assert s.nextLine == 5200
+    assert sum(r[3] for r in recs + more) == pytest.approx(5200, rel=0.01)
+    assert max(r[3] for r in more) > 1
+
+
+def test_reservoir_finished_run_in_one_read(run2025, lines2025):
+    s = sampling.Reservoir(5, seed=7)
+    with open(run2025, "rb") as f:
+        recs = list(s.records(f, complete=False))
+    assert sum(r[3] for r in recs) == pytest.approx(len(lines2025))
+    spills = {sampling.spill_of(r[2]) for r in recs}
+    assert spills == {sampling.spill_of(l.encode()) for l in lines2025}
+    assert s.pending is None and s.nextLine == len(lines2025)
+
+
+@pytest.mark.parametrize("finished", [True, False])
+def test_drmon_flushes_last_spill_of_finished_run(tmp_path, monkeypatch, run2025, lines2025, finished):
+    pytest.importorskip("ROOT")
+    import os
+    import shutil
+    monkeypatch.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # channel maps
+    import DrMon
+    run = str(tmp_path / "run.txt")
+    shutil.copy(run2025, run)
+    if finished:
+        os.utime(run, (0, 0))   # not written for longer than RunIdleTime
+    m = DrMon.DrMon(run, 999999999, 1, useCache=False, reservoir=5)
+    m.bookAll(512)
+    m.readFile(0)
+    wsum = sum(s.wsum for s in m.spills.recent(1000))
+    if finished:
+        assert wsum == pytest.approx(len(lines2025)) and m.sampler.pending is None
+    else:
+        assert wsum < len(lines2025) and m.sampler.pending is not None   # last spill may still grow
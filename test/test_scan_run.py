@@ -0,0 +1,68 @@
+import bz2
+import gzip
+import numpy as np
+import pytest
+import DREvent
+import run_reader
+import scan_run
+
+
+def bad_lines(line):
+    '''Lines whose event header is invalid: wrong marker, non-hex word, too short, blank'''
+    words = line.split()
+    marker = " ".join(["ccaaffef"] + words[1:]) + "\n"
+    nothex = " ".join(words[:3] + ["zz"] + words[4:]) + "\n"
+    return [marker, nothex, " ".join(words[:10]) + "\n", "   \n"]
+
+
+@pytest.fixture(scope="module")
+def run(lines2025):
+    '''Lines of the test run with bad headers spread in, the expected header columns'''
+    lines = list(lines2025)
+    for i, bad in zip((3, 100, 250, 499), bad_lines(lines2025[0])):
+        lines.insert(i, bad)
+    events = [DREvent.DRdecodeLazy(line) for line in lines]
+    good = [ev for ev in events if ev is not None]
+    assert len(good) == len(lines2025)
+    ref = scan_run.ScanResult(*[np.array([getattr(ev, k) for ev in good]) for k in
+                                ("EventNumber", "SpillNumber", "EventTime", "TriggerMask")],
+                              nbad=len(lines) - len(good))
+    return lines, ref
+
+
+def same(res, ref):
+    for k in ("evtnumber", "spillnumber", "evttime", "trigmask"):
+        np.testing.assert_array_equal(getattr(res, k), getattr(ref, k))
+    assert res.nbad == ref.nbad == 4
+    assert res.triggers() == ref.triggers() and res.spills() == ref.spills()
+
+
+@pytest.mark.parametrize("procs", [1, 3])
+@pytest.mark.parametrize("index", ["none", "full", "grown"])
+def test_plain(tmp_path, run, procs, index, monkeypatch):
+    monkeypatch.setattr(scan_run, "BlockSize", 1 << 15)   # lines cut across the read blocks
+    lines, ref = run
+    path = str(tmp_path / "run.txt")
+    data = "".join(lines).encode()
+    if index == "grown":   # the run grew after the index was built
+        open(path, "wb").write(data[:len(data) // 3])
+        run_reader.build_index(path)
+    open(path, "wb").write(data)
+    if index == "full":
+        run_reader.build_index(path)
+    same(scan_run.scan(path, procs, useIndex=index != "none"), ref)
+
+
+@pytest.mark.parametrize("kind, compress", [(".gz", gzip.compress), (".bz2", bz2.compress)])
+def test_compressed(tmp_path, run, kind, compress):
+    lines, ref = run
+    path = tmp_path / ("run.txt" + kind)
+    path.write_bytes(compress("".join(lines).encode()))
+    same(scan_run.scan(str(path), procs=3), ref)
+
+
+def test_no_final_newline(tmp_path, run):
+    lines, ref = run
+    path = tmp_path / "run.txt"
+    path.write_bytes("".join(lines).rstrip("\n").encode())
+    same(scan_run.scan(str(path)), ref)
@@ -0,0 +1,52 @@
+import gzip
+import os
+import numpy as np
+import pytest
+import shm_ring
+from event_batch import concat_batches
+
+
+def ring_name(tag):
+    return "drtest_%s_%d" % (tag, os.getpid())
+
+
+def assert_same(a, b):
+    for c in shm_ring.Columns:
+        np.testing.assert_array_equal(getattr(a, c), getattr(b, c), err_msg=c)
+
+
+def test_publish_event_same_as_batch(events2025, batch2025):
+    events = [ev for ev in events2025 if ev is not None]
+    with shm_ring.RingWriter(ring_name("ev"), 64) as ring:
+        reader = shm_ring.RingReader(ring.name, "oldest")
+        out = []
+        for i, ev in enumerate(events):
+            ring.publishEvent(ev)
+            if i % 50 == 49:   # read before the ring laps
+                out.append(reader.read())
+        out.append(reader.read())
+        reader.close()
+    got = concat_batches(out)
+    assert reader.nlost == 0
+    assert_same(got, batch2025)
+
+
+def test_publish_batch_overrun(batch2025):
+    with shm_ring.RingWriter(ring_name("batch"), 100) as ring:
+        reader = shm_ring.RingReader(ring.name, "oldest")
+        ring.publish(batch2025.head(30))
+        ring.publish(batch2025.select(slice(30, None)))
+        got = reader.read()
+        reader.close()
+    assert reader.nlost == len(batch2025) - 100
+    assert_same(got, batch2025.select(slice(-100, None)))
+
+
+def test_follow_compressed_run_not_followed(tmp_path, run2025, capsys):
+    path = tmp_path / "run.txt.gz"
+    with open(run2025, "rb") as f, gzip.open(path, "wb") as g:
+        g.write(f.read())
+    shm_ring.publish_run(str(path), ring_name("gz"), 1024, follow=True)   # returns at the end
+    out = capsys.readouterr().out
+    assert "not followed" in out
+    assert "500 events published" in out
@@ -0,0 +1,53 @@
+import os
+import numpy as np
+import pytest
+from calibration import Calibration
+from spills import SpillAggregator, PhysTrigger
+
+MapADC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "channels2025adc.json")
+
+
+def test_calibrate_event_same_as_batch(events2025, batch2025):
+    calib = Calibration.fromJson(MapADC)
+    energy = calib.calibrate(batch2025)
+    events = [ev for ev in events2025 if ev is not None]
+    got = np.array([calib.calibrateEvent(ev.ADCs) for ev in events])
+    np.testing.assert_allclose(got[:, 0], energy.S)
+    np.testing.assert_allclose(got[:, 1], energy.C)
+
+
+def test_discarded_before_first_spill():
+    agg = SpillAggregator()
+    agg.addDiscarded()
+    agg.addDiscarded()
+    assert agg.current is None and agg.ndiscPending == 2
+    agg.add(5, 1000, PhysTrigger)
+    assert agg.current.ndisc == 2 and agg.ndiscPending == 0
+    agg.addDiscarded(6)   # known spill: opens it
+    assert [s.spill for s in agg.spills] == [5]
+    assert agg.current.spill == 6 and agg.current.ndisc == 1
+    other = SpillAggregator()
+    other.addDiscarded()
+    state = other.state()
+    other.restore(state)
+    assert other.ndiscPending == 1
+
+
+def test_spill_consumer_energy(tmp_path, events2025, batch2025):
+    pytest.importorskip("watchdog")
+    import consumers
+    import watch_daq
+    calib = Calibration.fromJson(MapADC)
+    c = watch_daq.SpillConsumer(logfile=str(tmp_path / "s.txt"), calib=calib, policy=consumers.Block)
+    c.start()
+    for i, ev in enumerate(events2025):
+        c.offer((i, ev, 1.))
+    c.stop()
+    c.spills.close()
+    ref = SpillAggregator()
+    ref.addBatch(batch2025, calib.calibrate(batch2025), batch2025.errors)
+    ref.close()
+    for a, b in zip(c.spills.recent(100), ref.recent(100)):
+        assert (a.spill, a.nphys, a.nped, a.nerr) == (b.spill, b.nphys, b.nped, b.nerr)
+        assert a.meanS == pytest.approx(b.meanS) and a.meanC == pytest.approx(b.meanC)
+        assert a.nE == a.nphys and a.meanS > 0
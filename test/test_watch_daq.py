@@ -0,0 +1,53 @@
+import pytest
+
+watch_daq = pytest.importorskip("watch_daq")   # needs watchdog
+
+
+class Event:
+    EventTime = 0
+
+
+def test_backlog_from_current_file_size(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / "run.txt"
+    path.write_bytes(b"x" * 1000)
+    tailer = watch_daq.FileTailer(str(path), [])
+    with open(path, "rb") as f:
+        tailer.offset = 400
+        tailer.recordLag(f, Event())
+        assert tailer.lag.lastBacklog == 600
+        # the writer appends between two lag checks: the backlog follows at the next event
+        with open(path, "ab") as w:
+            w.write(b"y" * 5000)
+        tailer.offset = 500
+        tailer.recordLag(f, Event())
+        assert tailer.lag.lastBacklog == 5500
+
+
+class FixedShedder(watch_daq.LoadShedder):
+    def check(self, lag):
+        return False
+
+
+class Recorder(watch_daq.Consumer):
+    def __init__(self):
+        super().__init__(policy="block")
+        self.items = []
+
+    def process(self, line, ev, fraction):
+        self.items.append((line, ev is not None and ev.HeaderOnly, fraction))
+
+
+def test_consumers_get_payload_fraction(tmp_path, monkeypatch, lines2025):
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / "run.txt"
+    path.write_text("".join(lines2025[:40]))
+    shedder = FixedShedder()
+    shedder.stride = 8
+    rec = Recorder()
+    tailer = watch_daq.FileTailer(str(path), [rec], shedder=shedder)
+    tailer.start()
+    tailer.stop()
+    assert [i for i, _, _ in rec.items] == list(range(40))
+    assert all(f == 0.125 for _, _, f in rec.items)
+    assert [i for i, headerOnly, _ in rec.items if not headerOnly] == list(range(0, 40, 8))
@@ -1,73 +1,229 @@
+import os
 import time
 import threading
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 import sys
-import DREvent
-
-# decoder function (already implemented)
-def decoder(line: str, linecount, runnumber, nphys, nped, noth, ndisc):
-    n = time.time()
-    ev = DREvent.DRdecode(line, spec = '2025', verbose = False, dumperror = 'decerrors.txt')
-    dt = 1000*(time.time()-n) # milliseconds
-    nphys_ = nphys
-    nped_ = nped
-    noth_ = noth
-    ndisc_ = ndisc
-    if ev == None:
-        print(f"Run {runnumber} line {linecount} - Event discarded")
-        return nphys, nped, noth, ndisc+1
-    if ev.TriggerMask == 0x1:
-        nphys_ += 1
-    elif True:
-        nped_ += 1
-    else:
-        noth_ += 1
-    adcs = len(ev.ADCs)
-    tdcs = len(ev.TDCs)
-    tdcs_good = len([t for t in ev.TDCs if ev.TDCs[t][1]])
-    print(f"Run {runnumber} line {linecount:3d} - Event {ev.EventNumber:3d} Spill {ev.SpillNumber:3d} Trig {ev.TriggerMask} - {adcs} {tdcs} ({tdcs_good}) - counter: phys {nphys_:3d} ped {nped_:3d} oth {noth_:3d} disc {ndisc_:3d} - decoding time {dt:1.2f} ms") 
-    return nphys_, nped_, noth_, ndisc_
+from consumers import Consumer, FanOut
+from spills import SpillAggregator, PhysTrigger, PedTrigger
+from continuity import ContinuityChecker
+from lag_metrics import LagMonitor
+from load_shedding import LoadShedder
+from error_store import ErrorStore
+from calibration import Calibration, load_channel_map
+from pedestals import PedestalEstimator
 
+DecErrorSuffix = '_decerrors'  # binary error store of each run (error_store.py): <run>_decerrors.dat/.idx
+StatsEvery = 1000   # lines between two prints of the consumer counters
+ShedCheckEvery = 100  # lines between two checks of the lag
+MaxEventAge = 30.   # seconds, warn if the decoded events are older
+MaxBacklog = 64e6  # bytes, warn if more data are waiting to be read
+ChannelMapADC = 'channels2025adc.json'
+PedestalFile = 'channels2025adc_pedestals.json'  # channel json with the running pedestals
+PedestalWindow = 2000  # pedestal events, time constant of the running pedestals
 
-class FileTailer(threading.Thread):
-    """Thread that tails a file while it is being written."""
-    def __init__(self, filepath, decoder):
-        super().__init__(daemon=True)
-        self.filepath = filepath
-        self.decoder = decoder
+
+class PrintConsumer(Consumer):
+    """Prints one line per event and counts the events per trigger type"""
+    def __init__(self, runnumber = "<tbd>", **kw):
+        super().__init__(**kw)
+        self.runnumber = runnumber
         self.nphys = 0
         self.nped = 0
         self.noth = 0
         self.ndisc = 0
 
+    def process(self, linecount, ev, fraction):
+        if ev is None:
+            self.ndisc += 1
+            print(f"Run {self.runnumber} line {linecount} - Event discarded")
+            return
+        if ev.TriggerMask == PhysTrigger:
+            self.nphys += 1
+        elif ev.TriggerMask == PedTrigger:
+            self.nped += 1
+        else:
+            self.noth += 1
+        if ev.HeaderOnly:
+            payload = f"payload skipped (fraction {fraction:.3g})"
+        else:
+            tdcs_good = len([t for t in ev.TDCs if ev.TDCs[t][1]])
+            payload = f"{len(ev.ADCs)} {len(ev.TDCs)} ({tdcs_good})"
+        print(f"Run {self.runnumber} line {linecount:3d} - Event {ev.EventNumber:3d} Spill {ev.SpillNumber:3d} Trig {ev.TriggerMask} - {payload} - counter: phys {self.nphys:3d} ped {self.nped:3d} oth {self.noth:3d} disc {self.ndisc:3d}")
+
+
+class SpillConsumer(Consumer):
+    """Spill summaries (spillsummary.txt) and event number continuity
+    With a Calibration 'calib' the mean S and C of the physics events of each spill are
+    computed (header-only events have no energy); default_consumers shares the one of the
+    PedestalConsumer, so that the energies follow the running pedestals.
+    Default policy drop-oldest: a slow consumer must not hold back the tailer during data taking.
+    The events dropped by the queue show up as missing in the continuity counters (the dropped
+    count is printed with them); pass policy = consumers.Block to see every event in offline replays"""
+    def __init__(self, logfile = 'spillsummary.txt', calib = None, **kw):
+        super().__init__(**kw)
+        self.calib = calib
+        self.spills = SpillAggregator(logfile = logfile)
+        self.continuity = ContinuityChecker()
+        self.minFraction = 1.   # lowest payload fraction of the current spill
+
+    def process(self, linecount, ev, fraction):
+        if ev is not None:
+            S = C = None
+            if self.calib is not None and not ev.HeaderOnly and ev.TriggerMask == PhysTrigger:
+                S, C = self.calib.calibrateEvent(ev.ADCs)
+            closed = self.spills.addEvent(ev, S, C, nerrors = int(ev.ErrorMask != 0))
+            self.continuity.addEvent(ev)
+        else:
+            closed = self.spills.addDiscarded()
+        for s in closed:
+            print(f"Spill {s.spill} completed: phys {s.nphys} ped {s.nped} oth {s.noth} disc {s.ndisc} - {s.duration:.2f} s rate {s.rate:.1f} Hz - payload fraction {self.minFraction:.3g}")
+        self.minFraction = fraction if closed else min(self.minFraction, fraction)
+        if closed and not self.continuity.ok():
+            c = self.continuity.counters()
+            print(f"Continuity: missing {c['nmissing']} duplicated {c['nduplicates']} out of order {c['noutoforder']} - module counters desync {c['ndesync']} jumps {c['njumps']} - dropped by the queue {self.ndropped}")
+
+
+class PedestalConsumer(Consumer):
+    """Running pedestals from the pedestal-trigger events (pedestals.PedestalEstimator): the
+    calibration 'calib' follows them during the run and they are periodically written to outPath"""
+    def __init__(self, mapPath = ChannelMapADC, outPath = PedestalFile, window = PedestalWindow, **kw):
+        kw.setdefault('batchSize', 100)
+        super().__init__(**kw)
+        self.mapadc = load_channel_map(mapPath)
+        self.outPath = outPath
+        self.calib = Calibration(self.mapadc)
+        self.estimator = PedestalEstimator(window = window)
+
+    def processBatch(self, batch):
+        n = self.estimator.nevents
+        self.estimator.updateBatch(batch)
+        if self.estimator.nevents > n:
+            self.calib.setPedestals(self.estimator.pedestals(self.calib.pedestal))
+            self.estimator.maybeWrite(self.outPath, self.mapadc)
+
+    def finish(self):
+        if self.estimator.nevents > self.estimator.nwritten:
+            self.estimator.writeJson(self.outPath, self.mapadc)
+
+
+def default_consumers(filepath):
+    """Consumers of a new run file"""
+    if not os.path.isfile(ChannelMapADC):
+        return [PrintConsumer(), SpillConsumer()]
+    pedestals = PedestalConsumer()
+    return [PrintConsumer(), SpillConsumer(calib = pedestals.calib), pedestals]
+
+
+class FileTailer(threading.Thread):
+    """Thread that tails a file while it is being written, decodes every event once
+    and hands it to the consumers (consumers.FanOut), each on its own thread.
+    With a LoadShedder, only the headers of the events are decoded while the tailer lags
+    behind the writer, and the payload of a sampled subset.
+    The LagMonitor follows the age of the events when decoded and the byte backlog.
+    The events with decoding errors go to the binary error store of the run.
+    stop() makes the tailer read the complete lines left, then stop the consumers and
+    close the error store (writing its lookup table)."""
+    def __init__(self, filepath, consumerList, shedder = None, lag = None):
+        super().__init__(daemon=True)
+        self.filepath = filepath
+        self.fanout = FanOut(consumerList)
+        self.shedder = shedder if shedder is not None else LoadShedder()
+        self.lag = lag if lag is not None else LagMonitor(MaxEventAge, MaxBacklog)
+        self.errors = ErrorStore(os.path.splitext(os.path.basename(filepath))[0] + DecErrorSuffix)
+        self.offset = 0     # bytes read
+        self.size = 0       # file size at the last fstat
+        self.ndecoded = 0
+        self.tdecode = 0.   # seconds spent decoding
+        self.stopping = threading.Event()
+
+    def stop(self, wait = True):
+        self.stopping.set()
+        if wait:
+            self.join()
+
+    def decode(self, line, linecount):
+        n = time.time()
+        ev = self.shedder.decode(line, linecount, self.errors)
+        self.tdecode += time.time() - n
+        self.ndecoded += 1
+        return ev
+
+    def recordLag(self, f, ev):
+        """Age of a decoded event and bytes still to read, from the current file size"""
+        self.size = os.fstat(f.fileno()).st_size
+        warning = self.lag.add(ev.EventTime, max(0, self.size - self.offset))
+        if warning:
+            print(f"{time.ctime()} {self.filepath}: {warning}")
+
+    def checkLag(self, f):
+        self.size = os.fstat(f.fileno()).st_size
+        lag = self.size - self.offset
+        if self.shedder.check(lag):
+            print(f"{time.ctime()} {self.filepath}: lag {lag/1e6:.1f} MB - payload decoded for {self.shedder.tag()} of the events")
+
     def run(self):
-        with open(self.filepath, "r") as f:
+        self.fanout.start()
+        try:
+            self.tail()
+        finally:
+            self.fanout.stop()
+            self.errors.close()
+            print(f"{time.ctime()} Stopped reading {self.filepath} - {self.ndecoded} events, {self.errors.nrecords} with decoding errors in {self.errors.path}")
+
+    def tail(self):
+        with open(self.filepath, "rb") as f:
             linecount = 0
             while True:
-                line = f.readline()
-                if line:
-                    self.nphys, self.nped, self.noth, self.ndisc = self.decoder(line, linecount, "<tbd>", self.nphys, self.nped, self.noth, self.ndisc)
+                raw = f.readline()
+                if raw.endswith(b"\n"):
+                    self.errors.offset, self.errors.line = self.offset, linecount
+                    self.offset += len(raw)
+                    ev = self.decode(raw.decode(), linecount)
+                    if ev is not None:
+                        self.recordLag(f, ev)
+                    self.fanout.publish(linecount, ev, self.shedder.fraction)
                     linecount +=1
+                    if linecount % ShedCheckEvery == 0:
+                        self.checkLag(f)
                 else:
-                    time.sleep(0.5)  # wait for new data
-                if line and linecount % 10 == 0 and linecount > 0:
-                    print(f'{time.ctime()} Still reading {self.filepath}')
+                    if raw:
+                        f.seek(-len(raw), 1)  # line still being written
+                    if self.stopping.is_set():
+                        return
+                    self.checkLag(f)
+                    self.stopping.wait(0.5)  # wait for new data
+                    continue
+                if linecount % 10 == 0:
+                    print(f'{time.ctime()} Still reading {self.filepath} - decoding time {1000*self.tdecode/self.ndecoded:1.2f} ms/event - payload {self.shedder.tag()}')
+                if linecount % StatsEvery == 0:
+                    self.fanout.dump()
+                    print(self.lag.report())
+                    print(f"{self.errors.nrecords} events with decoding errors in {self.errors.path} (python error_store.py {self.errors.path})")
 
 class NewFileHandler(FileSystemEventHandler):
-    def __init__(self, decoder):
+    """Tails the last file created in the directory: the tailer of the previous run is
+    stopped when the next one starts (roll over)"""
+    def __init__(self, makeConsumers):
         super().__init__()
-        self.decoder = decoder
+        self.makeConsumers = makeConsumers
+        self.tailer = None
 
     def on_created(self, event):
         if not event.is_directory:
             print(f"New file detected: {event.src_path}")
-            tailer = FileTailer(event.src_path, self.decoder)
-            tailer.start()
+            if self.tailer is not None:
+                self.tailer.stop(wait = False)  # finishes the complete lines of the previous run
+            self.tailer = FileTailer(event.src_path, self.makeConsumers(event.src_path))
+            self.tailer.start()
+
+    def stop(self):
+        if self.tailer is not None:
+            self.tailer.stop()
 
 
-def watch_directory(path, decoder):
-    event_handler = NewFileHandler(decoder)
+def watch_directory(path, makeConsumers = default_consumers):
+    event_handler = NewFileHandler(makeConsumers)
     observer = Observer()
     observer.schedule(event_handler, path, recursive=False)
     observer.start()
@@ -79,7 +235,8 @@ def watch_directory(path, decoder):
     except KeyboardInterrupt:
         observer.stop()
     observer.join()
+    event_handler.stop()
 
 
 if __name__ == "__main__":
-    watch_directory(sys.argv[1], decoder)
+    watch_directory(sys.argv[1])